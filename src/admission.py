@@ -0,0 +1,177 @@
+'''Per-tenant admission control.
+Requests are assigned to an operation class (search, read, write, deploy). For each tenant and
+operation class, a token bucket limits the request rate and a concurrency limit with a bounded
+wait queue limits the number of requests processed at the same time. Requests over the limits
+are rejected at once with status 429 and a Retry-After header.
+All state is kept per event loop, so no locks are needed.'''
+import asyncio
+from collections import deque, OrderedDict
+import math
+import time
+from starlette.responses import JSONResponse
+import metrics
+
+admission_rejections = metrics.registry.register(metrics.Counter('admission_rejections_total',\
+    'Requests rejected by the admission control', ('operation', 'reason')))
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class TokenBucket():
+    """Allows rate requests per second on average and bursts of up to burst requests"""
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Takes a token. Returns 0 if successful, otherwise the seconds until a token is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def is_full(self, now: float):
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+class ConcurrencyLimit():
+    """At most max_concurrent requests hold the limit. Up to max_queued requests wait in FIFO order.
+    A released slot is handed over to the next waiter directly"""
+    def __init__(self, max_concurrent: int, max_queued: int):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.active = 0
+        self.waiters = deque()
+
+    async def acquire(self, timeout: float):
+        """Returns False if the queue is full or no slot became free within timeout seconds"""
+        if self.active < self.max_concurrent and not self.waiters:
+            self.active += 1
+            return True
+        if len(self.waiters) >= self.max_queued:
+            return False
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append(future)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.waiters.remove(future)
+            return False
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                self.waiters.remove(future)
+            raise
+
+    def release(self):
+        while self.waiters:
+            future = self.waiters.popleft()
+            if not future.done():
+                future.set_result(True)
+                return
+        self.active -= 1
+
+class TenantLimits():
+    __slots__ = ('bucket', 'concurrency')
+    def __init__(self, settings: dict):
+        self.bucket = TokenBucket(settings['rate'], settings['burst']) if settings['rate'] > 0 else None
+        self.concurrency = ConcurrencyLimit(settings['maxConcurrent'], settings['maxQueued'])\
+            if settings['maxConcurrent'] > 0 else None
+
+    def is_busy(self):
+        return self.concurrency is not None and (self.concurrency.active > 0 or len(self.concurrency.waiters) > 0)
+
+    def is_idle(self, now: float):
+        """True if the state equals the initial state, so the limits can be dropped and created again"""
+        return not self.is_busy() and (self.bucket is None or self.bucket.is_full(now))
+
+class AdmissionController():
+    """Limits by tenant and operation class. classes contains the settings of each operation class
+    (maxConcurrent, maxQueued, rate, burst). tenants contains settings of single tenants which
+    override them, for example {'tenant1': {'write': {'maxConcurrent': 4}}}.
+    Requests wait up to max_wait_time seconds in the queue.
+    The limits are kept in LRU order. Idle limits of tenants without recent requests are dropped"""
+    def __init__(self, classes: dict, tenants: dict = None, max_wait_time: float = 1):
+        self.classes = classes
+        self.tenants = tenants or {}
+        self.max_wait_time = max_wait_time
+        self.limits = OrderedDict()
+
+    def get_limits(self, tenant_id: str, operation: str):
+        key = (tenant_id, operation)
+        limits = self.limits.get(key)
+        if limits is None:
+            settings = self.classes[operation] | self.tenants.get(tenant_id, {}).get(operation, {})
+            limits = self.limits[key] = TenantLimits(settings)
+        else:
+            self.limits.move_to_end(key)
+        self.evict_idle(key)
+        return limits
+
+    def evict_idle(self, current_key):
+        """Checks the two least recently used limits. Idle ones are dropped, busy ones are moved to the end.
+        As each request adds at most one entry, this keeps the number of entries near the number of
+        recently active tenants"""
+        now = time.monotonic()
+        for _ in range(2):
+            key, limits = next(iter(self.limits.items()))
+            if key == current_key:
+                return
+            if limits.is_idle(now):
+                del self.limits[key]
+            elif limits.is_busy():
+                self.limits.move_to_end(key)
+            else:
+                return
+
+    async def acquire(self, tenant_id: str, operation: str):
+        """Returns the concurrency limit which must be released, or None.
+        Raises AdmissionRejected if the request is over the limits"""
+        limits = self.get_limits(tenant_id, operation)
+        if limits.bucket:
+            wait_time = limits.bucket.take()
+            if wait_time > 0:
+                raise AdmissionRejected('rate', wait_time)
+        if limits.concurrency:
+            if not await limits.concurrency.acquire(self.max_wait_time):
+                raise AdmissionRejected('concurrency', self.max_wait_time)
+        return limits.concurrency
+
+class AdmissionMiddleware():
+    """ASGI middleware which applies the admission control of controller() if it is not None.
+    classify(scope) returns the tenant id and operation class of a request, or None if the
+    request is not limited"""
+    def __init__(self, app, controller, classify):
+        self.app = app
+        self.controller = controller
+        self.classify = classify
+
+    async def __call__(self, scope, receive, send):
+        controller = self.controller() if scope['type'] == 'http' else None
+        classification = self.classify(scope) if controller else None
+        if not classification:
+            await self.app(scope, receive, send)
+            return
+        tenant_id, operation = classification
+        try:
+            concurrency = await controller.acquire(tenant_id, operation)
+        except AdmissionRejected as e:
+            admission_rejections.inc(operation, e.reason)
+            retry_after = str(max(1, math.ceil(e.retry_after)))
+            response = JSONResponse({'detail': f'Too many {operation} requests for tenant {tenant_id}'},\
+                status_code = 429, headers = {'Retry-After': retry_after})
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if concurrency:
+                concurrency.release()
@@ -0,0 +1,181 @@
+'''Caching proxy for the static UI5 assets of the search UI'''
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import httpx
+from starlette.concurrency import run_in_threadpool
+from single_flight import SingleFlight
+
+CACHED_HEADERS = ('content-type', 'etag', 'last-modified')
+
+class Asset():
+    """Content of one asset. validated_at is the time of the last successful upstream check"""
+    def __init__(self, content: bytes, headers: dict, validated_at: float):
+        self.content = content
+        self.headers = headers
+        self.validated_at = validated_at
+
+class AssetProxy():
+    """Proxy for static assets with one shared keep-alive upstream client.
+    Assets are cached in memory and on disk, both bounded by size with LRU eviction.
+    Cached assets older than revalidate_interval seconds are revalidated with a conditional request.
+    If the upstream server is not reachable, cached assets are served even if they are outdated."""
+    def __init__(self, url: str, cache_dir: str = '', max_memory_size: int = 64 * 1024 * 1024,\
+        max_disk_size: int = 512 * 1024 * 1024, max_age: int = 86400, revalidate_interval: float = 3600):
+        self.url = url.rstrip('/')
+        self.cache_dir = cache_dir
+        self.max_memory_size = max_memory_size
+        self.max_disk_size = max_disk_size
+        self.max_age = max_age
+        self.revalidate_interval = revalidate_interval
+        self.client = httpx.AsyncClient(base_url = self.url, timeout = 30,\
+            limits = httpx.Limits(max_keepalive_connections = 20))
+        self.flights = SingleFlight()
+        self.memory = OrderedDict()
+        self.memory_size = 0
+        self.disk_lock = threading.Lock()
+        self.disk_files = OrderedDict()
+        self.disk_size = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok = True)
+            self.scan_disk()
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def get(self, path: str):
+        """Returns status code, content and headers of the asset"""
+        asset = self.memory.get(path)
+        if asset:
+            self.memory.move_to_end(path)
+        elif self.cache_dir:
+            asset = await run_in_threadpool(self.read_disk, path)
+            if asset:
+                self.put_memory(path, asset)
+        if asset and time.time() - asset.validated_at < self.revalidate_interval:
+            return 200, asset.content, self.get_response_headers(asset)
+        return await self.flights.run(path, self.fetch, path, asset)
+
+    async def fetch(self, path: str, asset: Asset):
+        request_headers = {}
+        if asset and 'etag' in asset.headers:
+            request_headers['If-None-Match'] = asset.headers['etag']
+        if asset and 'last-modified' in asset.headers:
+            request_headers['If-Modified-Since'] = asset.headers['last-modified']
+        try:
+            res = await self.client.get(f'/{path}', headers = request_headers)
+        except httpx.HTTPError as e:
+            if asset:
+                logging.warning('Serving outdated asset %s: %s', path, e)
+                return 200, asset.content, self.get_response_headers(asset)
+            raise
+        if asset and res.status_code == 304:
+            asset.validated_at = time.time()
+            if self.cache_dir:
+                await run_in_threadpool(self.write_disk, path, asset, False)
+            return 200, asset.content, self.get_response_headers(asset)
+        if res.status_code != 200:
+            return res.status_code, res.content, {k: v for k, v in res.headers.items() if k == 'content-type'}
+        asset = Asset(res.content, {k: res.headers[k] for k in CACHED_HEADERS if k in res.headers}, time.time())
+        self.put_memory(path, asset)
+        if self.cache_dir:
+            await run_in_threadpool(self.write_disk, path, asset)
+        return 200, asset.content, self.get_response_headers(asset)
+
+    def get_response_headers(self, asset: Asset):
+        headers = dict(asset.headers)
+        headers['cache-control'] = f'public, max-age={self.max_age}'
+        return headers
+
+    def put_memory(self, path: str, asset: Asset):
+        if path in self.memory:
+            self.memory_size -= len(self.memory.pop(path).content)
+        if len(asset.content) > self.max_memory_size:
+            return
+        self.memory[path] = asset
+        self.memory_size += len(asset.content)
+        while self.memory_size > self.max_memory_size:
+            _, evicted = self.memory.popitem(last = False)
+            self.memory_size -= len(evicted.content)
+
+    def get_file_name(self, path: str):
+        return os.path.join(self.cache_dir, hashlib.sha256(path.encode('utf-8')).hexdigest())
+
+    def scan_disk(self):
+        """Registers the cached files, least recently used first"""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            # temporary files are written by running workers or left by crashed ones
+            if name.endswith('.json') or name.endswith('.tmp'):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self.disk_files[name] = size
+            self.disk_size += size
+
+    def read_disk(self, path: str):
+        file_name = self.get_file_name(path)
+        name = os.path.basename(file_name)
+        with self.disk_lock:
+            if name not in self.disk_files:
+                return None
+            self.disk_files.move_to_end(name)
+        try:
+            with open(file_name + '.json', encoding = 'utf-8') as fr:
+                info = json.load(fr)
+            with open(file_name, 'rb') as fr:
+                content = fr.read()
+        except (OSError, ValueError):
+            return None
+        if info['path'] != path:
+            return None
+        os.utime(file_name)
+        return Asset(content, info['headers'], info['validatedAt'])
+
+    def replace_file(self, file_name: str, content: bytes):
+        """Writes a temporary file and renames it, so that readers, also of other worker processes,
+        never see a partially written file"""
+        fd, temp_file_name = tempfile.mkstemp(dir = self.cache_dir, suffix = '.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fw:
+                fw.write(content)
+            os.replace(temp_file_name, file_name)
+        except OSError:
+            try:
+                os.remove(temp_file_name)
+            except OSError:
+                pass
+            raise
+
+    def write_disk(self, path: str, asset: Asset, with_content: bool = True):
+        file_name = self.get_file_name(path)
+        name = os.path.basename(file_name)
+        if len(asset.content) > self.max_disk_size:
+            return
+        try:
+            if with_content:
+                self.replace_file(file_name, asset.content)
+            info = {'path': path, 'headers': asset.headers, 'validatedAt': asset.validated_at}
+            self.replace_file(file_name + '.json', json.dumps(info).encode('utf-8'))
+        except OSError as e:
+            logging.warning('Asset %s not cached on disk: %s', path, e)
+            return
+        evicted_files = []
+        with self.disk_lock:
+            self.disk_size += len(asset.content) - self.disk_files.pop(name, 0)
+            self.disk_files[name] = len(asset.content)
+            while self.disk_size > self.max_disk_size:
+                evicted, size = self.disk_files.popitem(last = False)
+                self.disk_size -= size
+                evicted_files.extend((evicted, evicted + '.json'))
+        for evicted_file in evicted_files:
+            try:
+                os.remove(os.path.join(self.cache_dir, evicted_file))
+            except OSError:
+                pass
@@ -1,7 +1,7 @@
 '''Setup and configuration'''
 from argparse import ArgumentParser
 from db_connection_pool import Credentials, ConnectionPool, DBConnection
-from constants import DBUserType, SCHEMA_PREFIX_MAX_LENGTH, CONFIG_FILE_NAME
+from constants import DBUserType, SCHEMA_PREFIX_MAX_LENGTH, CONFIG_FILE_NAME, POOL_DEFAULT_SETTINGS
 from enum import Enum
 import logging
 import sys
@@ -49,6 +49,8 @@ if __name__ == '__main__':
         choices=['critical', 'error', 'warning', 'info', 'debug', 'trace'], default='info')
     parser.add_argument('--srv-reload', help='Server reload after program changes (for development only!)',\
         type=bool, metavar='srv_reload', default=False)
+    parser.add_argument('--srv-workers', help='Number of server worker processes', type=int, metavar='srv_workers',\
+        default=1)
 
     args = parser.parse_args()
     setup_action = SetupAction(args.action)
@@ -72,10 +74,12 @@ if __name__ == '__main__':
                 config['server']['port'] = args.srv_port
                 config['server']['logLevel'] = args.srv_log_level
                 config['server']['reload'] = args.srv_reload
+                config['server']['workers'] = args.srv_workers
                 config['deployment'] = {}
                 config['deployment']['schemaPrefix'] = args.db_schema_prefix
                 config['deployment']['testTenant'] = generate_secure_alphanum_string()
                 config['db'] = {'connection':{'host': args.db_host, 'port': args.db_port}, 'user':{}}
+                config['db']['pool'] = {k.value: v for k, v in POOL_DEFAULT_SETTINGS.items()}
                 if not (args.db_host and args.db_port and args.db_setup_user and \
                     args.db_setup_password and args.db_schema_prefix):
                     args_list = ['db-host', 'db-port', 'db-setup-user', 'db-setup-password', 'schema-prefix']
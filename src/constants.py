@@ -13,12 +13,59 @@ TYPES_SPATIAL = set(['ST_POINT', 'ST_GEOMETRY'])
 
 SPATIAL_DEFAULT_SRID = 4326
 
+# Streaming data load: number of objects converted and inserted per batch
+STREAM_DEFAULT_BATCH_SIZE = 1000
+STREAM_MAX_BATCH_SIZE = 50000
+# Streaming read: number of rows fetched per fetchmany and objects per response chunk
+READ_STREAM_FETCH_SIZE = 1000
+
 class DBUserType(Enum):
     ADMIN = 'admin'
     SCHEMA_MODIFY = 'schema_modify'
     DATA_WRITE = 'data_write'
     DATA_READ = 'data_read'
 
+class StreamCommitMode(Enum):
+    BATCH = 'batch'
+    END = 'end'
+
+class JobPriority(Enum):
+    HIGH = 'high'
+    NORMAL = 'normal'
+    LOW = 'low'
+
+class LoadMode(Enum):
+    CREATE = 'create'
+    SYNC = 'sync'
+
+# Connection pool settings per DB user type. Can be overwritten in section db.pool of .config.json
+POOL_DEFAULT_SETTINGS = {
+    DBUserType.ADMIN: {'minConnections': 1, 'maxConnections': 2, 'timeout': 30, 'maxIdleTime': 300},
+    DBUserType.SCHEMA_MODIFY: {'minConnections': 1, 'maxConnections': 2, 'timeout': 30, 'maxIdleTime': 300},
+    DBUserType.DATA_WRITE: {'minConnections': 1, 'maxConnections': 10, 'timeout': 30, 'maxIdleTime': 300},
+    DBUserType.DATA_READ: {'minConnections': 2, 'maxConnections': 20, 'timeout': 10, 'maxIdleTime': 300}
+}
+
+# Tenant mapping cache. maxSize in characters of the serialized mappings, checkInterval in seconds
+MAPPING_CACHE_DEFAULT_SETTINGS = {'maxSize': 256 * 1024 * 1024, 'checkInterval': 5}
+SEARCH_CACHE_DEFAULT_SETTINGS = {'enabled': False, 'maxSize': 64 * 1024 * 1024, 'ttl': 30}
+BULK_SEARCH_DEFAULT_SETTINGS = {'groupSize': 10, 'parallelism': 1}
+METRICS_DEFAULT_SETTINGS = {'tenantClasses': {}}
+DEBUG_DEFAULT_SETTINGS = {'timing': False}
+SLOW_LOG_DEFAULT_SETTINGS = {'threshold': 0, 'file': 'slow_operations.jsonl', 'maxBytes': 10 * 1024 * 1024,\
+    'backupCount': 5, 'bufferSize': 100, 'maxStatementLength': 1000}
+UI_ASSETS_DEFAULT_SETTINGS = {'url': 'https://sapui5.hana.ondemand.com', 'cacheDir': 'ui5cache',\
+    'maxMemorySize': 64 * 1024 * 1024, 'maxDiskSize': 512 * 1024 * 1024, 'maxAge': 86400, 'revalidateInterval': 3600}
+WARM_UP_DEFAULT_SETTINGS = {'retryInterval': 5}
+GROUP_COMMIT_DEFAULT_SETTINGS = {'enabled': False, 'maxDelay': 5, 'maxObjects': 100}
+INGESTION_DEFAULT_SETTINGS = {'workers': 2, 'maxQueued': 100, 'maxFinished': 1000, 'batchSize': 1000}
+ADMISSION_DEFAULT_SETTINGS = {'enabled': False, 'maxWaitTime': 1, 'classes': {}, 'tenants': {}}
+ADMISSION_CLASS_DEFAULT_SETTINGS = {
+    'search': {'maxConcurrent': 10, 'maxQueued': 50, 'rate': 0, 'burst': 0},
+    'read': {'maxConcurrent': 10, 'maxQueued': 50, 'rate': 0, 'burst': 0},
+    'write': {'maxConcurrent': 2, 'maxQueued': 10, 'rate': 0, 'burst': 0},
+    'deploy': {'maxConcurrent': 1, 'maxQueued': 2, 'rate': 0, 'burst': 0}}
+
 class ConfigCredentials(Credentials):
     """Contains credentials of a single user.
     In: config, selected user"""
@@ -0,0 +1,26 @@
+'''Content hashes of objects.
+The hash is computed from a canonical serialization, so that it does not depend on the order
+of properties and array elements. Null values, empty objects and empty arrays are ignored.'''
+import hashlib
+import json_codec
+
+CONTENT_HASH_COLUMN = '_CONTENT_HASH'
+CONTENT_HASH_DEFINITION = {'type': 'VARCHAR', 'length': 64}
+
+def canonical(value):
+    """String which is equal for equal values. None, empty objects and empty arrays are None"""
+    if isinstance(value, dict):
+        items = [(k, canonical(v)) for k, v in sorted(value.items())]
+        items = [f'{json_codec.dumps(k)}:{v}' for k, v in items if v is not None]
+        return '{' + ','.join(items) + '}' if items else None
+    if isinstance(value, list):
+        items = sorted(w for w in (canonical(v) for v in value) if w is not None)
+        return '[' + ','.join(items) + ']' if items else None
+    if value is None:
+        return None
+    return json_codec.dumps(value)
+
+def content_hash(obj: dict, key_property: str):
+    """SHA-256 of the canonical serialization of obj without its key property"""
+    content = canonical({k: v for k, v in obj.items() if k != key_property}) or ''
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
@@ -4,6 +4,9 @@ from name_mapping import NameMapping
 import json
 import base64
 from constants import TYPES_B64_DECODE, TYPES_SPATIAL, SPATIAL_DEFAULT_SRID
+from timing import phase
+from content_hash import CONTENT_HASH_COLUMN, content_hash
+from source_index import replace_ids
 
 ENTITY_PREFIX = 'ENTITY/'
 VIEW_PREFIX = 'VIEW/'
@@ -347,7 +350,9 @@ def is_many_rel(column_rel):
     return 'cardinality' in column_rel\
         and 'max' in column_rel['cardinality'] and column_rel['cardinality']['max'] == '*'
 
-def cson_to_mapping(cson, pk = DefaultPK):
+def cson_to_mapping(cson, pk = DefaultPK, with_content_hash = False, with_source_index = False):
+    """If with_content_hash is set, root tables get a column with the content hash of the objects.
+    If with_source_index is set, the sources of the objects are stored in the source index table"""
     tables = {}
     entities = {}
     table_name_mapping = NameMapping()
@@ -424,8 +429,15 @@ def cson_to_mapping(cson, pk = DefaultPK):
             table['sql']['delete'] = f'DELETE from "{table_name}" where _ID{len(parents)} in ({del_subselect_str})'
 
         table['sql']['select'] = f'SELECT {", ".join(select_columns)} from {sql_table_joins} where {sql_condition}'
+        if nl == 0 and with_content_hash:
+            table['contentHash'] = CONTENT_HASH_COLUMN
+            table['sql']['contentHash'] = f'SELECT "{table["pk"]}", "{CONTENT_HASH_COLUMN}" '\
+                f'from "{table_name}" where "{table["pk"]}" in ({{id_list}})'
 
-    return {'tables': tables, 'entities': entities}
+    mapping = {'tables': tables, 'entities': entities}
+    if with_source_index:
+        mapping['sourceIndex'] = True
+    return mapping
 
 
 def get_parents(tables, table, steps):
@@ -463,31 +475,69 @@ def array_to_dml(mapping, inserts, objects, subtable_level, parent_object_id, pk
 
 
 
+def get_forward_id(idmapping, sources):
+    """Id assigned to an unresolved reference to one of the sources"""
+    for source in sources:
+        entry = idmapping.get(json.dumps(source))
+        if entry and not entry['resolved']:
+            return entry['id']
+    return None
+
+def register_sources(idmapping, sources, object_id, table_name = None, source_keys = None, replacements = None):
+    """Registers the sources of an object. The sources which are new for idmapping are
+    added as (source JSON, table name, object id) to source_keys if it is provided.
+    If the object was referenced before with another id, e.g. because the object has a key,
+    the id of the references is added to replacements as tuple (object id, source JSON)"""
+    for source in sources:
+        hashable_key = json.dumps(source)
+        entry = idmapping.get(hashable_key)
+        if entry is None:
+            idmapping[hashable_key] = {'id':object_id, 'resolved':True, 'table':table_name}
+        elif not entry['resolved']:
+            if entry['id'] != object_id:
+                if replacements is None:
+                    raise DataException(f'Object {object_id} is referenced with source {hashable_key} '
+                        'before it is provided. Provide it before the referencing objects')
+                replacements[entry['id']] = (object_id, hashable_key)
+                entry['id'] = object_id
+            entry['resolved'] = True
+        else:
+            continue
+        if source_keys is not None:
+            source_keys.append((hashable_key, table_name, object_id))
+
 def object_to_dml(mapping, inserts, objects, idmapping, subtable_level = 0, col_prefix = [],\
     parent_object_id = None, propagated_row = None, propagated_object_id = None, pk = DefaultPK
-    , entity = {}, parent_table_name = ''):
+    , entity = {}, parent_table_name = '', key_property = None, source_keys = None,\
+    references = None, replacements = None):
     if 'table_name' in entity:
         full_table_name = entity['table_name']
     else:
         full_table_name = parent_table_name
     for obj in objects:
-        if subtable_level == 0 and 'id' in obj:
+        if subtable_level == 0 and 'id' in obj and key_property != 'id':
             raise DataException('id is a reserved property name')
         if propagated_row is None:
             row = []
             if parent_object_id:
                 row.append(parent_object_id)
-            object_id = pk.get_pk(full_table_name, subtable_level)
+            if key_property and key_property in obj:
+                object_id = obj[key_property]
+            else:
+                # objects which were referenced before get the id of the references
+                object_id = get_forward_id(idmapping, obj['source'])\
+                    if subtable_level == 0 and 'source' in obj else None
+                if object_id is None:
+                    object_id = pk.get_pk(full_table_name, subtable_level)
             if subtable_level == 0:
+                table = mapping['tables'][full_table_name]
+                if 'contentHash' in table:
+                    object_hash = content_hash(obj, table['columns'][table['pk']]['external_path'][0])
                 if mapping['tables'][full_table_name]['pk'] == 'ID':
                     obj['id'] = object_id
                 if 'source' in obj:
-                    for source in obj['source']:
-                        hashable_key = json.dumps(source)
-                        if hashable_key in idmapping:
-                            idmapping[hashable_key]['resolved'] = True
-                        else:
-                            idmapping[hashable_key] = {'id':object_id, 'resolved':True}
+                    register_sources(idmapping, obj['source'], object_id, full_table_name, source_keys,\
+                        replacements)
             else:
                 row.append(object_id)
                 if not full_table_name in inserts:
@@ -498,6 +548,13 @@ def object_to_dml(mapping, inserts, objects, idmapping, subtable_level = 0, col_
                 inserts[full_table_name] = {'columns': {}, 'rows':[]}
             else:
                 row.extend([None]*(len(inserts[full_table_name]['columns']) - len(row)))
+            if subtable_level == 0 and 'contentHash' in mapping['tables'][full_table_name]:
+                hash_column = mapping['tables'][full_table_name]['contentHash']
+                if not hash_column in inserts[full_table_name]['columns']:
+                    inserts[full_table_name]['columns'][hash_column] = len(inserts[full_table_name]['columns'])
+                    row.append(object_hash)
+                else:
+                    row[inserts[full_table_name]['columns'][hash_column]] = object_hash
         else:
             row = propagated_row
             object_id = propagated_object_id
@@ -525,7 +582,10 @@ def object_to_dml(mapping, inserts, objects, idmapping, subtable_level = 0, col_
                             else:
                                 target_table_name = prop['definition']['target_table_name']
                                 value = pk.get_pk(target_table_name, 0)
-                                idmapping[hashable_key] = {'id':value, 'resolved':False}
+                                idmapping[hashable_key] = {'id':value, 'resolved':False,\
+                                    'table':target_table_name}
+                                if references is not None:
+                                    references.append(hashable_key)
                         else:
                             raise DataException(f'Association property {k} is not a list')
                     else:
@@ -540,7 +600,8 @@ def object_to_dml(mapping, inserts, objects, idmapping, subtable_level = 0, col_
                 if entity['elements'][k]['items']['elements']:
                     object_to_dml(mapping, inserts, v, idmapping, subtable_level + 1,\
                         parent_object_id = object_id, pk = pk, 
-                        entity=entity['elements'][k]['items'], parent_table_name=full_table_name)
+                        entity=entity['elements'][k]['items'], parent_table_name=full_table_name,
+                        references = references)
                 else:
                     array_to_dml(mapping, inserts, v, subtable_level + 1, object_id, pk
                     , entity['elements'][k]['items'])
@@ -548,7 +609,8 @@ def object_to_dml(mapping, inserts, objects, idmapping, subtable_level = 0, col_
                 mapping['tables'][full_table_name]['columns'][entity['elements'][k]['column_name']]['type'] in TYPES_SPATIAL):
                 object_to_dml(mapping, inserts, [v], idmapping, subtable_level, col_prefix + [k],\
                     propagated_row = row, propagated_object_id=object_id, pk = pk, 
-                    entity=entity['elements'][k], parent_table_name=full_table_name)
+                    entity=entity['elements'][k], parent_table_name=full_table_name,
+                    references = references)
             else:
                 column_name = entity['elements'][k]['column_name']
                 if not value:
@@ -563,24 +625,58 @@ def object_to_dml(mapping, inserts, objects, idmapping, subtable_level = 0, col_
             inserts[full_table_name]['rows'].append(row)
 
 
-def objects_to_dml(mapping, objects, pk = DefaultPK):
+def check_dangling_references(idmapping):
+    dangling = [json.loads(k) for k, v in idmapping.items() if not v['resolved']]
+    if dangling:
+        raise DataException(f'No object exists with source {json.dumps(dangling)}. References to objects '
+        'outside of one data package are only resolved if the model was deployed with source_index=true')
+
+def objects_to_dml(mapping, objects, pk = DefaultPK, idmapping = None, keep_keys = False):
+    """Creates the inserts for objects. If idmapping is provided, it is shared between calls
+    and the caller needs to check for dangling references with check_dangling_references.
+    If keep_keys is set, objects which contain their key property keep it as key.
+    If the mapping has a source index, sourceKeys contains the sources of the created objects and
+    unresolved the sources referenced by the objects which are not resolved yet"""
+    with phase('convert'):
+        return objects_to_dml_inserts(mapping, objects, pk, idmapping, keep_keys)
+
+def get_key_property(mapping, object_type):
+    root_table = mapping['tables'][mapping['entities'][object_type]['table_name']]
+    return root_table['columns'][root_table['pk']]['external_path'][0]
+
+def objects_to_dml_inserts(mapping, objects, pk, idmapping, keep_keys = False):
     inserts = {}
-    idmapping = {}
+    # sources of the created objects and of the references to objects which were not created before
+    source_keys = [] if mapping.get('sourceIndex') else None
+    references = [] if mapping.get('sourceIndex') else None
+    check_dangling = idmapping is None
+    if idmapping is None:
+        idmapping = {}
+    # references of former calls may already be written, so only the ids of the references created
+    # by this call can be replaced
+    former_references = {k for k, v in idmapping.items() if not v['resolved']}
+    replacements = {}
     for object_type, objects in objects.items():
         if not object_type in mapping['entities']:
             raise DataException(f'Unknown object type {object_type}')
         object_to_dml(mapping, inserts, objects, idmapping, pk = pk,
-            entity=mapping['entities'][object_type])
-    if idmapping:
-        dangling = [json.loads(k) for k, v in idmapping.items() if not v['resolved']]
-        if dangling:
-            # ToDo: Handle references to objects which are not in one data package
-            raise DataException('References to objects outside of one data package '
-            f'is not yet supported. No object exists with source {json.dumps(dangling)}')
+            entity=mapping['entities'][object_type],
+            key_property = get_key_property(mapping, object_type) if keep_keys else None,
+            source_keys = source_keys, references = references, replacements = replacements)
+    for object_id, hashable_key in replacements.values():
+        if hashable_key in former_references:
+            raise DataException(f'Object {object_id} is referenced with source {hashable_key} '
+                'in a former batch before it is provided. Provide it before the referencing objects')
+    if replacements:
+        replace_ids(inserts, {k: v[0] for k, v in replacements.items()})
+    if check_dangling:
+        check_dangling_references(idmapping)
     for v in inserts.values():
         length = len(v['columns'])
         for row in v['rows']:
             if len(row) < length:
                 row.extend([None]*(length - len(row)))
 
-    return {'inserts': inserts}
+    if references:
+        references = [w for w in references if not idmapping[w]['resolved']]
+    return {'inserts': inserts, 'sourceKeys': source_keys or [], 'unresolved': references or []}
@@ -0,0 +1,99 @@
+'''Execution of the inserts created by convert.objects_to_dml and parsing of newline-delimited JSON'''
+import json
+import time
+import json_codec
+import metrics
+from timing import phase
+from constants import TYPES_SPATIAL
+from convert import DataException
+
+def get_insert_statement(mapping, table_name, column_names):
+    table = mapping['tables'][table_name]
+    placeholders = []
+    for column_name in column_names:
+        # the content hash column is not part of the columns
+        if column_name in table['columns'] and table['columns'][column_name]['type'] in TYPES_SPATIAL:
+            srid = table['columns'][column_name]['srid']
+            placeholders.append(f'ST_GeomFromGeoJSON(?, {srid})')
+        else:
+            placeholders.append('?')
+    columns = ','.join([f'"{k}"' for k in column_names])
+    return f'insert into "{table_name}" ({columns}) values ({",".join(placeholders)})'
+
+def execute_inserts(cur, mapping, inserts):
+    """Inserts the rows table by table with executemany. Returns number of rows per table"""
+    row_counts = {}
+    for table_name, v in inserts.items():
+        with phase('sql'):
+            sql = get_insert_statement(mapping, table_name, v['columns'].keys())
+        start = time.perf_counter()
+        with phase('executemany'):
+            cur.executemany(sql, v['rows'])
+        metrics.dml_duration.observe(time.perf_counter() - start, table_name)
+        metrics.dml_rows.inc(table_name, amount = len(v['rows']))
+        row_counts[table_name] = len(v['rows'])
+    return row_counts
+
+def merge_inserts(inserts_list):
+    """Merges the inserts of several objects_to_dml calls into one insert per table.
+    Rows of inserts with other columns are rearranged to the columns of the merged insert.
+    The merged insert has its own rows, the inserts are not changed, so that they can still be
+    executed on their own"""
+    merged = {}
+    for inserts in inserts_list:
+        for table_name, v in inserts.items():
+            target = merged.get(table_name)
+            if target is None:
+                merged[table_name] = {'columns': dict(v['columns']), 'rows': [list(w) for w in v['rows']]}
+            elif target['columns'] == v['columns']:
+                target['rows'].extend(list(w) for w in v['rows'])
+            else:
+                columns = target['columns']
+                for column_name in v['columns']:
+                    if column_name not in columns:
+                        columns[column_name] = len(columns)
+                positions = [columns[w] for w in v['columns']]
+                for row in v['rows']:
+                    merged_row = [None] * len(columns)
+                    for position, value in zip(positions, row):
+                        merged_row[position] = value
+                    target['rows'].append(merged_row)
+    for v in merged.values():
+        length = len(v['columns'])
+        for row in v['rows']:
+            if len(row) < length:
+                row.extend([None] * (length - len(row)))
+    return merged
+
+def parse_line(line_number, line):
+    try:
+        return json_codec.loads(line)
+    except json.JSONDecodeError as e:
+        raise DataException(f'line {line_number}: invalid JSON ({e})') from e
+
+async def read_ndjson(byte_chunks):
+    """Yields (line number, parsed line) for the non-empty lines of newline-delimited JSON.
+    Only the new chunk is scanned for line breaks. The parts of an unfinished line are collected
+    and joined when its line break arrives, so long lines split into many chunks are read in linear time"""
+    pending = []
+    line_number = 0
+    async for chunk in byte_chunks:
+        start = 0
+        end = chunk.find(b'\n')
+        while end != -1:
+            if pending:
+                pending.append(chunk[start:end])
+                line = b''.join(pending)
+                pending = []
+            else:
+                line = chunk[start:end]
+            line_number += 1
+            if line.strip():
+                yield line_number, parse_line(line_number, line)
+            start = end + 1
+            end = chunk.find(b'\n', start)
+        if start < len(chunk):
+            pending.append(chunk[start:])
+    line = b''.join(pending)
+    if line.strip():
+        yield line_number + 1, parse_line(line_number + 1, line)
@@ -4,8 +4,26 @@ credentials = Credentials(host, port, user, password)
 db_con_pool_ddl = ConnectionPool(credentials)
 with DBConnection(db_con_pool_ddl) as db:
     db.cur.execute('select * from dummy')
+
+Usage in coroutines:
+async with AsyncDBConnection(db_con_pool_ddl) as db:
+    await db.execute('select * from dummy')
+    rows = await db.fetchall()
 """
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import partial
+import threading
+import time
 from hdbcli import dbapi
+from timing import phase
+from slow_log import SlowOperationLog, MonitoredCursor
+
+class PoolTimeoutException(Exception):
+    """No connection became available within the acquire timeout"""
+    pass
 
 class Credentials():
     def __init__(self, host:str, port:int, user:str, password:str):
@@ -15,8 +33,8 @@ class Credentials():
         self.password = password
 
 class SharedConnection():
-    """Represents the actual connection to the DB"""
-    def __init__(self, credentials: Credentials):
+    """Represents the actual connection to the DB. If slow_log is given, slow operations of cur are recorded"""
+    def __init__(self, credentials: Credentials, slow_log: SlowOperationLog = None):
         self.con = dbapi.connect(
             address = credentials.host,
             port = credentials.port,
@@ -24,31 +42,278 @@ class SharedConnection():
             password = credentials.password,
             autocommit = False
         )
-        self.cur = self.con.cursor()
+        self.slow_log = slow_log
+        self.user = credentials.user
+        self.cur = self.cursor()
+        self.last_used = time.monotonic()
     def __enter__(self):
         return self
     def __exit__(self, exception_type, exception_value, traceback):
-        self.cur.close()
-        self.con.close()
+        self.close()
+    def cursor(self):
+        """Returns a new cursor. If slow_log is given, its slow operations are recorded"""
+        cursor = self.con.cursor()
+        if self.slow_log:
+            return MonitoredCursor(cursor, self.slow_log, self.user)
+        return cursor
+    def close(self):
+        try:
+            self.cur.close()
+            self.con.close()
+        except dbapi.Error:
+            pass
+    def is_connected(self):
+        try:
+            return self.con.isconnected()
+        except dbapi.Error:
+            return False
+    def rollback(self):
+        """Rolls back the open transaction. Returns False if this failed"""
+        try:
+            self.con.rollback()
+            return True
+        except dbapi.Error:
+            return False
+
+class _Waiter():
+    """Entry of the wait queue. Gets either a connection handed over or the permission to create one"""
+    def __init__(self):
+        self.event = threading.Event()
+        self.woken = False
+        self.connection = None
+        self.may_create = False
+    def wake(self):
+        self.woken = True
+        self.event.set()
+
+class _AsyncWaiter(_Waiter):
+    """Entry of the wait queue for a coroutine. Is woken up via its event loop"""
+    def __init__(self, loop):
+        super().__init__()
+        self.loop = loop
+        self.future = loop.create_future()
+    def wake(self):
+        self.woken = True
+        self.loop.call_soon_threadsafe(self.set_result)
+    def set_result(self):
+        if not self.future.done():
+            self.future.set_result(None)
 
 class ConnectionPool():
-    """Connection Pool"""
-    def __init__(self, credentials, min_connections: int = 1) -> None:
+    """Bounded connection pool.
+    At most max_connections connections are open at the same time. If all of them are in use,
+    requests wait in FIFO order for a returned connection. If none becomes available within timeout
+    seconds, PoolTimeoutException is raised. Idle connections exceeding min_connections are closed
+    after max_idle_time seconds.
+    The executor has one thread per connection. It runs the hdbcli calls of AsyncDBConnection.
+    If lazy is set, the min_connections connections are not opened by the constructor but by warm_up."""
+    def __init__(self, credentials, min_connections: int = 1, max_connections: int = 10,\
+        timeout: float = 30, max_idle_time: float = 300, slow_log: SlowOperationLog = None,\
+        lazy: bool = False) -> None:
         self.credentials = credentials
+        self.slow_log = slow_log
         self.min_connections = min_connections
-        self.idle_connections = []
-        for _ in range(min_connections):
-            self.idle_connections.append(SharedConnection(self.credentials))
-        self.num_used_connections = min_connections
-    def get_connection(self):
-        if len(self.idle_connections) == 0:
-            return SharedConnection(self.credentials)
-        else:
+        self.max_connections = max(min_connections, max_connections, 1)
+        self.timeout = timeout
+        self.max_idle_time = max_idle_time
+        self.lock = threading.Lock()
+        self.idle_connections = deque()
+        self.waiters = deque()
+        self.num_used_connections = 0
+        self.num_open_connections = 0
+        self.num_created_connections = 0
+        self.num_timeouts = 0
+        self.closed = False
+        self.executor = ThreadPoolExecutor(max_workers = self.max_connections,\
+            thread_name_prefix = f'db_{credentials.user}')
+        for _ in range(0 if lazy else min_connections):
+            self.idle_connections.append(SharedConnection(self.credentials, slow_log))
+            self.num_open_connections += 1
+            self.num_created_connections += 1
+
+    def try_acquire(self, waiter: _Waiter):
+        """Returns an idle connection or reserves capacity for a new one. Otherwise the waiter is queued.
+        Caller must hold the lock"""
+        if self.idle_connections and not self.waiters:
+            self.num_used_connections += 1
+            return self.idle_connections.pop(), False
+        if self.num_open_connections < self.max_connections and not self.waiters:
+            self.num_open_connections += 1
             self.num_used_connections += 1
-            return self.idle_connections.pop()
+            return None, True
+        self.waiters.append(waiter)
+        return None, False
+
+    def check_waiter(self, waiter: _Waiter, timeout: float):
+        with self.lock:
+            if not waiter.woken:
+                self.waiters.remove(waiter)
+                self.num_timeouts += 1
+                raise PoolTimeoutException(\
+                    f'No DB connection available for user {self.credentials.user} within {timeout}s')
+
+    def cancel_waiter(self, waiter: _Waiter):
+        with self.lock:
+            if not waiter.woken:
+                self.waiters.remove(waiter)
+                return
+        if waiter.connection:
+            self.return_connection(waiter.connection)
+        else:
+            self.release_reservation()
+
+    def get_connection(self, timeout: float = None):
+        if timeout is None:
+            timeout = self.timeout
+        waiter = _Waiter()
+        with self.lock:
+            connection, create = self.try_acquire(waiter)
+        if connection:
+            return connection
+        if not create:
+            waiter.event.wait(timeout)
+            self.check_waiter(waiter, timeout)
+            if waiter.connection:
+                return waiter.connection
+        return self.create_connection()
+
+    async def get_connection_async(self, timeout: float = None):
+        if timeout is None:
+            timeout = self.timeout
+        loop = asyncio.get_running_loop()
+        waiter = _AsyncWaiter(loop)
+        with self.lock:
+            connection, create = self.try_acquire(waiter)
+        if connection:
+            return connection
+        if not create:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                self.cancel_waiter(waiter)
+                raise
+            self.check_waiter(waiter, timeout)
+            if waiter.connection:
+                return waiter.connection
+        future = self.executor.submit(self.create_connection)
+        try:
+            return await asyncio.shield(asyncio.wrap_future(future))
+        except asyncio.CancelledError:
+            # the connect is not interrupted, its connection is returned to the pool when it is opened
+            future.add_done_callback(self.return_created_connection)
+            raise
+
+    def create_connection(self):
+        try:
+            connection = SharedConnection(self.credentials, self.slow_log)
+        except Exception:
+            self.release_reservation()
+            raise
+        with self.lock:
+            self.num_created_connections += 1
+        return connection
+
+    def return_created_connection(self, future):
+        """Done callback of a connect whose requester was cancelled.
+        A failed connect has released its reservation already"""
+        if future.cancelled():
+            self.release_reservation()
+        elif future.exception() is None:
+            self.return_connection(future.result())
+
+    def release_reservation(self):
+        """Gives the capacity of a closed or never opened connection to the next waiter or frees it"""
+        with self.lock:
+            if self.waiters:
+                waiter = self.waiters.popleft()
+                waiter.may_create = True
+                waiter.wake()
+            else:
+                self.num_open_connections -= 1
+                self.num_used_connections -= 1
+
     def return_connection(self, connection: SharedConnection):
-        self.idle_connections.append(connection)
-        self.num_used_connections -= 1
+        expired = []
+        with self.lock:
+            if self.closed:
+                self.num_open_connections -= 1
+                self.num_used_connections -= 1
+                expired.append(connection)
+            elif self.waiters:
+                waiter = self.waiters.popleft()
+                waiter.connection = connection
+                waiter.wake()
+                return
+            else:
+                connection.last_used = time.monotonic()
+                self.idle_connections.append(connection)
+                self.num_used_connections -= 1
+                # oldest idle connections are at the left side
+                expiry = connection.last_used - self.max_idle_time
+                while len(self.idle_connections) > self.min_connections\
+                    and self.idle_connections[0].last_used < expiry:
+                    expired.append(self.idle_connections.popleft())
+                    self.num_open_connections -= 1
+        for expired_connection in expired:
+            expired_connection.close()
+
+    def discard_connection(self, connection: SharedConnection):
+        connection.close()
+        self.release_reservation()
+
+    def release_connection(self, connection: SharedConnection, rollback: bool = False):
+        """Returns the connection after use. Connections don't autocommit, so if rollback is set,
+        e.g. after an exception, uncommitted changes are rolled back before the next user gets the connection.
+        Connections which are disconnected or fail to roll back are discarded"""
+        if rollback and not connection.rollback():
+            self.discard_connection(connection)
+        elif connection.is_connected():
+            self.return_connection(connection)
+        else:
+            self.discard_connection(connection)
+
+    def warm_up(self, statement: str = 'select * from dummy'):
+        """Opens min_connections connections and checks each of them with statement"""
+        connections = []
+        try:
+            for _ in range(self.min_connections):
+                connections.append(self.get_connection())
+            while connections:
+                connection = connections.pop()
+                try:
+                    connection.cur.execute(statement)
+                except Exception:
+                    self.discard_connection(connection)
+                    raise
+                self.return_connection(connection)
+        finally:
+            for connection in connections:
+                self.return_connection(connection)
+
+    def close(self):
+        """Closes the idle connections and stops the executor. Connections in use are closed when returned"""
+        with self.lock:
+            self.closed = True
+            idle_connections = list(self.idle_connections)
+            self.idle_connections.clear()
+            self.num_open_connections -= len(idle_connections)
+        for connection in idle_connections:
+            connection.close()
+        self.executor.shutdown(wait = False)
+
+    def get_statistics(self):
+        with self.lock:
+            return {
+                'inUse': self.num_used_connections,
+                'idle': len(self.idle_connections),
+                'waiting': len(self.waiters),
+                'open': self.num_open_connections,
+                'created': self.num_created_connections,
+                'timeouts': self.num_timeouts,
+                'minConnections': self.min_connections,
+                'maxConnections': self.max_connections}
 
 class DBConnection():
     """DB connection reference"""
@@ -58,5 +323,56 @@ class DBConnection():
         self.connection = self.pool.get_connection()
         return self.connection
     def __exit__(self, exception_type, exception_value, traceback):
-        self.pool.return_connection(self.connection)
+        self.pool.release_connection(self.connection, exception_type is not None)
 
+class AsyncDBConnection():
+    """DB connection reference for coroutines.
+    hdbcli calls are executed on the executor of the pool, so the event loop is not blocked"""
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+        self.connection = None
+    async def __aenter__(self):
+        with phase('db_connect'):
+            self.connection = await self.pool.get_connection_async()
+        return self
+    async def __aexit__(self, exception_type, exception_value, traceback):
+        if exception_type is None and self.connection.is_connected():
+            self.pool.return_connection(self.connection)
+            return
+        # shielded, so that the connection is released even if the request is cancelled meanwhile
+        await asyncio.shield(asyncio.ensure_future(\
+            self.run(self.pool.release_connection, self.connection, exception_type is not None)))
+    @property
+    def con(self):
+        return self.connection.con
+    @property
+    def cur(self):
+        return self.connection.cur
+    async def run(self, func, *args, **kwargs):
+        """Runs a blocking function on the executor of the pool.
+        The function runs in a copy of the context, so request timing and the tenant of the slow log are available"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool.executor, copy_context().run, partial(func, *args, **kwargs))
+    async def execute(self, sql, parameters = None):
+        with phase('db_execute'):
+            if parameters is None:
+                return await self.run(self.connection.cur.execute, sql)
+            return await self.run(self.connection.cur.execute, sql, parameters)
+    async def executemany(self, sql, rows):
+        with phase('db_executemany'):
+            return await self.run(self.connection.cur.executemany, sql, rows)
+    async def fetchone(self):
+        with phase('db_fetch'):
+            return await self.run(self.connection.cur.fetchone)
+    async def fetchall(self):
+        with phase('db_fetch'):
+            return await self.run(self.connection.cur.fetchall)
+    async def fetchmany(self, size):
+        with phase('db_fetch'):
+            return await self.run(self.connection.cur.fetchmany, size)
+    async def commit(self):
+        with phase('db_commit'):
+            return await self.run(self.connection.con.commit)
+    async def rollback(self):
+        with phase('db_rollback'):
+            return await self.run(self.connection.con.rollback)
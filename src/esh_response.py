@@ -0,0 +1,56 @@
+'''Processing of ESH_SEARCH results without parsing the complete JSON document'''
+import json
+
+SEARCH_STATISTICS_KEY = '"@com.sap.vocabularies.Search.v1.SearchStatistics"'
+WHITESPACE = ' \t\r\n'
+decoder = json.JSONDecoder()
+
+def is_unescaped(raw: str, pos: int):
+    backslashes = 0
+    while pos > backslashes and raw[pos - backslashes - 1] == '\\':
+        backslashes += 1
+    return backslashes % 2 == 0
+
+def find_value(raw: str, key: str, start: int = 0):
+    """Returns the position of the value of the object member key (including quotes) or -1.
+    Occurrences of key within string values are skipped. Their quotes are escaped
+    or they are not followed by a colon."""
+    pos = raw.find(key, start)
+    while pos != -1:
+        end = pos + len(key)
+        if is_unescaped(raw, pos):
+            while end < len(raw) and raw[end] in WHITESPACE:
+                end += 1
+            if end < len(raw) and raw[end] == ':':
+                end += 1
+                while end < len(raw) and raw[end] in WHITESPACE:
+                    end += 1
+                return end
+        pos = raw.find(key, pos + 1)
+    return -1
+
+def cleanse_search_statistics(statistics):
+    if isinstance(statistics, dict) and 'ConnectorStatistics' in statistics:
+        for c in statistics['ConnectorStatistics']:
+            c.pop('Schema', None)
+            c.pop('Name', None)
+    return statistics
+
+def cleanse_result(raw: str):
+    """Removes schema and table names from the connector statistics of an ESH_SEARCH result.
+    Only the search statistics are parsed, the rest of the document is copied unchanged"""
+    parts = []
+    start = 0
+    while (pos := find_value(raw, SEARCH_STATISTICS_KEY, start)) != -1:
+        statistics, end = decoder.raw_decode(raw, pos)
+        parts.append(raw[start:pos])
+        parts.append(json.dumps(cleanse_search_statistics(statistics)))
+        start = end
+    if not parts:
+        return raw
+    parts.append(raw[start:])
+    return ''.join(parts)
+
+def join_results(raw_results):
+    """JSON array of the raw results"""
+    return '[' + ','.join(raw_results) + ']'
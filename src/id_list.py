@@ -0,0 +1,20 @@
+'''Binding of ID lists as statement parameters'''
+
+# Chunks are padded to one of these sizes, so that HANA prepares and caches only a few statements per table
+ID_LIST_BUCKETS = (1, 8, 64, 512)
+
+def get_placeholders(size: int):
+    return ', '.join(['?'] * size)
+
+def chunk_id_list(ids: list):
+    """Splits the distinct ids into chunks of bucket size.
+    Chunks are padded with None which does not match any row.
+    Returns list of tuples (bucket size, parameters)"""
+    ids = list(dict.fromkeys(ids))
+    max_size = ID_LIST_BUCKETS[-1]
+    chunks = []
+    for start in range(0, len(ids), max_size):
+        chunk = ids[start:start + max_size]
+        size = next(w for w in ID_LIST_BUCKETS if w >= len(chunk))
+        chunks.append((size, chunk + [None] * (size - len(chunk))))
+    return chunks
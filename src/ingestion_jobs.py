@@ -0,0 +1,157 @@
+'''Queue of asynchronous ingestion jobs.
+Jobs are processed by a fixed number of worker tasks. Jobs of higher priority are processed first.
+Within a priority, the tenants take turns, so that a tenant with many jobs does not delay the
+jobs of other tenants. Finished jobs are kept for status requests until max_finished newer jobs finished.
+All state is kept per event loop, so no locks are needed.'''
+import asyncio
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+import logging
+import uuid
+from constants import JobPriority
+
+# processing order of the priorities
+PRIORITY_ORDER = (JobPriority.HIGH, JobPriority.NORMAL, JobPriority.LOW)
+
+class JobError(Exception):
+    """Expected error of a job, e.g. invalid data. The message is returned as error of the job"""
+
+class QueueFullException(Exception):
+    pass
+
+def now():
+    return datetime.now(timezone.utc).isoformat()
+
+class Job():
+    """Ingestion job. payload is released when the job is finished"""
+    def __init__(self, tenant_id: str, priority: JobPriority, payload, num_objects: int):
+        self.id = str(uuid.uuid4())
+        self.tenant_id = tenant_id
+        self.priority = priority
+        self.payload = payload
+        self.state = 'queued'
+        self.phase = 'queued'
+        self.created_at = now()
+        self.started_at = None
+        self.finished_at = None
+        self.num_objects = num_objects
+        self.num_processed = 0
+        self.rows = {}
+        self.error = None
+        self.result = None
+
+    def add_rows(self, row_counts: dict):
+        for table_name, row_count in row_counts.items():
+            self.rows[table_name] = self.rows.get(table_name, 0) + row_count
+
+    def get_status(self):
+        status = {
+            'id': self.id,
+            'tenant': self.tenant_id,
+            'priority': self.priority.value,
+            'state': self.state,
+            'phase': self.phase,
+            'createdAt': self.created_at,
+            'startedAt': self.started_at,
+            'finishedAt': self.finished_at,
+            'objects': {'total': self.num_objects, 'processed': self.num_processed},
+            'rows': dict(self.rows)}
+        if self.error is not None:
+            status['error'] = self.error
+        if self.result is not None:
+            status['result'] = self.result
+        return status
+
+class JobQueue():
+    """handler(job) processes a job and returns its result. It may update phase, num_processed and rows"""
+    def __init__(self, handler, num_workers: int = 2, max_queued: int = 100, max_finished: int = 1000):
+        self.handler = handler
+        self.num_workers = num_workers
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        # job queues by priority and tenant. The tenant served last is moved to the end
+        self.queues = {w: OrderedDict() for w in PRIORITY_ORDER}
+        self.num_queued = 0
+        self.jobs = {}
+        self.finished = deque()
+        self.condition = None
+        self.workers = []
+
+    def start(self):
+        self.condition = asyncio.Condition()
+        self.workers = [asyncio.create_task(self.work()) for _ in range(self.num_workers)]
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions = True)
+        self.workers = []
+
+    async def submit(self, tenant_id: str, priority: JobPriority, payload, num_objects: int):
+        if self.num_queued >= self.max_queued:
+            raise QueueFullException(f'Ingestion queue is full ({self.max_queued} jobs)')
+        job = Job(tenant_id, priority, payload, num_objects)
+        self.jobs[job.id] = job
+        tenant_queues = self.queues[priority]
+        if tenant_id in tenant_queues:
+            tenant_queues[tenant_id].append(job)
+        else:
+            tenant_queues[tenant_id] = deque([job])
+        self.num_queued += 1
+        async with self.condition:
+            self.condition.notify()
+        return job
+
+    def get(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    def next_job(self):
+        for priority in PRIORITY_ORDER:
+            tenant_queues = self.queues[priority]
+            if tenant_queues:
+                tenant_id, jobs = tenant_queues.popitem(last = False)
+                job = jobs.popleft()
+                if jobs:
+                    tenant_queues[tenant_id] = jobs
+                self.num_queued -= 1
+                return job
+        return None
+
+    async def work(self):
+        while True:
+            async with self.condition:
+                await self.condition.wait_for(lambda: self.num_queued > 0)
+                job = self.next_job()
+            await self.run(job)
+
+    async def run(self, job: Job):
+        job.state = 'running'
+        job.started_at = now()
+        try:
+            job.result = await self.handler(job)
+            job.state = 'succeeded'
+        except JobError as e:
+            job.state = 'failed'
+            job.error = str(e)
+        except asyncio.CancelledError:
+            job.state = 'failed'
+            job.error = 'Server shut down'
+            raise
+        except Exception: #pylint: disable=broad-exception-caught
+            correlation_id = str(uuid.uuid4())
+            logging.exception('%s: ingestion job %s failed', correlation_id, job.id)
+            job.state = 'failed'
+            job.error = f'Error {correlation_id}'
+        finally:
+            job.phase = 'done'
+            job.finished_at = now()
+            job.payload = None
+            self.finished.append(job.id)
+            while len(self.finished) > self.max_finished:
+                self.jobs.pop(self.finished.popleft(), None)
+
+    def get_statistics(self):
+        states = {'queued': 0, 'running': 0, 'succeeded': 0, 'failed': 0}
+        for job in self.jobs.values():
+            states[job.state] += 1
+        return states
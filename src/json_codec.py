@@ -0,0 +1,61 @@
+'''JSON encoding and decoding for the server.
+orjson is used if it is installed, otherwise the json module of the standard library.
+Types not supported by the backend are converted with FastAPI's jsonable_encoder.'''
+import json
+from fastapi.encoders import jsonable_encoder
+from fastapi.routing import APIRoute
+from starlette.requests import Request
+from starlette.responses import Response
+from timing import phase
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson:
+    BACKEND = 'orjson'
+    DUMPS_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumpb(obj) -> bytes:
+        return orjson.dumps(obj, default = jsonable_encoder, option = DUMPS_OPTIONS)
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj, default = jsonable_encoder, option = DUMPS_OPTIONS).decode('utf-8')
+
+    # orjson.JSONDecodeError is a subclass of json.JSONDecodeError
+    loads = orjson.loads
+else:
+    BACKEND = 'json'
+    encoder = json.JSONEncoder(ensure_ascii = False, separators = (',', ':'), default = jsonable_encoder)
+
+    def dumpb(obj) -> bytes:
+        return encoder.encode(obj).encode('utf-8')
+
+    def dumps(obj) -> str:
+        return encoder.encode(obj)
+
+    loads = json.loads
+
+class CodecJSONResponse(Response):
+    """JSON response encoded with the codec. Endpoints returning large objects should return it
+    directly, because FastAPI converts other return values with jsonable_encoder first"""
+    media_type = 'application/json'
+
+    def render(self, content) -> bytes:
+        with phase('response'):
+            return dumpb(content)
+
+class CodecRequest(Request):
+    """Request with the JSON body decoded by the codec"""
+    async def json(self):
+        if not hasattr(self, '_json'):
+            self._json = loads(await self.body())
+        return self._json
+
+class CodecRoute(APIRoute):
+    """Route which decodes JSON request bodies with the codec"""
+    def get_route_handler(self):
+        route_handler = super().get_route_handler()
+        async def codec_route_handler(request: Request) -> Response:
+            return await route_handler(CodecRequest(request.scope, request.receive))
+        return codec_route_handler
@@ -0,0 +1,78 @@
+'''Process-wide cache of the tenant mappings'''
+from collections import OrderedDict
+import threading
+import time
+
+MAX_METADATA_DOCUMENTS = 32
+
+class MappingCacheEntry():
+    """Mapping and read plans of one tenant. The version is the CREATED_AT timestamp of the _MODEL entry.
+    metadata holds the $metadata documents of the model by (ESH version, path) as tuples (ETag, document)"""
+    def __init__(self, version, mapping, size: int, read_plans = None):
+        self.version = version
+        self.mapping = mapping
+        self.read_plans = read_plans
+        self.metadata = {}
+        self.size = size
+        self.checked_at = time.monotonic()
+
+class MappingCache():
+    """LRU cache of tenant mappings with a memory budget.
+    The size of an entry is estimated by the length of the serialized mapping and of its $metadata documents.
+    Entries older than check_interval seconds need to be confirmed by a version check
+    because other worker processes may have changed the model."""
+    def __init__(self, max_size: int = 256 * 1024 * 1024, check_interval: float = 5) -> None:
+        self.max_size = max_size
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def get(self, tenant_id: str):
+        with self.lock:
+            entry = self.entries.get(tenant_id)
+            if entry:
+                self.entries.move_to_end(tenant_id)
+            return entry
+
+    def needs_check(self, entry: MappingCacheEntry):
+        return time.monotonic() - entry.checked_at > self.check_interval
+
+    @staticmethod
+    def confirm(entry: MappingCacheEntry):
+        entry.checked_at = time.monotonic()
+
+    def put(self, tenant_id: str, version, mapping, size: int, read_plans = None):
+        entry = MappingCacheEntry(version, mapping, size, read_plans)
+        with self.lock:
+            if tenant_id in self.entries:
+                self.size -= self.entries.pop(tenant_id).size
+            if size > self.max_size:
+                return entry
+            self.entries[tenant_id] = entry
+            self.size += size
+            self.evict()
+        return entry
+
+    def put_metadata(self, tenant_id: str, entry: MappingCacheEntry, key, etag: str, document: str):
+        """Adds a $metadata document to the entry of the tenant. Its length is added to the size of the entry.
+        At most MAX_METADATA_DOCUMENTS documents are kept per entry, further ones are not cached"""
+        with self.lock:
+            if key in entry.metadata or len(entry.metadata) >= MAX_METADATA_DOCUMENTS:
+                return
+            entry.metadata[key] = (etag, document)
+            entry.size += len(document)
+            if self.entries.get(tenant_id) is entry:
+                self.size += len(document)
+                self.evict()
+
+    def evict(self):
+        """Evicts least recently used entries until the memory budget is kept. Caller must hold the lock"""
+        while self.size > self.max_size:
+            _, evicted = self.entries.popitem(last = False)
+            self.size -= evicted.size
+
+    def invalidate(self, tenant_id: str):
+        with self.lock:
+            if tenant_id in self.entries:
+                self.size -= self.entries.pop(tenant_id).size
@@ -0,0 +1,137 @@
+'''In-process metrics in the Prometheus text exposition format'''
+from bisect import bisect_left
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values, extra = ''):
+    labels = [f'{k}="{escape(v)}"' for k, v in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+class Metric():
+    """Base class. Values are kept per tuple of label values"""
+    kind = ''
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.lock = threading.Lock()
+        self.values = {}
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            values = list(self.values.items())
+        for labels, value in values:
+            lines.extend(self.render_value(labels, value))
+        return lines
+    def render_value(self, labels, value):
+        return [f'{self.name}{format_labels(self.labelnames, labels)} {value}']
+
+class Counter(Metric):
+    kind = 'counter'
+    def inc(self, *labels, amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+class CallbackMetric(Metric):
+    """Gauge or counter whose values are returned by a callback when the metrics are rendered.
+    The callback returns a dictionary of label value tuples to values"""
+    def __init__(self, name: str, documentation: str, labelnames: tuple, callback, kind: str = 'gauge'):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.kind = kind
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for labels, value in self.callback().items():
+            lines.extend(self.render_value(labels, value))
+        return lines
+
+class Histogram(Metric):
+    """Histogram with fixed buckets. A value is a list of the bucket counts followed by count and sum"""
+    kind = 'histogram'
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+    def observe(self, value: float, *labels):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+    def render_value(self, labels, value):
+        with self.lock:
+            counts = list(value)
+        lines = []
+        cumulated = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulated += count
+            le = f'le="{bound}"'
+            lines.append(f'{self.name}_bucket{format_labels(self.labelnames, labels, le)} {cumulated}')
+        le = 'le="+Inf"'
+        lines.append(f'{self.name}_bucket{format_labels(self.labelnames, labels, le)} {counts[-2]}')
+        lines.append(f'{self.name}_count{format_labels(self.labelnames, labels)} {counts[-2]}')
+        lines.append(f'{self.name}_sum{format_labels(self.labelnames, labels)} {counts[-1]}')
+        return lines
+
+class Registry():
+    """Metrics by name. A metric replaces the registered metric with the same name, e.g. if the
+    module registering it is executed as main module and imported by the server"""
+    def __init__(self):
+        self.metrics = {}
+    def register(self, metric: Metric):
+        self.metrics[metric.name] = metric
+        return metric
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+request_duration = registry.register(Histogram('http_request_duration_seconds',\
+    'Duration of HTTP requests', ('route', 'method', 'status', 'tenant_class')))
+esh_search_duration = registry.register(Histogram('esh_search_duration_seconds',\
+    'Duration of ESH_SEARCH calls', ('type',)))
+esh_search_errors = registry.register(Counter('esh_search_errors_total',\
+    'Failed ESH_SEARCH calls', ('type',)))
+dml_rows = registry.register(Counter('dml_rows_total', 'Rows written by executemany', ('table',)))
+dml_duration = registry.register(Histogram('dml_executemany_duration_seconds',\
+    'Duration of executemany calls', ('table',)))
+mapping_load_duration = registry.register(Histogram('mapping_load_duration_seconds',\
+    'Duration of loading and compiling a tenant mapping'))
+
+class MetricsMiddleware():
+    """ASGI middleware which observes the duration of HTTP requests.
+    The route is the path template of the matched route, so that the number of series is bounded"""
+    def __init__(self, app, tenant_class = None):
+        self.app = app
+        self.tenant_class = tenant_class
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get('route')
+            tenant_id = scope.get('path_params', {}).get('tenant_id')
+            tenant_class = self.tenant_class(tenant_id) if self.tenant_class and tenant_id else ''
+            request_duration.observe(time.perf_counter() - start, route.path if route else '',\
+                scope['method'], status, tenant_class)
@@ -0,0 +1,231 @@
+'''Compiled read plans which assemble objects from the rows of the entity tables'''
+import base64
+import json_codec
+from constants import TYPES_B64_ENCODE, TYPES_SPATIAL
+from id_list import get_placeholders
+
+def b64_encode(value):
+    return base64.encodebytes(value).decode('utf-8')
+
+def get_converter(typ):
+    if typ in TYPES_B64_ENCODE:
+        return b64_encode
+    elif typ in TYPES_SPATIAL:
+        return json_codec.loads
+    return None
+
+class TablePlan():
+    """Read plan of one table.
+    Each step sets one property of the assembled object. A step is a tuple
+    (row index, path prefix, property name, value converter, contained table name)"""
+    def __init__(self, mapping, table):
+        self.table_name = table['table_name']
+        self.select = table['sql']['select']
+        self.select_statements = {}
+        # root key is added as last column and used for ordering for streaming reads
+        root_key = get_root_key_column(mapping, table)
+        self.stream_select = self.select.replace(' from ', f', {root_key} from ', 1) + f' order by {root_key}'
+        self.stream_select_statements = {}
+        self.level = table['level']
+        self.steps = []
+        self.key_index = 0
+        self.value_converter = None
+        self.is_value_table = '_VALUE' in table['columns']
+        if self.is_value_table:
+            self.value_converter = get_converter(table['columns']['_VALUE']['type'])
+            return
+        selected = [k for k, v in table['columns'].items() if not ('isVirtual' in v and v['isVirtual'])]
+        pk_index = selected.index(table['pk'])
+        if self.level == 0:
+            self.key_index = pk_index
+        else:
+            self.key_index = selected.index(table['pkParent'])
+        i = 0
+        for prop_name, prop in table['columns'].items():
+            if 'isVirtual' in prop and prop['isVirtual']:
+                if prop['rel']['type'] == 'containment':
+                    self.add_step(pk_index, prop['external_path'], None, prop['rel']['table_name'])
+                continue
+            if prop_name == table['pk']:
+                if self.level == 0:
+                    self.add_step(i, prop['external_path'], get_converter(prop['type']))
+            elif self.level > 0 and prop_name == table['pkParent']:
+                pass
+            elif 'rel' in prop and prop['rel']['type'] == 'association':
+                rel_table = mapping['tables'][prop['rel']['table_name']]
+                path = prop['external_path'] + rel_table['columns'][rel_table['pk']]['external_path']
+                self.add_step(i, path, get_converter(prop['type']))
+            else:
+                self.add_step(i, prop['external_path'], get_converter(prop['type']))
+            i += 1
+
+    def get_select(self, id_list_size: int):
+        """Select statement with id_list_size parameters for the ID list"""
+        if not id_list_size in self.select_statements:
+            self.select_statements[id_list_size] = self.select.format(id_list = get_placeholders(id_list_size))
+        return self.select_statements[id_list_size]
+
+    def get_stream_select(self, id_list_size: int):
+        """Select statement ordered by root key with the root key as last column"""
+        if not id_list_size in self.stream_select_statements:
+            self.stream_select_statements[id_list_size] =\
+                self.stream_select.format(id_list = get_placeholders(id_list_size))
+        return self.stream_select_statements[id_list_size]
+
+    def add_step(self, index, path, converter, contained_table_name = None):
+        self.steps.append((index, tuple(path[:-1]), path[-1], converter, contained_table_name))
+
+    def assemble(self, rows, all_objects):
+        """Assembles the objects of the rows. The objects of contained tables must be assembled before.
+        Returns a dictionary by key (root table) or a dictionary of object lists by parent key (sub-tables)"""
+        objects = {}
+        if self.is_value_table:
+            converter = self.value_converter
+            for row in rows:
+                key = row[0]
+                value = row[2]
+                if converter:
+                    value = converter(value)
+                if key in objects:
+                    objects[key].append(value)
+                else:
+                    objects[key] = [value]
+            return objects
+        steps = [(index, prefix, name, converter, all_objects[contained] if contained else None)\
+            for index, prefix, name, converter, contained in self.steps]
+        key_index = self.key_index
+        is_root = self.level == 0
+        for row in rows:
+            obj = {}
+            for index, prefix, name, converter, contained_objects in steps:
+                if contained_objects is None:
+                    value = row[index]
+                    if value is None:
+                        continue
+                    if converter:
+                        value = converter(value)
+                else:
+                    value = contained_objects.get(row[index])
+                    if value is None:
+                        continue
+                if not prefix:
+                    obj[name] = value
+                    continue
+                target = obj
+                for step in prefix:
+                    if step in target:
+                        target = target[step]
+                    else:
+                        target[step] = {}
+                        target = target[step]
+                target[name] = value
+            if is_root:
+                objects[row[key_index]] = obj
+            elif row[key_index] in objects:
+                objects[row[key_index]].append(obj)
+            else:
+                objects[row[key_index]] = [obj]
+        return objects
+
+class ReadPlan():
+    """Read plan of one entity. Tables are ordered such that contained tables are read first"""
+    def __init__(self, mapping, entity):
+        root_table = mapping['tables'][entity['table_name']]
+        self.root_table_name = root_table['table_name']
+        self.key_property = root_table['columns'][root_table['pk']]['external_path'][0]
+        self.tables = [TablePlan(mapping, w) for w in get_table_sequence(mapping, root_table)]
+
+class RowReader():
+    """Reads rows with fetchmany from a cursor. The last column of a row is the root key"""
+    def __init__(self, cursor, fetch_size: int):
+        self.cursor = cursor
+        self.fetch_size = fetch_size
+        self.rows = []
+        self.pos = 0
+        self.exhausted = False
+
+    def peek(self):
+        if self.pos >= len(self.rows):
+            if self.exhausted:
+                return None
+            self.rows = self.cursor.fetchmany(self.fetch_size)
+            self.pos = 0
+            if not self.rows:
+                self.exhausted = True
+                return None
+        return self.rows[self.pos]
+
+    def next_row(self):
+        row = self.peek()
+        if row is not None:
+            self.pos += 1
+        return row
+
+    def take_rows(self, root_key):
+        """Returns the rows of root_key. Rows with smaller root keys are skipped"""
+        rows = []
+        while True:
+            row = self.peek()
+            if row is None or row[-1] > root_key:
+                return rows
+            self.pos += 1
+            if row[-1] == root_key:
+                rows.append(row)
+
+class ObjectStream():
+    """Assembles the objects of one ID list in a single pass.
+    All tables are read with their own cursor ordered by root key, so only the rows
+    of the current root object and the fetched rows are held in memory"""
+    def __init__(self, con, read_plan: ReadPlan, id_list_size: int, id_list: list, fetch_size: int):
+        """con is a connection or a SharedConnection, whose cursors record slow operations"""
+        self.fetch_size = fetch_size
+        self.readers = []
+        try:
+            for table_plan in read_plan.tables:
+                cursor = con.cursor()
+                self.readers.append((table_plan, RowReader(cursor, fetch_size)))
+                cursor.execute(table_plan.get_stream_select(id_list_size), id_list)
+        except Exception:
+            self.close()
+            raise
+
+    def next_objects(self):
+        """Returns the next objects, at most fetch_size. An empty list is returned at the end"""
+        root_plan, root_reader = self.readers[-1]
+        objects = []
+        while len(objects) < self.fetch_size:
+            root_row = root_reader.next_row()
+            if root_row is None:
+                break
+            root_key = root_row[-1]
+            all_objects = {}
+            for table_plan, reader in self.readers[:-1]:
+                all_objects[table_plan.table_name] = table_plan.assemble(reader.take_rows(root_key), all_objects)
+            objects.append(root_plan.assemble([root_row], all_objects)[root_key])
+        return objects
+
+    def close(self):
+        for _, reader in self.readers:
+            reader.cursor.close()
+
+def get_root_key_column(mapping, table):
+    if table['level'] == 0:
+        return f'"{table["pk"]}"'
+    if table['level'] == 1:
+        return f'"{table["pkParent"]}"'
+    while table['level'] > 1:
+        table = mapping['tables'][table['parent']]
+    return f'L1."{table["pkParent"]}"'
+
+def get_table_sequence(mapping, current_table, table_sequence = None):
+    if table_sequence is None:
+        table_sequence = []
+    for prop in current_table['columns'].values():
+        if 'rel' in prop and prop['rel']['type'] == 'containment':
+            next_table = mapping['tables'][prop['rel']['table_name']]
+            get_table_sequence(mapping, next_table, table_sequence)
+    table_sequence.append(current_table)
+    return table_sequence
+
+def compile_read_plans(mapping):
+    return {k: ReadPlan(mapping, v) for k, v in mapping['entities'].items()}
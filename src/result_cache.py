@@ -0,0 +1,83 @@
+'''Cache for results of ESH_SEARCH calls'''
+from collections import OrderedDict
+import threading
+import time
+
+class ResultCache():
+    """Cache with time-to-live and LRU eviction. Keys are tuples starting with the tenant id,
+    so that all entries of a tenant can be invalidated after data or model changes.
+    The size of an entry is the length of the result string returned by the DB.
+    Each invalidation increments the generation of the tenant. A result is only put into the cache if
+    the generation read before the search is still current, so results of searches which overlap
+    a write are not cached."""
+    def __init__(self, max_size: int = 64 * 1024 * 1024, ttl: float = 30) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.tenant_keys = {}
+        self.generations = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            if entry:
+                self.remove(key)
+            self.misses += 1
+            return None
+
+    def get_generation(self, tenant_id: str):
+        with self.lock:
+            return self.generations.get(tenant_id, 0)
+
+    def put(self, key: tuple, value, size: int, generation: int = None):
+        """If generation is given, value is not cached if the tenant was invalidated meanwhile"""
+        if size > self.max_size:
+            return
+        with self.lock:
+            if generation is not None and generation != self.generations.get(key[0], 0):
+                return
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (time.monotonic() + self.ttl, size, value)
+            self.tenant_keys.setdefault(key[0], set()).add(key)
+            self.size += size
+            while self.size > self.max_size:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def remove(self, key: tuple):
+        """Removes one entry. Caller must hold the lock"""
+        _, size, _ = self.entries.pop(key)
+        self.size -= size
+        tenant_keys = self.tenant_keys[key[0]]
+        tenant_keys.discard(key)
+        if not tenant_keys:
+            del self.tenant_keys[key[0]]
+
+    def invalidate_tenant(self, tenant_id: str):
+        with self.lock:
+            self.generations[tenant_id] = self.generations.get(tenant_id, 0) + 1
+            if tenant_id in self.tenant_keys:
+                for key in list(self.tenant_keys[tenant_id]):
+                    self.remove(key)
+                self.invalidations += 1
+
+    def get_statistics(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'size': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations}
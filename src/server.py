@@ -1,29 +1,134 @@
 '''
 Provides HTTP(S) interfaces
 '''
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime
 from fastapi import FastAPI, Request, Body, HTTPException, Response
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from starlette.responses import RedirectResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+import hashlib
 import json
+import os
+import time
 import uuid
-from db_connection_pool import DBConnection, ConnectionPool, Credentials
+from db_connection_pool import DBConnection, AsyncDBConnection, ConnectionPool, Credentials, PoolTimeoutException,\
+    SharedConnection
 import convert
 import sqlcreate
 from esh_objects import IESSearchOptions
-import httpx
+from mapping_cache import MappingCache
+from result_cache import ResultCache
+from single_flight import SingleFlight
+from asset_proxy import AssetProxy
+from esh_response import cleanse_result, join_results
+import json_codec
+from json_codec import CodecJSONResponse, CodecRoute
+import metrics
+from metrics import MetricsMiddleware, CallbackMetric
+from timing import TimingMiddleware, phase
+from slow_log import SlowOperationLog, current_tenant
+from admission import AdmissionController, AdmissionMiddleware
+from ingestion_jobs import JobQueue, JobError, QueueFullException
+from write_coalescer import WriteCoalescer
+from read_plan import compile_read_plans, get_table_sequence, ObjectStream
+from id_list import chunk_id_list, get_placeholders
+from data_load import execute_inserts, merge_inserts, read_ndjson
+import upsert
+from source_index import read_source_ids, resolve_sources, write_source_keys, delete_source_keys,\
+    forget_resolved_sources
+from content_hash import content_hash as get_content_hash
 import uvicorn
 from hdbcli.dbapi import Error as HDBException
-from hdbcli.dbapi import DataError
+from hdbcli.dbapi import DataError, IntegrityError
 import logging
-from constants import DBUserType, TENANT_PREFIX, TENANT_ID_MAX_LENGTH, TYPES_B64_ENCODE, TYPES_SPATIAL
+from constants import DBUserType, TENANT_PREFIX, TENANT_ID_MAX_LENGTH,\
+    POOL_DEFAULT_SETTINGS, MAPPING_CACHE_DEFAULT_SETTINGS, SEARCH_CACHE_DEFAULT_SETTINGS, UI_ASSETS_DEFAULT_SETTINGS,\
+    WARM_UP_DEFAULT_SETTINGS, INGESTION_DEFAULT_SETTINGS, GROUP_COMMIT_DEFAULT_SETTINGS,\
+    ADMISSION_DEFAULT_SETTINGS, ADMISSION_CLASS_DEFAULT_SETTINGS,\
+    BULK_SEARCH_DEFAULT_SETTINGS, METRICS_DEFAULT_SETTINGS, DEBUG_DEFAULT_SETTINGS, SLOW_LOG_DEFAULT_SETTINGS,\
+    STREAM_DEFAULT_BATCH_SIZE, STREAM_MAX_BATCH_SIZE, READ_STREAM_FETCH_SIZE, StreamCommitMode, LoadMode,\
+    JobPriority
 from config import get_user_name
 import sys
 #import logging
 import server_globals as glob
-import base64
 
 # run with uvicorn src.server:app --reload
-app = FastAPI()
+CONFIG_FILE = 'src/.config.json'
+
+@asynccontextmanager
+async def lifespan(l_app: FastAPI):
+    """Each worker process reads the configuration and builds its pools and caches on startup.
+    The DB connections are opened in the background, so that the port is bound without waiting for the DB"""
+    #pylint: disable=unused-argument
+    logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
+    initialize(load_config())
+    if glob.ingestion_jobs is not None:
+        glob.ingestion_jobs.start()
+    warm_up_task = asyncio.create_task(warm_up())
+    try:
+        yield
+    finally:
+        warm_up_task.cancel()
+        await shutdown()
+
+app = FastAPI(lifespan=lifespan, default_response_class=CodecJSONResponse)
+app.router.route_class = CodecRoute
+search_flights = SingleFlight()
+
+def get_tenant_class(tenant_id: str):
+    return glob.tenant_classes.get(tenant_id, 'default')
+
+def get_pool_metrics():
+    res = {}
+    for user_type, pool in glob.connection_pools.items():
+        statistics = pool.get_statistics()
+        for state, key in (('idle', 'idle'), ('in_use', 'inUse'), ('waiting', 'waiting'), ('open', 'open')):
+            res[(user_type.value, state)] = statistics[key]
+    return res
+
+def get_pool_timeout_metrics():
+    return {(k.value,): v.get_statistics()['timeouts'] for k, v in glob.connection_pools.items()}
+
+def get_ingestion_job_metrics():
+    if glob.ingestion_jobs is None:
+        return {}
+    return {(k,): v for k, v in glob.ingestion_jobs.get_statistics().items()}
+
+# operation classes of the admission control by endpoint name
+OPERATION_CLASSES = {
+    'post_tenant': 'deploy', 'delete_tenant': 'deploy', 'post_model': 'deploy',
+    'post_data': 'write', 'put_data': 'write', 'post_data_stream': 'write', 'post_data_job': 'write',
+    'delete_data': 'write',
+    'read_data': 'read', 'read_data_stream': 'read',
+    'get_search': 'search', 'post_search': 'search', 'search_v2': 'search',
+    'get_search_metadata': 'search', 'get_search_metadata_entity_set': 'search'}
+
+def classify_request(scope):
+    """Returns the tenant id and operation class of the route matching the request"""
+    for route in app.router.routes:
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            operation = OPERATION_CLASSES.get(getattr(route, 'name', ''))
+            tenant_id = child_scope.get('path_params', {}).get('tenant_id')
+            # requests with invalid tenant ids are rejected by the endpoint and don't create limits
+            if not (operation and tenant_id and tenant_id.isalnum() and len(tenant_id) <= TENANT_ID_MAX_LENGTH):
+                return None
+            return tenant_id, operation
+    return None
+
+app.add_middleware(AdmissionMiddleware, controller=lambda: glob.admission, classify=classify_request)
+app.add_middleware(TimingMiddleware, enabled=lambda: glob.timing_enabled)
+app.add_middleware(MetricsMiddleware, tenant_class=get_tenant_class)
+metrics.registry.register(CallbackMetric('db_pool_connections', 'Connections of the pools by state',\
+    ('user_type', 'state'), get_pool_metrics))
+metrics.registry.register(CallbackMetric('db_pool_timeouts_total', 'Requests which got no connection in time',\
+    ('user_type',), get_pool_timeout_metrics, 'counter'))
+metrics.registry.register(CallbackMetric('ingestion_jobs', 'Ingestion jobs of this worker process by state',\
+    ('state',), get_ingestion_job_metrics))
 
 def handle_error(msg: str = '', status_code: int = -1):
     if status_code == -1:
@@ -33,6 +138,13 @@ def handle_error(msg: str = '', status_code: int = -1):
     else:
         raise HTTPException(status_code, msg)
 
+@app.exception_handler(PoolTimeoutException)
+async def pool_timeout_exception_handler(request: Request, exc: PoolTimeoutException):
+    #pylint: disable=unused-argument
+    logging.warning(str(exc))
+    return JSONResponse(status_code=503, content={'detail': 'Service temporarily overloaded'},\
+        headers={'Retry-After': '1'})
+
 def validate_tenant_id(tenant_id: str):
     if not tenant_id.isalnum():
         handle_error('Tenant-ID must be alphanumeric', 400)
@@ -41,37 +153,37 @@ def validate_tenant_id(tenant_id: str):
 
 def get_tenant_schema_name(tenant_id: str):
     validate_tenant_id(tenant_id)
+    current_tenant.set(tenant_id)
     return f'{glob.db_tenant_prefix}{tenant_id}'
 
 def esh_search_escape(s):
     return s.replace("'","''")
 
-def cleanse_output(res_in):
-    res_out = []
-    for res in res_in:
-        if '@com.sap.vocabularies.Search.v1.SearchStatistics' in res \
-            and 'ConnectorStatistics' in res['@com.sap.vocabularies.Search.v1.SearchStatistics']:
-            for c in res['@com.sap.vocabularies.Search.v1.SearchStatistics']['ConnectorStatistics']:
-                del c['Schema']
-                del c['Name']
-        res_out.append(res)
-    return res_out
+def use_search_cache(request: Request):
+    """The search cache can be bypassed with the request header Cache-Control: no-cache"""
+    return glob.search_cache is not None and 'no-cache' not in request.headers.get('cache-control', '')
+
+def invalidate_search_results(tenant_id: str):
+    if glob.search_cache is not None:
+        glob.search_cache.invalidate_tenant(tenant_id)
+    # searches started after the change must not share the result of a search started before it
+    search_flights.forget(lambda key: key[0] == tenant_id)
 
 @app.post('/v1/tenant/{tenant_id}')
 async def post_tenant(tenant_id):
     """Create new tenant """
     tenant_schema_name = get_tenant_schema_name(tenant_id)
-    with DBConnection(glob.connection_pools[DBUserType.ADMIN]) as db:
+    async with AsyncDBConnection(glob.connection_pools[DBUserType.ADMIN]) as db:
         try:
             sql = f'create schema "{tenant_schema_name}"'
-            db.cur.execute(sql)
+            await db.execute(sql)
         except HDBException as e:
             if e.errorcode == 386:
                 handle_error(f"Tenant creation failed. Tennant id '{tenant_id}' already exists", 422)
             else:
                 handle_error(f'dbapi Error: {e.errorcode}, {e.errortext}')
         try:
-            db.cur.execute(\
+            await db.execute(\
                 f'create table "{tenant_schema_name}"."_MODEL" (CREATED_AT TIMESTAMP, CSON NCLOB, MAPPING NCLOB)')
         except HDBException as e:
             handle_error(f'dbapi Error: {e.errorcode}, {e.errortext}')
@@ -79,17 +191,17 @@ async def post_tenant(tenant_id):
             read_user_name = get_user_name(glob.db_schema_prefix, DBUserType.DATA_READ)
             write_user_name = get_user_name(glob.db_schema_prefix, DBUserType.DATA_WRITE)
             schema_modify_user_name = get_user_name(glob.db_schema_prefix, DBUserType.SCHEMA_MODIFY)
-            db.cur.execute(f'GRANT SELECT ON SCHEMA "{tenant_schema_name}" TO {read_user_name}')
-            db.cur.execute(f'GRANT SELECT ON "{tenant_schema_name}"."_MODEL" TO {read_user_name}')
-            db.cur.execute(f'GRANT INSERT ON SCHEMA "{tenant_schema_name}" TO {write_user_name}')
-            db.cur.execute(f'GRANT SELECT ON SCHEMA "{tenant_schema_name}" TO {write_user_name}')
-            db.cur.execute(f'GRANT DELETE ON SCHEMA "{tenant_schema_name}" TO {write_user_name}')
-            db.cur.execute(f'GRANT SELECT ON "{tenant_schema_name}"."_MODEL" TO {schema_modify_user_name}')
-            db.cur.execute(f'GRANT INSERT ON "{tenant_schema_name}"."_MODEL" TO {schema_modify_user_name}')
-            db.cur.execute(f'GRANT DELETE ON "{tenant_schema_name}"."_MODEL" TO {schema_modify_user_name}')
-            db.cur.execute(f'GRANT CREATE ANY ON SCHEMA "{tenant_schema_name}" TO {schema_modify_user_name}')
-            db.cur.execute(f'GRANT DROP ON SCHEMA "{tenant_schema_name}" TO {schema_modify_user_name}')
-            db.cur.execute(f'GRANT ALTER ON SCHEMA "{tenant_schema_name}" TO {schema_modify_user_name}')
+            await db.execute(f'GRANT SELECT ON SCHEMA "{tenant_schema_name}" TO {read_user_name}')
+            await db.execute(f'GRANT SELECT ON "{tenant_schema_name}"."_MODEL" TO {read_user_name}')
+            await db.execute(f'GRANT INSERT ON SCHEMA "{tenant_schema_name}" TO {write_user_name}')
+            await db.execute(f'GRANT SELECT ON SCHEMA "{tenant_schema_name}" TO {write_user_name}')
+            await db.execute(f'GRANT DELETE ON SCHEMA "{tenant_schema_name}" TO {write_user_name}')
+            await db.execute(f'GRANT SELECT ON "{tenant_schema_name}"."_MODEL" TO {schema_modify_user_name}')
+            await db.execute(f'GRANT INSERT ON "{tenant_schema_name}"."_MODEL" TO {schema_modify_user_name}')
+            await db.execute(f'GRANT DELETE ON "{tenant_schema_name}"."_MODEL" TO {schema_modify_user_name}')
+            await db.execute(f'GRANT CREATE ANY ON SCHEMA "{tenant_schema_name}" TO {schema_modify_user_name}')
+            await db.execute(f'GRANT DROP ON SCHEMA "{tenant_schema_name}" TO {schema_modify_user_name}')
+            await db.execute(f'GRANT ALTER ON SCHEMA "{tenant_schema_name}" TO {schema_modify_user_name}')
             logging.info('Tenant schema created %s', tenant_schema_name)
         except HDBException as e:
             handle_error(f'dbapi Error: {e.errorcode}, {e.errortext}')
@@ -100,75 +212,169 @@ async def post_tenant(tenant_id):
 async def delete_tenant(tenant_id: str):
     """Delete tenant"""
     tenant_schema_name = get_tenant_schema_name(tenant_id)
-    with DBConnection(glob.connection_pools[DBUserType.ADMIN]) as db:
+    async with AsyncDBConnection(glob.connection_pools[DBUserType.ADMIN]) as db:
         try:
-            db.cur.execute(f'drop schema "{tenant_schema_name}" cascade')
+            await db.execute(f'drop schema "{tenant_schema_name}" cascade')
         except HDBException as e:
             if e.errorcode == 362:
                 handle_error(f"Tenant deletion failed. Tennant id '{tenant_id}' does not exist", 404)
             else:
                 handle_error(f'dbapi Error: {e.errorcode}, {e.errortext}')
+    glob.mapping_cache.invalidate(tenant_id)
+    invalidate_search_results(tenant_id)
     return {'detail': f"Tenant '{tenant_id}' successfully deleted"}
 
 @app.get('/v1/tenant')
 async def get_tenants():
     """Get all tenants"""
-    return get_tenants_sync()
+    async with AsyncDBConnection(glob.connection_pools[DBUserType.ADMIN]) as db:
+        return await db.run(read_tenants, db)
 
 
-def get_tenants_sync():
-    with DBConnection(glob.connection_pools[DBUserType.ADMIN]) as db:
-        try:
-            sql = f'select schema_name, create_time from sys.schemas \
-                where schema_name like \'{glob.db_tenant_prefix}%\' order by CREATE_TIME'
-            db.cur.execute(sql)
-            return [{'name': w[0][len(glob.db_tenant_prefix):], 'createdAt':  w[1]}  for w in db.cur.fetchall()]
-        except HDBException as e:
-            handle_error(f'dbapi Error: {e.errorcode}, {e.errortext}')
+@app.get('/health/live')
+async def get_liveness():
+    """The worker process is running and its event loop responds"""
+    return {'status': 'alive'}
+
+@app.get('/health/ready')
+async def get_readiness():
+    """The connection pools are open and the ESH API version is known. Otherwise status 503 is returned"""
+    pools = {k: dict(v) for k, v in glob.readiness['pools'].items()}
+    esh_api_version = dict(glob.readiness['eshApiVersion'])
+    ready = esh_api_version['ready'] and all(w['ready'] for w in pools.values())
+    return CodecJSONResponse({'ready': ready, 'pools': pools, 'eshApiVersion': esh_api_version},\
+        status_code = 200 if ready else 503)
+
+@app.get('/v1/statistics/connectionpools')
+async def get_connection_pool_statistics():
+    """Get live counters of all connection pools"""
+    return {k.value: v.get_statistics() for k, v in glob.connection_pools.items()}
+
+@app.get('/metrics', response_class=PlainTextResponse)
+async def get_metrics():
+    """Metrics in the Prometheus text format"""
+    return PlainTextResponse(metrics.registry.render(), media_type='text/plain; version=0.0.4')
+
+@app.get('/v1/statistics/ingestionjobs')
+async def get_ingestion_job_statistics():
+    if glob.ingestion_jobs is None:
+        return {'enabled': False}
+    return {'enabled': True} | glob.ingestion_jobs.get_statistics()
+
+@app.get('/v1/statistics/slowoperations')
+async def get_slow_operations():
+    """Get the last slow DB operations"""
+    if glob.slow_log is None:
+        return []
+    return glob.slow_log.get_entries()
+
+@app.get('/v1/statistics/searchcache')
+async def get_search_cache_statistics():
+    """Get live counters of the search result cache"""
+    if glob.search_cache is None:
+        return {'enabled': False}
+    return {'enabled': True} | glob.search_cache.get_statistics()
+
+def read_tenants(db):
+    try:
+        sql = f'select schema_name, create_time from sys.schemas \
+            where schema_name like \'{glob.db_tenant_prefix}%\' order by CREATE_TIME'
+        db.cur.execute(sql)
+        return [{'name': w[0][len(glob.db_tenant_prefix):], 'createdAt':  w[1]}  for w in db.cur.fetchall()]
+    except HDBException as e:
+        handle_error(f'dbapi Error: {e.errorcode}, {e.errortext}')
+
+def get_tenants_sync(l_config):
+    """Reads the tenants with a separate connection. Is used before the server is started"""
+    glob.db_tenant_prefix = l_config['deployment']['schemaPrefix'] + TENANT_PREFIX
+    admin = l_config['db']['user'][DBUserType.ADMIN.value]
+    credentials = Credentials(l_config['db']['connection']['host'], l_config['db']['connection']['port'],\
+        admin['name'], admin['password'])
+    with SharedConnection(credentials) as db:
+        return read_tenants(db)
 
 
 
 @app.post('/v1/deploy/{tenant_id}')
-async def post_model(tenant_id: str, cson=Body(...)):
-    """ Deploy model """
+async def post_model(tenant_id: str, cson=Body(...), content_hash: bool = False, source_index: bool = False):
+    """ Deploy model. With content_hash, the root tables get a column with the content hash of the objects.
+    With source_index, the sources of the objects are stored, so that they can be referenced by later loads """
     tenant_schema_name = get_tenant_schema_name(tenant_id)
-    with DBConnection(glob.connection_pools[DBUserType.SCHEMA_MODIFY]) as db:
-        db.cur.execute(f'set schema "{tenant_schema_name}"')
-        db.cur.execute('select count(*) from "_MODEL"')
-        num_deployments = db.cur.fetchone()[0]
+    async with AsyncDBConnection(glob.connection_pools[DBUserType.SCHEMA_MODIFY]) as db:
+        await db.execute(f'set schema "{tenant_schema_name}"')
+        await db.execute('select count(*) from "_MODEL"')
+        num_deployments = (await db.fetchone())[0]
         if num_deployments == 0:
             created_at = datetime.now()
             try:
-                mapping = convert.cson_to_mapping(cson)
+                mapping = convert.cson_to_mapping(cson, with_content_hash = content_hash,\
+                    with_source_index = source_index)
                 ddl = sqlcreate.mapping_to_ddl(mapping, tenant_schema_name)
             except convert.ModelException as e:
                 handle_error(str(e), 400)
             try:
                 for sql in ddl['tables']:
-                    db.cur.execute(sql)
+                    await db.execute(sql)
                 for sql in ddl['views']:
-                    db.cur.execute(sql)
-                db.cur.execute(f"CALL ESH_CONFIG('{json.dumps(ddl['eshConfig'])}',?)")
+                    await db.execute(sql)
+                await db.execute(f"CALL ESH_CONFIG('{json_codec.dumps(ddl['eshConfig'])}',?)")
                 sql = 'insert into _MODEL (CREATED_AT, CSON, MAPPING) VALUES (?, ?, ?)'
-                db.cur.execute(sql, (created_at, json.dumps(cson), json.dumps(mapping)))
-                db.con.commit()
+                await db.execute(sql, (created_at, json_codec.dumps(cson), json_codec.dumps(mapping)))
+                await db.commit()
             except HDBException as e:
                 handle_error(f'dbapi Error: {e.errorcode}, {e.errortext} for:\n\t{sql}')
+            glob.mapping_cache.invalidate(tenant_id)
+            invalidate_search_results(tenant_id)
             return {'detail': 'Model successfully deployed'}
         else:
             handle_error('Model already deployed', 422)
 
-def get_mapping(tenant_id):
+async def get_mapping(tenant_id):
+    return (await get_mapping_entry(tenant_id)).mapping
+
+def load_mapping(mapping_json):
+    mapping = json_codec.loads(mapping_json)
+    return mapping, compile_read_plans(mapping)
+
+async def get_mapping_entry(tenant_id, required = True):
+    """If required is False, None is returned for a tenant without a deployed model"""
+    with phase('mapping'):
+        return await read_mapping_entry(tenant_id, required)
+
+async def read_mapping_entry(tenant_id, required = True):
     tenant_schema_name = get_tenant_schema_name(tenant_id)
-    with DBConnection(glob.connection_pools[DBUserType.DATA_READ]) as db:
-        db.cur.execute(f'set schema "{tenant_schema_name}"')
-        sql = f'select top 1 MAPPING from "{tenant_schema_name}"."_MODEL" order by CREATED_AT desc'
-        db.cur.execute(sql)
-        res = db.cur.fetchone()
-        if not (res and len(res) == 1):
+    entry = glob.mapping_cache.get(tenant_id)
+    if entry and not glob.mapping_cache.needs_check(entry):
+        return entry
+    async with AsyncDBConnection(glob.connection_pools[DBUserType.DATA_READ]) as db:
+        if entry:
+            try:
+                await db.execute(f'select max(CREATED_AT) from "{tenant_schema_name}"."_MODEL"')
+                res = await db.fetchone()
+            except HDBException:
+                glob.mapping_cache.invalidate(tenant_id)
+                raise
+            if res and res[0] == entry.version:
+                glob.mapping_cache.confirm(entry)
+                return entry
+        start = time.perf_counter()
+        sql = f'select top 1 CREATED_AT, MAPPING from "{tenant_schema_name}"."_MODEL" order by CREATED_AT desc'
+        try:
+            await db.execute(sql)
+        except HDBException as e:
+            # 259: invalid table name, 362: invalid schema name
+            if not required and e.errorcode in (259, 362):
+                return None
+            raise
+        res = await db.fetchone()
+        if not (res and len(res) == 2):
+            if not required:
+                return None
             logging.error('Tenant %s has no entries in the _MODEL table', tenant_id)
             handle_error('Configuration inconsistent', 500)
-    return json.loads(res[0])
+    mapping, read_plans = await run_in_threadpool(load_mapping, res[1])
+    metrics.mapping_load_duration.observe(time.perf_counter() - start)
+    return glob.mapping_cache.put(tenant_id, res[0], mapping, len(res[1]), read_plans)
 
 
 @app.post('/v1/data/{tenant_id}')
@@ -177,40 +383,128 @@ async def post_data(tenant_id, objects=Body(...)):
     if not isinstance(objects, dict):
         handle_error('provide dictionary of object types', 400)
     tenant_schema_name = get_tenant_schema_name(tenant_id)
-    mapping = get_mapping(tenant_id)
-    with DBConnection(glob.connection_pools[DBUserType.DATA_WRITE]) as db:
-        db.cur.execute(f'set schema "{tenant_schema_name}"')
+    mapping_entry = await get_mapping_entry(tenant_id)
+    mapping = mapping_entry.mapping
+    validate_objects(mapping, objects)
+    idmapping = {}
+    try:
+        dml = await run_in_threadpool(convert.objects_to_dml, mapping, objects, idmapping = idmapping)
+        if not mapping.get('sourceIndex'):
+            convert.check_dangling_references(idmapping)
+    except convert.DataException as e:
+        handle_error(str(e), 400)
+    num_objects = sum(len(w) for w in objects.values())
+    if glob.write_coalescer is not None and num_objects <= glob.write_coalescer.max_objects:
         try:
-            dml = convert.objects_to_dml(mapping, objects)
+            await glob.write_coalescer.submit((tenant_id, mapping_entry.version), (mapping, dml, idmapping),\
+                num_objects)
         except convert.DataException as e:
             handle_error(str(e), 400)
+        except DataError as e:
+            handle_error(f'Data Error: {e.errortext}', 400)
+        except IntegrityError as e:
+            handle_error(f'Integrity Error: {e.errortext}', 400)
+        except HDBException as e:
+            handle_error(f'dbapi Error: {e.errorcode}, {e.errortext}')
+        return get_created_keys(mapping, objects)
+    async with AsyncDBConnection(glob.connection_pools[DBUserType.DATA_WRITE]) as db:
+        await db.execute(f'set schema "{tenant_schema_name}"')
         try:
-            for table_name, v in dml['inserts'].items():
-                column_names = ','.join([f'"{k}"' for k in v['columns'].keys()])
-                cp = []
-                table = mapping['tables'][table_name]
-                for column_name in v['columns'].keys():
-                    if table['columns'][column_name]['type'] in TYPES_SPATIAL:
-                        srid = table['columns'][column_name]['srid']
-                        cp.append(f'ST_GeomFromGeoJSON(?, {srid})')
-                    else:
-                        cp.append('?')
-                column_placeholders = ','.join(cp)
-                sql = f'insert into "{table_name}" ({column_names}) values ({column_placeholders})'
-                db.cur.executemany(sql, v['rows'])
-            db.con.commit()
+            await resolve_references(db, [(dml, idmapping)])
+            convert.check_dangling_references(idmapping)
+            await db.run(insert_objects, db, mapping, dml)
+            await db.commit()
+        except convert.DataException as e:
+            handle_error(str(e), 400)
         except DataError as e:
-            db.con.rollback()
+            await db.rollback()
             handle_error(f'Data Error: {e.errortext}', 400)
+        except IntegrityError as e:
+            await db.rollback()
+            handle_error(f'Integrity Error: {e.errortext}', 400)
+        except HDBException as e:
+            await db.rollback()
+            handle_error(f'dbapi Error: {e.errorcode}, {e.errortext}')
+    invalidate_search_results(tenant_id)
+    return get_created_keys(mapping, objects)
 
-    response = {}
+def resolve_stored_sources(db, dml_list):
+    """Resolves the references to objects of other data packages with the source index.
+    dml_list contains tuples (dml, idmapping). The sources of all dml are read at once"""
+    hashable_keys = [k for dml, _ in dml_list for k in dml['unresolved']]
+    stored = read_source_ids(db.cur, hashable_keys)
+    for dml, idmapping in dml_list:
+        resolve_sources(idmapping, dml['unresolved'], dml['inserts'], stored)
+
+async def resolve_references(db, dml_list):
+    if any(w[0]['unresolved'] for w in dml_list):
+        await db.run(resolve_stored_sources, db, dml_list)
+
+def insert_objects(db, mapping, dml):
+    """Inserts the rows and the source index entries of dml. Returns number of rows per table"""
+    row_counts = execute_inserts(db.cur, mapping, dml['inserts'])
+    if dml['sourceKeys']:
+        write_source_keys(db.cur, dml['sourceKeys'])
+    return row_counts
+
+async def write_coalesced(key, items):
+    """Writes a group of create data requests with one commit. Items are tuples (mapping, dml, idmapping).
+    Requests with dangling references fail alone. If the group fails with a data error, the requests
+    are written one by one, so that only the invalid ones fail"""
+    tenant_id = key[0]
+    mapping = items[0][0]
+    results = [None] * len(items)
+    async with AsyncDBConnection(glob.connection_pools[DBUserType.DATA_WRITE]) as db:
+        await db.execute(f'set schema "{get_tenant_schema_name(tenant_id)}"')
+        await resolve_references(db, [(w[1], w[2]) for w in items])
+        pending = []
+        for i, (_, _, idmapping) in enumerate(items):
+            try:
+                convert.check_dangling_references(idmapping)
+                pending.append(i)
+            except convert.DataException as e:
+                results[i] = e
+        if not pending:
+            return results
+        try:
+            if len(pending) == 1:
+                dml = items[pending[0]][1]
+            else:
+                dml = {'inserts': merge_inserts([items[i][1]['inserts'] for i in pending]),
+                    'sourceKeys': [w for i in pending for w in items[i][1]['sourceKeys']]}
+            await db.run(insert_objects, db, mapping, dml)
+            await db.commit()
+        except (DataError, IntegrityError) as e:
+            await db.rollback()
+            if len(pending) == 1:
+                results[pending[0]] = e
+            else:
+                for i in pending:
+                    try:
+                        await db.run(insert_objects, db, mapping, items[i][1])
+                        await db.commit()
+                    except (DataError, IntegrityError) as e_single:
+                        await db.rollback()
+                        results[i] = e_single
+        except BaseException:
+            await db.rollback()
+            raise
+        finally:
+            invalidate_search_results(tenant_id)
+    return results
+
+def validate_objects(mapping, objects):
     for object_type, obj_list in objects.items():
         if not isinstance(obj_list, list):
             handle_error('provide list of objects per object type', 400)
         if object_type not in mapping['entities']:
             handle_error(f'unknown object type {object_type}', 400)
-        root_table = mapping['tables'][mapping['entities'][object_type]['table_name']]
-        key_property = root_table['columns'][root_table['pk']]['external_path'][0]
+
+def get_created_keys(mapping, objects):
+    """Keys and sources of the created objects by object type"""
+    response = {}
+    for object_type, obj_list in objects.items():
+        key_property = convert.get_key_property(mapping, object_type)
         for obj in obj_list:
             res = {}
             if key_property in obj:
@@ -223,15 +517,375 @@ async def post_data(tenant_id, objects=Body(...)):
                 response[object_type].append(res)
     return response
 
+def split_objects(objects, batch_size):
+    """Splits objects by object type into parts of at most batch_size objects"""
+    batch = {}
+    batch_length = 0
+    for object_type, obj_list in objects.items():
+        start = 0
+        while start < len(obj_list):
+            part = obj_list[start:start + batch_size - batch_length]
+            batch[object_type] = part
+            batch_length += len(part)
+            start += len(part)
+            if batch_length >= batch_size:
+                yield batch
+                batch = {}
+                batch_length = 0
+    if batch:
+        yield batch
+
+async def filter_unchanged_objects(db, mapping, objects, idmapping):
+    """Removes the objects whose content hash equals the stored one. Returns the remaining objects,
+    the ids of the remaining objects which are stored by object type and the number of removed objects.
+    Object types without content hash are not filtered and have no entry in the stored ids.
+    The sources of the removed objects are added to idmapping, so that they can be referenced"""
+    remaining = {}
+    stored_ids = {}
+    num_unchanged = 0
+    for object_type, obj_list in objects.items():
+        root_table = mapping['tables'][mapping['entities'][object_type]['table_name']]
+        if not 'contentHash' in root_table:
+            remaining[object_type] = obj_list
+            continue
+        key_property = root_table['columns'][root_table['pk']]['external_path'][0]
+        ids = [w[key_property] for w in obj_list if key_property in w]
+        stored_hashes = await db.run(read_content_hashes, db, root_table, ids) if ids else {}
+        remaining[object_type] = []
+        stored_ids[object_type] = []
+        for obj in obj_list:
+            object_id = obj.get(key_property)
+            if object_id in stored_hashes:
+                if stored_hashes[object_id] == get_content_hash(obj, key_property):
+                    num_unchanged += 1
+                    if 'source' in obj:
+                        convert.register_sources(idmapping, obj['source'], object_id, root_table['table_name'])
+                    continue
+                stored_ids[object_type].append(object_id)
+            remaining[object_type].append(obj)
+    return remaining, stored_ids, num_unchanged
+
+@app.put('/v1/data/{tenant_id}')
+async def put_data(tenant_id, objects=Body(...)):
+    """UPSERT Data. Objects are identified by their key property. Stored objects are compared
+    to the provided ones and only their changed root rows and sub-tables are rewritten.
+    Objects without key or which are not stored are created"""
+    if not isinstance(objects, dict):
+        handle_error('provide dictionary of object types', 400)
+    tenant_schema_name = get_tenant_schema_name(tenant_id)
+    mapping_entry = await get_mapping_entry(tenant_id)
+    mapping = mapping_entry.mapping
+    keys = {}
+    for object_type, obj_list in objects.items():
+        if not isinstance(obj_list, list):
+            handle_error('provide list of objects per object type', 400)
+        if object_type not in mapping['entities']:
+            handle_error(f'unknown object type {object_type}', 400)
+        key_property = mapping_entry.read_plans[object_type].key_property
+        keys[object_type] = [w[key_property] for w in obj_list if key_property in w]
+        if len(set(keys[object_type])) < len(keys[object_type]):
+            handle_error(f'duplicate {key_property} for object type {object_type}', 400)
+    response = {'objects': {}, 'created': 0, 'updated': 0, 'unchanged': 0, 'rows': {}}
+    async with AsyncDBConnection(glob.connection_pools[DBUserType.DATA_WRITE]) as db:
+        await db.execute(f'set schema "{tenant_schema_name}"')
+        try:
+            # objects with unchanged content hash are neither converted nor read
+            idmapping = {}
+            changed_objects, stored_ids, response['unchanged'] =\
+                await filter_unchanged_objects(db, mapping, objects, idmapping)
+            try:
+                dml = await run_in_threadpool(convert.objects_to_dml, mapping, changed_objects,\
+                    idmapping = idmapping, keep_keys = True)
+                await resolve_references(db, [(dml, idmapping)])
+                convert.check_dangling_references(idmapping)
+            except convert.DataException as e:
+                handle_error(str(e), 400)
+            # root ids of the rewritten and of the unchanged parts by root table or sub-table tree
+            rewritten_ids = {}
+            skipped_ids = {}
+            table_sequences = {}
+            for object_type, obj_list in changed_objects.items():
+                read_plan = mapping_entry.read_plans[object_type]
+                ids = stored_ids.get(object_type, keys[object_type])
+                stored_objects = await read_objects(db, read_plan, ids) if ids else {}
+                incoming_objects = await run_in_threadpool(upsert.assemble_inserts, mapping, read_plan,\
+                    dml['inserts']) if stored_objects else {}
+                root_table = mapping['tables'][read_plan.root_table_name]
+                trees = upsert.get_subtable_trees(mapping, root_table)
+                table_sequences[root_table['table_name']] = [root_table]
+                table_sequences |= {w.table_name: w.tables for w in trees}
+                for obj in obj_list:
+                    object_id = obj.get(read_plan.key_property)
+                    stored = stored_objects.get(object_id)
+                    if stored is None:
+                        response['created'] += 1
+                        continue
+                    root_changed, changed_trees = upsert.compare_object(trees, stored, incoming_objects[object_id])
+                    # the root row holds the content hash of the whole object
+                    root_changed = root_changed or (bool(changed_trees) and 'contentHash' in root_table)
+                    parts = [(root_table['table_name'], root_changed)]
+                    parts.extend((w.table_name, w.table_name in changed_trees) for w in trees)
+                    for part_name, changed in parts:
+                        (rewritten_ids if changed else skipped_ids).setdefault(part_name, []).append(object_id)
+                    response['updated' if root_changed or changed_trees else 'unchanged'] += 1
+            inserts = upsert.filter_inserts(mapping, dml['inserts'], {k: set(v) for k, v in skipped_ids.items()})
+            for part_name, ids in rewritten_ids.items():
+                await db.run(delete_rows, db, table_sequences[part_name], chunk_id_list(ids))
+            response['rows'] = await db.run(insert_objects, db, mapping, dml | {'inserts': inserts})
+            await db.commit()
+        except DataError as e:
+            await db.rollback()
+            handle_error(f'Data Error: {e.errortext}', 400)
+        except IntegrityError as e:
+            await db.rollback()
+            handle_error(f'Integrity Error: {e.errortext}', 400)
+        except HDBException as e:
+            await db.rollback()
+            handle_error(f'dbapi Error: {e.errorcode}, {e.errortext}')
+    invalidate_search_results(tenant_id)
+    for object_type, obj_list in objects.items():
+        key_property = mapping_entry.read_plans[object_type].key_property
+        response['objects'][object_type] = [{key_property: w[key_property]} for w in obj_list if key_property in w]
+    return response
+
+
+@app.post('/v1/data/{tenant_id}/stream')
+async def post_data_stream(tenant_id, request: Request, batch_size: int = STREAM_DEFAULT_BATCH_SIZE,\
+    commit: StreamCommitMode = StreamCommitMode.BATCH, mode: LoadMode = LoadMode.CREATE):
+    """CREATE Data from newline-delimited JSON. Each line contains {"type": <object type>, "object": <object>}.
+    In sync mode, objects with the key of a stored object replace it. They are skipped if their content
+    hash equals the stored one"""
+    tenant_schema_name = get_tenant_schema_name(tenant_id)
+    mapping = await get_mapping(tenant_id)
+    batch_size = max(1, min(batch_size, STREAM_MAX_BATCH_SIZE))
+    idmapping = {}
+    response = {'objects': {}, 'rows': {}, 'batches': 0, 'committedBatches': 0}
+    if mode == LoadMode.SYNC:
+        if not all('contentHash' in mapping['tables'][w['table_name']] for w in mapping['entities'].values()):
+            handle_error('sync mode needs a model deployed with content_hash=true', 400)
+        response |= {'inserted': 0, 'updated': 0, 'skipped': 0}
+
+    async def sync_batch(db, batch):
+        """Removes the unchanged objects and deletes the changed objects"""
+        batch, stored_ids, num_unchanged = await filter_unchanged_objects(db, mapping, batch, idmapping)
+        for object_type, ids in stored_ids.items():
+            if ids:
+                root_table = mapping['tables'][mapping['entities'][object_type]['table_name']]
+                await db.run(delete_rows, db, get_table_sequence(mapping, root_table), chunk_id_list(ids))
+        num_stored = sum(len(w) for w in stored_ids.values())
+        response['inserted'] += sum(len(w) for w in batch.values()) - num_stored
+        response['updated'] += num_stored
+        response['skipped'] += num_unchanged
+        return batch
+
+    async def load_batch(db, batch, line_number):
+        objects = batch
+        if mode == LoadMode.SYNC:
+            batch = await sync_batch(db, batch)
+        try:
+            dml = await run_in_threadpool(convert.objects_to_dml, mapping, batch, idmapping = idmapping,\
+                keep_keys = mode == LoadMode.SYNC)
+        except convert.DataException as e:
+            raise convert.DataException(f'batch ending at line {line_number}: {e}') from e
+        await resolve_references(db, [(dml, idmapping)])
+        row_counts = await db.run(insert_objects, db, mapping, dml)
+        if mapping.get('sourceIndex'):
+            # the memory for the sources is bounded by the batch size and the pending references
+            forget_resolved_sources(idmapping)
+        if commit == StreamCommitMode.BATCH:
+            await db.commit()
+            response['committedBatches'] += 1
+        response['batches'] += 1
+        for object_type, obj_list in objects.items():
+            response['objects'][object_type] = response['objects'].get(object_type, 0) + len(obj_list)
+        for table_name, row_count in row_counts.items():
+            response['rows'][table_name] = response['rows'].get(table_name, 0) + row_count
+
+    async with AsyncDBConnection(glob.connection_pools[DBUserType.DATA_WRITE]) as db:
+        await db.execute(f'set schema "{tenant_schema_name}"')
+        try:
+            batch = {}
+            batch_length = 0
+            # in sync mode, the keys of the objects of the current batch by object type
+            batch_keys = {}
+            async for line_number, item in read_ndjson(request.stream()):
+                if not (isinstance(item, dict) and 'type' in item and isinstance(item.get('object'), dict)):
+                    raise convert.DataException(\
+                        f'line {line_number}: provide {{"type": <object type>, "object": <object>}}')
+                if item['type'] not in mapping['entities']:
+                    raise convert.DataException(f"line {line_number}: unknown object type {item['type']}")
+                if mode == LoadMode.SYNC:
+                    key_property = convert.get_key_property(mapping, item['type'])
+                    if key_property in item['object']:
+                        keys = batch_keys.setdefault(item['type'], set())
+                        if item['object'][key_property] in keys:
+                            raise convert.DataException(f"line {line_number}: duplicate {key_property} "\
+                                f"for object type {item['type']} within batch")
+                        keys.add(item['object'][key_property])
+                if item['type'] in batch:
+                    batch[item['type']].append(item['object'])
+                else:
+                    batch[item['type']] = [item['object']]
+                batch_length += 1
+                if batch_length >= batch_size:
+                    await load_batch(db, batch, line_number)
+                    batch = {}
+                    batch_length = 0
+                    batch_keys = {}
+            if batch:
+                await load_batch(db, batch, line_number)
+            convert.check_dangling_references(idmapping)
+            await db.commit()
+        except convert.DataException as e:
+            await db.rollback()
+            handle_error(f"{e}. {response['committedBatches']} batches committed", 400)
+        except DataError as e:
+            await db.rollback()
+            handle_error(f"Data Error: {e.errortext}. {response['committedBatches']} batches committed", 400)
+        except IntegrityError as e:
+            await db.rollback()
+            handle_error(f"Integrity Error: {e.errortext}. {response['committedBatches']} batches committed", 400)
+        except HDBException as e:
+            await db.rollback()
+            handle_error(f"dbapi Error: {e.errorcode}, {e.errortext}. "\
+                f"{response['committedBatches']} batches committed")
+        finally:
+            # batches may be committed even if the load fails
+            invalidate_search_results(tenant_id)
+    if commit == StreamCommitMode.END:
+        response['committedBatches'] = response['batches']
+    return response
+
+async def process_ingestion_job(job):
+    """Loads the objects of an ingestion job in batches of glob.ingestion_batch_size objects
+    within one transaction"""
+    objects = job.payload
+    try:
+        tenant_schema_name = get_tenant_schema_name(job.tenant_id)
+        mapping = await get_mapping(job.tenant_id)
+    except HTTPException as e:
+        raise JobError(e.detail) from e
+    idmapping = {}
+    async with AsyncDBConnection(glob.connection_pools[DBUserType.DATA_WRITE]) as db:
+        await db.execute(f'set schema "{tenant_schema_name}"')
+        try:
+            for batch in split_objects(objects, glob.ingestion_batch_size):
+                job.phase = 'convert'
+                dml = await run_in_threadpool(convert.objects_to_dml, mapping, batch, idmapping = idmapping)
+                job.phase = 'insert'
+                await resolve_references(db, [(dml, idmapping)])
+                job.add_rows(await db.run(insert_objects, db, mapping, dml))
+                job.num_processed += sum(len(w) for w in batch.values())
+            convert.check_dangling_references(idmapping)
+            job.phase = 'commit'
+            await db.commit()
+        except convert.DataException as e:
+            await db.rollback()
+            raise JobError(str(e)) from e
+        except DataError as e:
+            await db.rollback()
+            raise JobError(f'Data Error: {e.errortext}') from e
+        except IntegrityError as e:
+            await db.rollback()
+            raise JobError(f'Integrity Error: {e.errortext}') from e
+        except BaseException:
+            await db.rollback()
+            raise
+    invalidate_search_results(job.tenant_id)
+    return get_created_keys(mapping, objects)
 
-def value_int_to_ext(typ, value):
-    if typ in TYPES_B64_ENCODE:
-        return base64.encodebytes(value).decode('utf-8')
-    elif typ in TYPES_SPATIAL:
-        return json.loads(value)
-    return value
+def check_ingestion_jobs():
+    if glob.ingestion_jobs is None:
+        handle_error('Ingestion jobs are only available if the server runs with one worker process', 501)
 
+@app.post('/v1/data/{tenant_id}/jobs', status_code=202)
+async def post_data_job(tenant_id, objects=Body(...), priority: JobPriority = JobPriority.NORMAL):
+    """CREATE Data asynchronously. Returns the status of the queued job"""
+    check_ingestion_jobs()
+    if not isinstance(objects, dict):
+        handle_error('provide dictionary of object types', 400)
+    get_tenant_schema_name(tenant_id)
+    mapping = await get_mapping(tenant_id)
+    validate_objects(mapping, objects)
+    num_objects = sum(len(w) for w in objects.values())
+    try:
+        job = await glob.ingestion_jobs.submit(tenant_id, priority, objects, num_objects)
+    except QueueFullException as e:
+        handle_error(str(e), 429)
+    return job.get_status()
+
+@app.get('/v1/data/{tenant_id}/jobs/{job_id}')
+async def get_data_job(tenant_id, job_id: str):
+    check_ingestion_jobs()
+    job = glob.ingestion_jobs.get(job_id)
+    if job is None or job.tenant_id != tenant_id:
+        handle_error(f'unknown job {job_id}', 404)
+    return job.get_status()
 
+def read_table(db, table_plan, id_chunks, all_objects):
+    rows = []
+    for id_list_size, id_list in id_chunks:
+        db.cur.execute(table_plan.get_select(id_list_size), id_list)
+        rows.extend(db.cur.fetchall())
+    return table_plan.assemble(rows, all_objects)
+
+@app.post('/v1/read/{tenant_id}/stream')
+async def read_data_stream(tenant_id, objects=Body(...)):
+    """READ Data as newline-delimited JSON. Each line contains {"type": <object type>, "object": <object>}"""
+    if not isinstance(objects, dict):
+        handle_error('provide dictionary of object types', 400)
+    tenant_schema_name = get_tenant_schema_name(tenant_id)
+    mapping_entry = await get_mapping_entry(tenant_id)
+    read_requests = []
+    for object_type, obj_list  in objects.items():
+        if not isinstance(obj_list, list):
+            handle_error('provide list of objects per object type', 400)
+        if object_type not in mapping_entry.read_plans:
+            handle_error(f'unknown object type {object_type}', 400)
+        read_plan = mapping_entry.read_plans[object_type]
+        ids = []
+        for obj in obj_list:
+            if not read_plan.key_property in obj:
+                handle_error(f'primary key {read_plan.key_property} not found', 400)
+            ids.append(obj[read_plan.key_property])
+        read_requests.append((object_type, read_plan, chunk_id_list(ids)))
+
+    async def generate():
+        async with AsyncDBConnection(glob.connection_pools[DBUserType.DATA_READ]) as db:
+            await db.execute(f'set schema "{tenant_schema_name}"')
+            for object_type, read_plan, id_chunks in read_requests:
+                for id_list_size, id_list in id_chunks:
+                    stream = await db.run(ObjectStream, db.connection, read_plan, id_list_size, id_list,\
+                        READ_STREAM_FETCH_SIZE)
+                    try:
+                        while objs := await db.run(stream.next_objects):
+                            yield b''.join(json_codec.dumpb({'type': object_type, 'object': w}) + b'\n'\
+                                for w in objs)
+                    finally:
+                        await db.run(stream.close)
+
+    return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+async def read_objects(db, read_plan, ids):
+    """Reads the objects with ids. Returns a dictionary by id"""
+    id_chunks = chunk_id_list(ids)
+    all_objects = {}
+    for table_plan in read_plan.tables:
+        all_objects[table_plan.table_name] = await db.run(read_table, db, table_plan, id_chunks, all_objects)
+    return all_objects[read_plan.root_table_name]
+
+def read_content_hashes(db, root_table, ids):
+    """Stored content hashes by id"""
+    hashes = {}
+    for id_list_size, id_list in chunk_id_list(ids):
+        db.cur.execute(root_table['sql']['contentHash'].format(id_list = get_placeholders(id_list_size)), id_list)
+        hashes.update((w[0], w[1]) for w in db.cur.fetchall())
+    return hashes
+
+def delete_rows(db, table_sequence, id_chunks):
+    for table in table_sequence:
+        for id_list_size, id_list in id_chunks:
+            db.cur.execute(table['sql']['delete'].format(id_list = get_placeholders(id_list_size)), id_list)
 
 @app.post('/v1/read/{tenant_id}')
 async def read_data(tenant_id, objects=Body(...)):
@@ -239,76 +893,24 @@ async def read_data(tenant_id, objects=Body(...)):
     if not isinstance(objects, dict):
         handle_error('provide dictionary of object types', 400)
     tenant_schema_name = get_tenant_schema_name(tenant_id)
-    mapping = get_mapping(tenant_id)
-    with DBConnection(glob.connection_pools[DBUserType.DATA_READ]) as db:
-        db.cur.execute(f'set schema "{tenant_schema_name}"')
+    mapping_entry = await get_mapping_entry(tenant_id)
+    async with AsyncDBConnection(glob.connection_pools[DBUserType.DATA_READ]) as db:
+        await db.execute(f'set schema "{tenant_schema_name}"')
         response = {}
         for object_type, obj_list  in objects.items():
             if not isinstance(obj_list, list):
                 handle_error('provide list of objects per object type', 400)
-            if object_type not in mapping['entities']:
+            if object_type not in mapping_entry.read_plans:
                 handle_error(f'unknown object type {object_type}', 400)
-            root_table = mapping['tables'][mapping['entities'][object_type]['table_name']]
+            read_plan = mapping_entry.read_plans[object_type]
             ids = []
-            primary_key_property_name = \
-                root_table['columns'][root_table['pk']]['external_path'][0]
-            table_sequence = []
-            get_table_sequence(mapping, table_sequence, root_table)
             for obj in obj_list:
-                if not primary_key_property_name in obj:
-                    handle_error(f'primary key {primary_key_property_name} not found', 400)
-                ids.append(obj[primary_key_property_name])
-            id_list = ', '.join([f"'{w}'" for w in ids])
-            all_objects = {}
-
-            for table in table_sequence:
-                all_objects[table['table_name']] = {}
-                sql = table['sql']['select'].format(id_list = id_list)
-                db.cur.execute(sql)
-                if '_VALUE' in table['columns']:
-                    for row in db.cur:
-                        key, _ , val_int = row
-                        value = value_int_to_ext(table['columns']['_VALUE']['type'], val_int)
-                        if key in all_objects[table['table_name']]:
-                            all_objects[table['table_name']][key].append(value)
-                        else:
-                            all_objects[table['table_name']][key] = [value]
-                else:
-                    for row in db.cur:
-                        i = 0
-                        res_obj = {}
-                        for prop_name, prop in table['columns'].items():
-                            if prop_name == table['pk']:
-                                sub_obj_key = row[i]
-                                if table['level'] == 0:
-                                    res_key = row[i]
-                                    add_value(prop, res_obj, prop['external_path'], row[i])
-                            elif table['level'] > 0 and prop_name == table['pkParent']:
-                                res_key = row[i]
-                            elif 'isVirtual' in prop and prop['isVirtual']:
-                                if prop['rel']['type'] == 'containment':
-                                    if sub_obj_key in all_objects[prop['rel']['table_name']]:
-                                        sub_obj = all_objects[prop['rel']['table_name']][sub_obj_key]
-                                        add_value(prop, res_obj, prop['external_path'], sub_obj)
-                                continue
-                            elif 'rel' in prop and prop['rel']['type'] == 'association':
-                                rel_table = mapping['tables'][prop['rel']['table_name']]
-                                path = prop['external_path']\
-                                    + rel_table['columns'][rel_table['pk']]['external_path']
-                                add_value(prop, res_obj, path, row[i])
-                            else:
-                                add_value(prop, res_obj, prop['external_path'], row[i])
-                            i += 1
-                        if table['level'] > 0:
-                            if not res_key in all_objects[table['table_name']]:
-                                all_objects[table['table_name']][res_key] = []
-                            all_objects[table['table_name']][res_key].append(res_obj)
-                        else:
-                            all_objects[table['table_name']][res_key] = res_obj
-            response[object_type] = []
-            for i in ids:
-                response[object_type].append(all_objects[root_table['table_name']][i])
-    return response
+                if not read_plan.key_property in obj:
+                    handle_error(f'primary key {read_plan.key_property} not found', 400)
+                ids.append(obj[read_plan.key_property])
+            root_objects = await read_objects(db, read_plan, ids)
+            response[object_type] = [root_objects[i] for i in ids]
+    return CodecJSONResponse(response)
 
 @app.delete('/v1/data/{tenant_id}')
 async def delete_data(tenant_id, objects=Body(...)):
@@ -316,9 +918,9 @@ async def delete_data(tenant_id, objects=Body(...)):
     if not isinstance(objects, dict):
         handle_error('provide dictionary of object types', 400)
     tenant_schema_name = get_tenant_schema_name(tenant_id)
-    mapping = get_mapping(tenant_id)
-    with DBConnection(glob.connection_pools[DBUserType.DATA_WRITE]) as db:
-        db.cur.execute(f'set schema "{tenant_schema_name}"')
+    mapping = await get_mapping(tenant_id)
+    async with AsyncDBConnection(glob.connection_pools[DBUserType.DATA_WRITE]) as db:
+        await db.execute(f'set schema "{tenant_schema_name}"')
         for object_type, obj_list  in objects.items():
             if not isinstance(obj_list, list):
                 handle_error('provide list of objects per object type', 400)
@@ -328,67 +930,92 @@ async def delete_data(tenant_id, objects=Body(...)):
             ids = []
             primary_key_property_name = \
                 root_table['columns'][root_table['pk']]['external_path'][0]
-            table_sequence = []
-            get_table_sequence(mapping, table_sequence, root_table)
+            table_sequence = get_table_sequence(mapping, root_table)
             for obj in obj_list:
                 if not primary_key_property_name in obj:
                     handle_error(f'primary key {primary_key_property_name} not found', 400)
                 ids.append(obj[primary_key_property_name])
-            id_list = ', '.join([f"'{w}'" for w in ids])
-
-            for table in table_sequence:
-                sql = table['sql']['delete'].format(id_list = id_list)
-                db.cur.execute(sql)
-        db.con.commit()
-
-def add_value(column, obj, path, value):
-    if value is None:
-        return
-    if len(path) == 1:
-        if 'type' in column:
-            obj[path[0]] = value_int_to_ext(column['type'], value)
-        else:
-            obj[path[0]] = value
-    else:
-        if not path[0] in obj:
-            obj[path[0]] = {}
-        add_value(column, obj[path[0]], path[1:], value)
-
-def get_table_sequence(mapping, table_sequence, current_table):
-    for prop in current_table['columns'].values():
-        if 'rel' in prop and prop['rel']['type'] == 'containment':
-            next_table = mapping['tables'][prop['rel']['table_name']]
-            get_table_sequence(mapping, table_sequence, next_table)
-    table_sequence.append(current_table)
+            await db.run(delete_rows, db, table_sequence, chunk_id_list(ids))
+            if mapping.get('sourceIndex'):
+                await db.run(delete_source_keys, db.cur, root_table['table_name'], ids)
+        await db.commit()
+    invalidate_search_results(tenant_id)
 
+async def call_esh_search(sql, search_type):
+    """Returns the rows of the ESH_SEARCH call. Duration and errors are recorded by search_type"""
+    async with AsyncDBConnection(glob.connection_pools[DBUserType.DATA_READ]) as db:
+        start = time.perf_counter()
+        try:
+            _ = await db.execute(sql)
+            rows = await db.fetchall()
+        except HDBException:
+            metrics.esh_search_errors.inc(search_type)
+            raise
+        metrics.esh_search_duration.observe(time.perf_counter() - start, search_type)
+        return rows
 
-def perform_search(esh_version, tenant_id, esh_query, is_metadata = False):
+async def perform_search(esh_version, tenant_id, esh_query, is_metadata = False, query_key = None,\
+    use_cache = False):
+    """Concurrent identical searches of the same kind share one ESH_SEARCH call. query_key is the normalized esh_query.
+    Returns the JSON result as string as it is returned by ESH_SEARCH without internal names"""
     tenant_schema_name = get_tenant_schema_name(tenant_id)
-    sql = f'''CALL ESH_SEARCH('["/{esh_version}/{tenant_schema_name}{esh_search_escape(esh_query)}"]',?)'''
-    #logging.info(search_query)
-    with DBConnection(glob.connection_pools[DBUserType.DATA_READ]) as db:
-        _ = db.cur.execute(sql)
-        for row in db.cur.fetchall():
-            if is_metadata:
-                return row[0]
-            else:
-                return json.loads(row[0])
-    return None
+    # the kind of search is part of the key, as a query string may equal the JSON of a bulk search
+    key = (tenant_id, 'metadata' if is_metadata else 'get', esh_version, query_key or esh_query)
+    if use_cache and (res := glob.search_cache.get(key)) is not None:
+        return res
+    async def search():
+        # results of searches which overlap a write of the tenant are not cached
+        generation = glob.search_cache.get_generation(tenant_id) if use_cache else None
+        sql = f'''CALL ESH_SEARCH('["/{esh_version}/{tenant_schema_name}{esh_search_escape(esh_query)}"]',?)'''
+        #logging.info(search_query)
+        rows = await call_esh_search(sql, 'metadata' if is_metadata else 'search')
+        if not rows:
+            return None
+        if is_metadata:
+            return rows[0][0]
+        res = cleanse_result(rows[0][0])
+        if use_cache:
+            glob.search_cache.put(key, res, len(res), generation)
+        return res
+    return await search_flights.run(key, search)
 
-def perform_bulk_search(esh_version, tenant_id, esh_query):
-    tenant_schema_name = get_tenant_schema_name(tenant_id)
+async def execute_bulk_search(esh_version, tenant_schema_name, esh_query):
     payload = [f'/{esh_version}/{tenant_schema_name}/{w}' for w in esh_query]
-    bulk_request = esh_search_escape(json.dumps([{'URI': payload}]))
+    bulk_request = esh_search_escape(json_codec.dumps([{'URI': payload}]))
     sql = f"CALL ESH_SEARCH('{bulk_request}',?)"
-    with DBConnection(glob.connection_pools[DBUserType.DATA_READ]) as db:
-        _ = db.cur.execute(sql)
-        #res = '[' + ','.join([w[0] for w in db.cur.fetchall()]) + ']'
-        #return Response(content=res, media_type="application/json")
-        res = [json.loads(w[0]) for w in db.cur.fetchall()]
-        return cleanse_output(res)
+    return await call_esh_search(sql, 'bulk')
+
+async def perform_bulk_search(esh_version, tenant_id, esh_query, use_cache = False):
+    """Concurrent identical bulk searches share one ESH_SEARCH call. Returns the JSON array of the results as string.
+    Queries exceeding the group size are split into groups which are executed in parallel
+    on up to bulk_search_parallelism connections"""
+    tenant_schema_name = get_tenant_schema_name(tenant_id)
+    key = (tenant_id, 'bulk', esh_version, json_codec.dumps(esh_query))
+    if use_cache and (res := glob.search_cache.get(key)) is not None:
+        return res
+    async def search():
+        generation = glob.search_cache.get_generation(tenant_id) if use_cache else None
+        group_size = glob.bulk_search_group_size
+        if glob.bulk_search_parallelism > 1 and len(esh_query) > group_size:
+            semaphore = asyncio.Semaphore(glob.bulk_search_parallelism)
+            async def search_group(group):
+                async with semaphore:
+                    return await execute_bulk_search(esh_version, tenant_schema_name, group)
+            groups = [esh_query[i:i + group_size] for i in range(0, len(esh_query), group_size)]
+            rows = [w for group_rows in await asyncio.gather(*[search_group(w) for w in groups])\
+                for w in group_rows]
+        else:
+            rows = await execute_bulk_search(esh_version, tenant_schema_name, esh_query)
+        res = join_results([cleanse_result(w[0]) for w in rows])
+        if use_cache:
+            glob.search_cache.put(key, res, len(res), generation)
+        return res
+    return await search_flights.run(key, search)
 
 def get_esh_version(version):
     if version == 'latest' or version == '':
+        if not glob.esh_apiversion:
+            handle_error('ESH API version not determined yet', 503)
         return glob.esh_apiversion
     return version
 
@@ -400,47 +1027,72 @@ async def get_search_by_tenant(tenant_id):
     )
     return RedirectResponse(redirect_url)
 
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [w.strip() for w in if_none_match.split(',')]
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+async def get_metadata_response(req: Request, tenant_id, esh_version, esh_query):
+    """$metadata documents are cached with the mapping of the tenant, so they are
+    invalidated together with it when a model is deployed or the tenant is deleted"""
+    mapping_entry = await get_mapping_entry(tenant_id, required = False)
+    if mapping_entry is None:
+        handle_error(f"No model deployed for tenant '{tenant_id}'", 404)
+    key = (esh_version, esh_query)
+    if key in mapping_entry.metadata:
+        etag, content = mapping_entry.metadata[key]
+    else:
+        content = await perform_search(esh_version, tenant_id, esh_query, True)
+        if content is None:
+            handle_error('No metadata found', 404)
+        etag = '"' + hashlib.sha256(content.encode('utf-8')).hexdigest()[:32] + '"'
+        glob.mapping_cache.put_metadata(tenant_id, mapping_entry, key, etag, content)
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if etag_matches(req.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type='application/xml', headers=headers)
+
 @app.get('/v1/search/{tenant_id:path}/{esh_version:path}/$metadata')
-def get_search_metadata(tenant_id,esh_version):
-    return Response(\
-        content=perform_search(get_esh_version(esh_version), tenant_id, '/$metadata', True)\
-            , media_type='application/xml')
+async def get_search_metadata(tenant_id, esh_version, req: Request):
+    return await get_metadata_response(req, tenant_id, get_esh_version(esh_version), '/$metadata')
 
 @app.get('/v1/search/{tenant_id:path}/{esh_version:path}/$metadata/{path:path}')
-def get_search_metadata_entity_set(tenant_id, esh_version, path):
-    return Response(\
-        content=perform_search(get_esh_version(esh_version), tenant_id, '/$metadata/{}' + path, True)\
-            , media_type='application/xml')
+async def get_search_metadata_entity_set(tenant_id, esh_version, path, req: Request):
+    return await get_metadata_response(req, tenant_id, get_esh_version(esh_version), '/$metadata/{}' + path)
 
 @app.get('/v1/search/{tenant_id:path}/{esh_version:path}/{path:path}')
-def get_search(tenant_id, esh_version, path, req: Request):
+async def get_search(tenant_id, esh_version, path, req: Request):
     request_args = dict(req.query_params)
     if '$top' not in request_args:
         request_args['$top'] = 10
     esh_query_string = f'/{path}?' + '&'.join(f'{key}={value}' for key, value in request_args.items())
-    return cleanse_output([perform_search(get_esh_version(esh_version), tenant_id, esh_query_string)])[0]
+    # order of query options does not matter
+    query_key = json_codec.dumps([path, sorted(request_args.items())])
+    res = await perform_search(get_esh_version(esh_version), tenant_id, esh_query_string,\
+        query_key = query_key, use_cache = use_search_cache(req))
+    return Response(content=res, media_type='application/json')
 
 @app.post('/v1/search/{tenant_id:path}/{esh_version:path}')
 #def post_search(root=Body(...), db: Session = Depends(get_db)):
-def post_search(tenant_id, esh_version, body=Body(...)):
-    return perform_bulk_search(get_esh_version(esh_version), tenant_id, body)
+async def post_search(tenant_id, esh_version, request: Request, body=Body(...)):
+    res = await perform_bulk_search(get_esh_version(esh_version), tenant_id, body, use_search_cache(request))
+    return Response(content=res, media_type='application/json')
 
 # v2 Search
 @app.post('/v2/search/{tenant_id}/{esh_version:path}')
-async def search_v2(tenant_id, esh_version, query=Body(...)):
+async def search_v2(tenant_id, esh_version, request: Request, query=Body(...)):
     validate_tenant_id(tenant_id)
     esh_query = [IESSearchOptions(w).to_statement()[1:] for w in query]
-    return perform_bulk_search(get_esh_version(esh_version), tenant_id, esh_query)
+    res = await perform_bulk_search(get_esh_version(esh_version), tenant_id, esh_query, use_search_cache(request))
+    return Response(content=res, media_type='application/json')
 
 @app.get('/{path:path}')
-async def tile_request(path: str, response: Response):
-    logging.info(path)
-    logging.info('https://sapui5.hana.ondemand.com/%s', path)
-    async with httpx.AsyncClient() as client:
-        proxy = await client.get(f'https://sapui5.hana.ondemand.com/{path}')
-    response.body = proxy.content
-    response.status_code = proxy.status_code
-    return response
+async def tile_request(path: str):
+    logging.debug('UI asset %s', path)
+    status_code, content, headers = await glob.asset_proxy.get(path)
+    return Response(content=content, status_code=status_code, headers=headers)
+
 
 def reinstall_needed(l_versions, l_config):
     reinstall = [k for k, v in l_versions.items()\
@@ -450,42 +1102,164 @@ def reinstall_needed(l_versions, l_config):
 def reindex_needed(l_versions, l_config):
     reinstall = [k for k, v in l_versions.items()\
         if k > l_config['version'] and 'reindex' in v and v['reindex']]
-    return len(reinstall) > 0 and get_tenants_sync()
+    return len(reinstall) > 0 and get_tenants_sync(l_config)
 
 def new_version(l_versions, l_config):
     new_v = [k for k, v in l_versions.items() if k > l_config['version']]
     return len(new_v) > 0
 
+def get_config_settings(l_config, section, defaults):
+    settings = dict(defaults)
+    if section in l_config:
+        settings |= l_config[section]
+    return settings
+
+def get_num_workers(l_config):
+    """Number of worker processes started by uvicorn, which ignores workers if reload is set"""
+    server_settings = l_config.get('server', {})
+    if server_settings.get('reload'):
+        return 1
+    return max(1, server_settings.get('workers', 1))
+
+def get_slow_log_file_name(l_config, file_name):
+    """With several worker processes, each of them writes its own file, because file rotation is not
+    safe across processes. The process id is inserted before the extension of file_name"""
+    if not file_name or get_num_workers(l_config) == 1:
+        return file_name
+    root, ext = os.path.splitext(file_name)
+    return f'{root}.{os.getpid()}{ext}'
+
+def get_pool_settings(l_config, user_type):
+    settings = dict(POOL_DEFAULT_SETTINGS[user_type])
+    if 'pool' in l_config['db'] and user_type.value in l_config['db']['pool']:
+        settings |= l_config['db']['pool'][user_type.value]
+    return settings
+
+def load_config():
+    try:
+        with open(CONFIG_FILE, encoding = 'utf-8') as fr:
+            return json.load(fr)
+    except FileNotFoundError:
+        logging.error('Inconsistent or missing installation. %s not found.', CONFIG_FILE)
+        raise
+
+def initialize(l_config):
+    """Initializes the state of a worker process. The pools are created without opening connections"""
+    db_host = l_config['db']['connection']['host']
+    db_port = l_config['db']['connection']['port']
+    glob.db_schema_prefix = l_config['deployment']['schemaPrefix']
+    glob.db_tenant_prefix = glob.db_schema_prefix + TENANT_PREFIX
+    mapping_cache_settings = get_config_settings(l_config, 'mappingCache', MAPPING_CACHE_DEFAULT_SETTINGS)
+    glob.mapping_cache = MappingCache(mapping_cache_settings['maxSize'], mapping_cache_settings['checkInterval'])
+    search_cache_settings = get_config_settings(l_config, 'searchCache', SEARCH_CACHE_DEFAULT_SETTINGS)
+    if search_cache_settings['enabled']:
+        glob.search_cache = ResultCache(search_cache_settings['maxSize'], search_cache_settings['ttl'])
+    glob.timing_enabled = get_config_settings(l_config, 'debug', DEBUG_DEFAULT_SETTINGS)['timing']
+    glob.tenant_classes = get_config_settings(l_config, 'metrics', METRICS_DEFAULT_SETTINGS)['tenantClasses']
+    bulk_search_settings = get_config_settings(l_config, 'bulkSearch', BULK_SEARCH_DEFAULT_SETTINGS)
+    glob.bulk_search_group_size = max(1, bulk_search_settings['groupSize'])
+    glob.bulk_search_parallelism = bulk_search_settings['parallelism']
+    ui_assets_settings = get_config_settings(l_config, 'uiAssets', UI_ASSETS_DEFAULT_SETTINGS)
+    glob.asset_proxy = AssetProxy(ui_assets_settings['url'], ui_assets_settings['cacheDir'],\
+        ui_assets_settings['maxMemorySize'], ui_assets_settings['maxDiskSize'], ui_assets_settings['maxAge'],\
+        ui_assets_settings['revalidateInterval'])
+    glob.warm_up_retry_interval = get_config_settings(l_config, 'warmUp', WARM_UP_DEFAULT_SETTINGS)['retryInterval']
+    group_commit_settings = get_config_settings(l_config, 'groupCommit', GROUP_COMMIT_DEFAULT_SETTINGS)
+    if group_commit_settings['enabled']:
+        glob.write_coalescer = WriteCoalescer(write_coalesced, group_commit_settings['maxDelay'] / 1000,\
+            group_commit_settings['maxObjects'])
+    ingestion_settings = get_config_settings(l_config, 'ingestion', INGESTION_DEFAULT_SETTINGS)
+    glob.ingestion_batch_size = max(1, ingestion_settings['batchSize'])
+    # jobs are kept in memory, so with several worker processes a status request could reach a worker
+    # which does not know the job
+    if get_num_workers(l_config) == 1:
+        glob.ingestion_jobs = JobQueue(process_ingestion_job, ingestion_settings['workers'],\
+            ingestion_settings['maxQueued'], ingestion_settings['maxFinished'])
+    else:
+        logging.info('Ingestion jobs are disabled because the server runs with more than one worker process')
+    admission_settings = get_config_settings(l_config, 'admission', ADMISSION_DEFAULT_SETTINGS)
+    if admission_settings['enabled']:
+        classes = {k: v | admission_settings['classes'].get(k, {})\
+            for k, v in ADMISSION_CLASS_DEFAULT_SETTINGS.items()}
+        glob.admission = AdmissionController(classes, admission_settings['tenants'], admission_settings['maxWaitTime'])
+    slow_log_settings = get_config_settings(l_config, 'slowLog', SLOW_LOG_DEFAULT_SETTINGS)
+    if slow_log_settings['threshold']:
+        glob.slow_log = SlowOperationLog(slow_log_settings['threshold'],\
+            get_slow_log_file_name(l_config, slow_log_settings['file']),\
+            slow_log_settings['maxBytes'], slow_log_settings['backupCount'], slow_log_settings['bufferSize'],\
+            slow_log_settings['maxStatementLength'])
+    for user_type_value, user_item in l_config['db']['user'].items():
+        user_type = DBUserType(user_type_value)
+        user_name = user_item['name']
+        user_password = user_item['password']
+        credentials = Credentials(db_host, db_port, user_name, user_password)
+        pool_settings = get_pool_settings(l_config, user_type)
+        glob.connection_pools[user_type] = ConnectionPool(credentials,\
+            min_connections = pool_settings['minConnections'], max_connections = pool_settings['maxConnections'],\
+            timeout = pool_settings['timeout'], max_idle_time = pool_settings['maxIdleTime'], slow_log = glob.slow_log,\
+            lazy = True)
+        glob.readiness['pools'][user_type.value] = {'ready': False}
+    glob.esh_apiversion = ''
+    glob.readiness['eshApiVersion'] = {'ready': False}
+
+def read_esh_apiversion():
+    with DBConnection(glob.connection_pools[DBUserType.DATA_READ]) as db_read:
+        r = [ { 'URI': [ '/$apiversion' ] } ]
+        search_query = f'''CALL ESH_SEARCH('{json_codec.dumps(r)}',?)'''
+        _ = db_read.cur.execute(search_query)
+        glob.esh_apiversion = 'v' + str(json_codec.loads(db_read.cur.fetchone()[0])['apiversion'])
+        #logging.info('ESH_SEARCH calls will use API-version %s', glob.esh_apiversion)
+
+async def warm_up_step(status: dict, func, *args):
+    """Runs func in a thread until it succeeds. Errors are kept in status until then"""
+    while True:
+        try:
+            await run_in_threadpool(func, *args)
+        except Exception as e: #pylint: disable=broad-exception-caught
+            logging.warning('Warm-up failed: %s. Retry in %ss', e, glob.warm_up_retry_interval)
+            status['error'] = str(e)
+            await asyncio.sleep(glob.warm_up_retry_interval)
+        else:
+            status.pop('error', None)
+            status['ready'] = True
+            return
+
+async def warm_up_esh_apiversion():
+    await warm_up_step(glob.readiness['eshApiVersion'], read_esh_apiversion)
+    glob.readiness['eshApiVersion']['version'] = glob.esh_apiversion
+
+async def warm_up():
+    """Opens and checks the connections of all pools and determines the ESH API version concurrently"""
+    steps = [warm_up_step(glob.readiness['pools'][k.value], v.warm_up) for k, v in glob.connection_pools.items()]
+    steps.append(warm_up_esh_apiversion())
+    await asyncio.gather(*steps)
+
+async def shutdown():
+    if glob.ingestion_jobs is not None:
+        await glob.ingestion_jobs.stop()
+    if glob.write_coalescer is not None:
+        await glob.write_coalescer.stop()
+    if glob.asset_proxy is not None:
+        await glob.asset_proxy.close()
+    for pool in glob.connection_pools.values():
+        await run_in_threadpool(pool.close)
+    glob.connection_pools.clear()
+
 
 if __name__ == '__main__':
     logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
     with open('src/versions.json', encoding = 'utf-8') as fr:
         versions = json.load(fr)
     try:
-        with open('src/.config.json', encoding = 'utf-8') as fr:
-            config = json.load(fr)
+        config = load_config()
     except FileNotFoundError:
-        logging.error('Inconsistent or missing installation. src/.config.json not found.')
-        exit(-1)
+        sys.exit(-1)
     if reinstall_needed(versions, config):
         logging.error('Reset needed due to software changes')
         logging.error('Delete all tenants by running python src/config.py --action delete')
         logging.error('Install new version by running python src/config.py --action install')
         logging.error('Warning: System needs to be setup from scratch again!')
         sys.exit(-1)
-    db_host = config['db']['connection']['host']
-    db_port = config['db']['connection']['port']
-    glob.db_schema_prefix = config['deployment']['schemaPrefix']
-    glob.db_tenant_prefix = glob.db_schema_prefix + TENANT_PREFIX
-    for user_type_value, user_item in config['db']['user'].items():
-        user_type = DBUserType(user_type_value)
-        user_name = user_item['name']
-        user_password = user_item['password']
-        credentials = Credentials(db_host, db_port, user_name, user_password)
-        glob.connection_pools[user_type] = ConnectionPool(credentials)
-        with DBConnection(glob.connection_pools[user_type]) as db_main:
-            db_main.cur.execute('select * from dummy')
-
     if new_version(versions, config):
         if reindex_needed(versions, config):
             logging.error('Reset needed due to software changes')
@@ -495,16 +1269,11 @@ if __name__ == '__main__':
             sys.exit(-1)
         else:
             config['version'] = [k for k in versions.keys()][-1]
-            with open('src/.config.json', 'w', encoding = 'utf-8') as fr:
+            with open(CONFIG_FILE, 'w', encoding = 'utf-8') as fr:
                 json.dump(config, fr, indent = 4)
 
-    with DBConnection(glob.connection_pools[DBUserType.DATA_READ]) as db_read:
-        r = [ { 'URI': [ '/$apiversion' ] } ]
-        search_query = f'''CALL ESH_SEARCH('{json.dumps(r)}',?)'''
-        _ = db_read.cur.execute(search_query)
-        glob.esh_apiversion = 'v' + str(json.loads(db_read.cur.fetchone()[0])['apiversion'])
-        #logging.info('ESH_SEARCH calls will use API-version %s', glob.esh_apiversion)
-
     #ui_default_tenant = config['UIDefaultTenant']
+    # the worker processes import server:app and initialize themselves in lifespan
     cs = config['server']
-    uvicorn.run('server:app', host = cs['host'], port = cs['port'], log_level = cs['logLevel'], reload = cs['reload'])
+    uvicorn.run('server:app', host = cs['host'], port = cs['port'], log_level = cs['logLevel'], reload = cs['reload'],\
+        workers = cs.get('workers', 1))
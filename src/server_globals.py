@@ -3,3 +3,17 @@ db_schema_prefix = ''
 db_tenant_prefix = ''
 connection_pools = {}
 esh_apiversion = ''
+mapping_cache = None
+search_cache = None
+asset_proxy = None
+bulk_search_group_size = 10
+bulk_search_parallelism = 1
+tenant_classes = {}
+timing_enabled = False
+slow_log = None
+admission = None
+ingestion_jobs = None
+write_coalescer = None
+ingestion_batch_size = 1000
+warm_up_retry_interval = 5
+readiness = {'pools': {}, 'eshApiVersion': {'ready': False}}
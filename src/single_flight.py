@@ -0,0 +1,41 @@
+'''Coalescing of identical concurrent calls'''
+import asyncio
+
+class SingleFlight():
+    """Concurrent calls with the same key share one execution and its result.
+    The execution runs as a task, so it is not cancelled if the first caller is cancelled.
+    Must only be used within one event loop."""
+    def __init__(self) -> None:
+        self.flights = {}
+        self.num_executions = 0
+        self.num_shared = 0
+
+    async def run(self, key, func, *args, **kwargs):
+        flight = self.flights.get(key)
+        if flight:
+            self.num_shared += 1
+        else:
+            flight = asyncio.ensure_future(func(*args, **kwargs))
+            self.flights[key] = flight
+            self.num_executions += 1
+            flight.add_done_callback(lambda w: self.done(key, w))
+        return await asyncio.shield(flight)
+
+    def forget(self, predicate):
+        """Removes the executions whose key matches predicate, so that later calls start a new execution.
+        Calls which already wait for a removed execution get its result"""
+        for key in [w for w in self.flights if predicate(w)]:
+            del self.flights[key]
+
+    def done(self, key, flight):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+        if not flight.cancelled():
+            # marks the exception as retrieved if all callers were cancelled
+            flight.exception()
+
+    def get_statistics(self):
+        return {
+            'inFlight': len(self.flights),
+            'executions': self.num_executions,
+            'shared': self.num_shared}
@@ -0,0 +1,96 @@
+'''Log of slow DB operations'''
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+import threading
+import time
+
+current_tenant = ContextVar('current_tenant', default = '')
+
+class SlowOperationLog():
+    """Records DB operations taking threshold seconds or longer. The last buffer_size operations are kept
+    in memory. If file_name is given, they are also written as JSON lines to a rotating file"""
+    def __init__(self, threshold: float = 1, file_name: str = '', max_bytes: int = 10 * 1024 * 1024,\
+        backup_count: int = 5, buffer_size: int = 100, max_statement_length: int = 1000):
+        self.threshold = threshold
+        self.max_statement_length = max_statement_length
+        self.lock = threading.Lock()
+        self.entries = deque(maxlen = buffer_size)
+        self.logger = None
+        if file_name:
+            handler = RotatingFileHandler(file_name, maxBytes = max_bytes, backupCount = backup_count,\
+                encoding = 'utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger = logging.getLogger('slow_operations')
+            self.logger.propagate = False
+            self.logger.setLevel(logging.INFO)
+            self.logger.addHandler(handler)
+
+    def record(self, operation: str, statement: str, rows: int, elapsed: float, user: str = ''):
+        if operation == 'execute' and statement.startswith('CALL ESH_SEARCH'):
+            operation = 'esh_search'
+        entry = {
+            'time': datetime.now(timezone.utc).isoformat(),
+            'operation': operation,
+            'tenant': current_tenant.get(),
+            'user': user,
+            'statement': statement[:self.max_statement_length],
+            'rows': rows,
+            'elapsed': round(elapsed * 1000, 3)}
+        with self.lock:
+            self.entries.append(entry)
+        if self.logger:
+            self.logger.info(json.dumps(entry))
+
+    def get_entries(self):
+        with self.lock:
+            return list(self.entries)
+
+class MonitoredCursor():
+    """Cursor which records slow execute, executemany and fetch calls. Fetch calls are recorded with the
+    statement of the last execute. Other attributes are taken from the cursor"""
+    def __init__(self, cursor, slow_log: SlowOperationLog, user: str = ''):
+        self.cursor = cursor
+        self.slow_log = slow_log
+        self.user = user
+        self.statement = ''
+
+    def execute(self, operation, parameters = None):
+        self.statement = operation
+        start = time.perf_counter()
+        if parameters is None:
+            res = self.cursor.execute(operation)
+        else:
+            res = self.cursor.execute(operation, parameters)
+        elapsed = time.perf_counter() - start
+        if elapsed >= self.slow_log.threshold:
+            self.slow_log.record('execute', operation, getattr(self.cursor, 'rowcount', -1), elapsed, self.user)
+        return res
+
+    def executemany(self, operation, parameters):
+        start = time.perf_counter()
+        res = self.cursor.executemany(operation, parameters)
+        elapsed = time.perf_counter() - start
+        if elapsed >= self.slow_log.threshold:
+            self.slow_log.record('executemany', operation, len(parameters), elapsed, self.user)
+        return res
+
+    def fetch(self, operation, fetch_function, *args):
+        start = time.perf_counter()
+        rows = fetch_function(*args)
+        elapsed = time.perf_counter() - start
+        if elapsed >= self.slow_log.threshold:
+            self.slow_log.record(operation, self.statement, len(rows), elapsed, self.user)
+        return rows
+
+    def fetchall(self):
+        return self.fetch('fetchall', self.cursor.fetchall)
+
+    def fetchmany(self, size):
+        return self.fetch('fetchmany', self.cursor.fetchmany, size)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
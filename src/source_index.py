@@ -0,0 +1,68 @@
+'''Persistent index of the sources of root objects.
+For each source of a created object, the index table of the tenant contains the SHA-256 of the
+JSON of the source with the table and id of the object. Associations whose source is not part of
+the same data package are resolved with it, so that data can be loaded in independent parts.'''
+import hashlib
+from id_list import chunk_id_list, get_placeholders
+
+SOURCE_INDEX_TABLE = '_SOURCE_KEY'
+
+def get_create_statement():
+    return f'create table "{SOURCE_INDEX_TABLE}" '\
+        '(SOURCE_HASH VARCHAR(64) primary key, TABLE_NAME NVARCHAR(256), ID NVARCHAR(256))'
+
+def source_hash(hashable_key: str):
+    """hashable_key is the JSON of the source as used as key of the idmapping"""
+    return hashlib.sha256(hashable_key.encode('utf-8')).hexdigest()
+
+def read_source_ids(cur, hashable_keys):
+    """Stored table name and id by source hash"""
+    res = {}
+    for id_list_size, id_list in chunk_id_list([source_hash(w) for w in hashable_keys]):
+        cur.execute(f'SELECT SOURCE_HASH, TABLE_NAME, ID from "{SOURCE_INDEX_TABLE}" '\
+            f'where SOURCE_HASH in ({get_placeholders(id_list_size)})', id_list)
+        res.update((w[0], (w[1], w[2])) for w in cur.fetchall())
+    return res
+
+def replace_ids(inserts, replacements):
+    for v in inserts.values():
+        for row in v['rows']:
+            for i, value in enumerate(row):
+                if isinstance(value, str) and value in replacements:
+                    row[i] = replacements[value]
+
+def resolve_sources(idmapping, hashable_keys, inserts, stored):
+    """Resolves the unresolved sources which are stored for the referenced table.
+    The preliminary ids of the references in inserts are replaced by the stored ids"""
+    replacements = {}
+    for hashable_key in hashable_keys:
+        entry = idmapping[hashable_key]
+        stored_entry = stored.get(source_hash(hashable_key))
+        if stored_entry and stored_entry[0] == entry['table']:
+            replacements[entry['id']] = stored_entry[1]
+            entry['id'] = stored_entry[1]
+            entry['resolved'] = True
+    if replacements:
+        replace_ids(inserts, replacements)
+
+def forget_resolved_sources(idmapping):
+    """Removes the resolved entries of idmapping after their objects are written. Later references
+    find them in the index, so only the entries of pending references are kept in memory"""
+    for hashable_key in [k for k, v in idmapping.items() if v['resolved']]:
+        del idmapping[hashable_key]
+
+def write_source_keys(cur, source_keys):
+    """Writes the (source JSON, table name, id) entries. Existing entries of the sources are replaced"""
+    rows = list({source_hash(w[0]): (source_hash(w[0]), w[1], w[2]) for w in source_keys}.values())
+    if not rows:
+        return
+    for id_list_size, id_list in chunk_id_list([w[0] for w in rows]):
+        cur.execute(f'DELETE from "{SOURCE_INDEX_TABLE}" where SOURCE_HASH in ({get_placeholders(id_list_size)})',\
+            id_list)
+    cur.executemany(f'insert into "{SOURCE_INDEX_TABLE}" (SOURCE_HASH, TABLE_NAME, ID) values (?, ?, ?)', rows)
+
+def delete_source_keys(cur, table_name, ids):
+    """Deletes the entries of the objects with ids of the root table table_name"""
+    for id_list_size, id_list in chunk_id_list(ids):
+        cur.execute(f'DELETE from "{SOURCE_INDEX_TABLE}" where TABLE_NAME = ? '\
+            f'and ID in ({get_placeholders(id_list_size)})', [table_name] + id_list)
@@ -1,6 +1,8 @@
 '''Creates SQL commands from tables'''
 from copy import deepcopy
 import convert
+from content_hash import CONTENT_HASH_DEFINITION
+from source_index import get_create_statement as get_source_index_statement
 
 
 ESH_CONFIG_TEMPLATE = {
@@ -51,6 +53,9 @@ def get_columns(table):
             suffix = ''
         cl = f'"{prop_name}" {column_type}{suffix}'
         columns.append(cl)
+    if 'contentHash' in table:
+        d = CONTENT_HASH_DEFINITION
+        columns.append(f'"{table["contentHash"]}" {d[Constants.type]}({d[Constants.length]})')
     return columns
 
 def sequence(i = 0, prefix = '', fill = 3):
@@ -163,6 +168,8 @@ def mapping_to_ddl(mapping, schema_name):
             views.append(cv.get_sql_statement())
             esh_config['content']['EntityType']['Properties'].extend(esh_config_properties)
             esh_configs.append(esh_config)
+    if mapping.get('sourceIndex'):
+        tables.append(get_source_index_statement())
 
     return {'tables': tables, 'views': views, 'eshConfig':esh_configs}
 
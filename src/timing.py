@@ -0,0 +1,107 @@
+'''Phase timings of requests, returned in the Server-Timing header.
+Timing is only active for requests of the TimingMiddleware if it is enabled. Otherwise
+phase() returns a shared no-op context manager.'''
+from contextvars import ContextVar
+import json
+import time
+
+request_timing = ContextVar('request_timing', default = None)
+
+class RequestTiming():
+    """Durations in seconds by phase name. Durations of the same phase are summed up"""
+    def __init__(self):
+        self.phases = {}
+
+    def add(self, name: str, duration: float):
+        self.phases[name] = self.phases.get(name, 0) + duration
+
+    def get_header(self):
+        return ', '.join(f'{k};dur={v * 1000:.2f}' for k, v in self.phases.items())
+
+class Phase():
+    __slots__ = ('name', 'timing', 'start')
+    def __init__(self, name: str, timing: RequestTiming):
+        self.name = name
+        self.timing = timing
+        self.start = 0
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.timing.add(self.name, time.perf_counter() - self.start)
+
+class NoPhase():
+    __slots__ = ()
+    def __enter__(self):
+        return self
+    def __exit__(self, exception_type, exception_value, traceback):
+        pass
+
+NO_PHASE = NoPhase()
+
+def phase(name: str):
+    """Context manager which adds its duration to the phase name of the current request"""
+    timing = request_timing.get()
+    if timing is None:
+        return NO_PHASE
+    return Phase(name, timing)
+
+def is_active():
+    return request_timing.get() is not None
+
+class TimingMiddleware():
+    """ASGI middleware which adds the Server-Timing header if enabled() returns true.
+    If the request has the header X-Debug-Timing: json, the timings are also added as member
+    _timing to JSON object responses"""
+    def __init__(self, app, enabled):
+        self.app = app
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.enabled():
+            await self.app(scope, receive, send)
+            return
+        timing = RequestTiming()
+        token = request_timing.set(timing)
+        start = time.perf_counter()
+        debug_json = (b'x-debug-timing', b'json') in scope['headers']
+        buffered = {}
+
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start':
+                timing.add('total', time.perf_counter() - start)
+                headers = list(message.get('headers', []))
+                if debug_json and (b'content-type', b'application/json') in headers:
+                    # body is changed when it is complete
+                    buffered['start'] = dict(message, headers = headers)
+                    buffered['body'] = []
+                    return
+                headers.append((b'server-timing', timing.get_header().encode('latin-1')))
+                message = dict(message, headers = headers)
+            elif message['type'] == 'http.response.body' and 'start' in buffered:
+                buffered['body'].append(message.get('body', b''))
+                if message.get('more_body', False):
+                    return
+                await send_debug_response()
+                return
+            await send(message)
+
+        async def send_debug_response():
+            body = b''.join(buffered['body'])
+            try:
+                content = json.loads(body)
+                if isinstance(content, dict):
+                    content['_timing'] = {k: round(v * 1000, 3) for k, v in timing.phases.items()}
+                    body = json.dumps(content).encode('utf-8')
+            except ValueError:
+                pass
+            headers = [w for w in buffered['start']['headers'] if w[0] != b'content-length']
+            headers.append((b'content-length', str(len(body)).encode('latin-1')))
+            headers.append((b'server-timing', timing.get_header().encode('latin-1')))
+            await send(dict(buffered['start'], headers = headers))
+            await send({'type': 'http.response.body', 'body': body})
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_timing.reset(token)
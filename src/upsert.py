@@ -0,0 +1,148 @@
+'''Change detection for upserts.
+Incoming objects are compared to the stored objects. The root row and each sub-table tree
+(table of level 1 with its contained tables) of an object are only rewritten if they changed.
+The incoming objects are assembled from the rows created by objects_to_dml in the same way as
+the stored objects are assembled from the rows read, so associations are compared by the ids of
+their targets and values in the form returned by the DB.
+Values are compared in their JSON representation. Arrays are compared without order.'''
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from content_hash import canonical
+from read_plan import get_table_sequence
+
+class SubtableTree():
+    """Table of level 1 with its contained tables. Tables are ordered such that contained tables come first"""
+    def __init__(self, mapping, table):
+        self.table_name = table['table_name']
+        self.path = tuple(table['external_path'][1:])
+        self.tables = get_table_sequence(mapping, table)
+
+def get_subtable_trees(mapping, root_table):
+    return [SubtableTree(mapping, w) for w in mapping['tables'].values()\
+        if w['level'] == 1 and w['parent'] == root_table['table_name']]
+
+def get_path_value(obj, path):
+    for step in path:
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(step)
+    return obj
+
+def without_paths(obj, paths):
+    """Copy of obj without the values at paths. Only the changed dictionaries are copied"""
+    res = dict(obj)
+    for path in paths:
+        target = res
+        for step in path[:-1]:
+            if not isinstance(target.get(step), dict):
+                target = None
+                break
+            target[step] = dict(target[step])
+            target = target[step]
+        if target is not None:
+            target.pop(path[-1], None)
+    return res
+
+def parse_datetime(value):
+    if not isinstance(value, str):
+        return value
+    res = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if res.tzinfo:
+        res = res.astimezone(timezone.utc).replace(tzinfo = None)
+    return res
+
+def parse_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+def parse_time(value):
+    return time.fromisoformat(value) if isinstance(value, str) else value
+
+def to_decimal(value):
+    return Decimal(str(value))
+
+STORED_VALUE_CONVERTERS = {
+    'TIMESTAMP': parse_datetime, 'SECONDDATE': parse_datetime, 'DATE': parse_date, 'TIME': parse_time,
+    'DECIMAL': to_decimal, 'SMALLDECIMAL': to_decimal, 'DOUBLE': float, 'REAL': float}
+
+def to_stored_value(typ, value):
+    """Provided value of a column of type typ in the form returned by the DB when it is read.
+    Values which cannot be converted are returned unchanged"""
+    converter = STORED_VALUE_CONVERTERS.get(typ)
+    if converter is None or value is None:
+        return value
+    try:
+        return converter(value)
+    except (TypeError, ValueError, ArithmeticError):
+        return value
+
+def assemble_inserts(mapping, read_plan, inserts):
+    """Assembles the objects of the rows created by objects_to_dml with the read plan of the stored objects.
+    Returns a dictionary by key"""
+    all_objects = {}
+    for table_plan in read_plan.tables:
+        table = mapping['tables'][table_plan.table_name]
+        rows = []
+        if table_plan.table_name in inserts:
+            v = inserts[table_plan.table_name]
+            # the rows are arranged like the selected columns
+            positions = [(v['columns'].get(k), w['type']) for k, w in table['columns'].items()\
+                if not ('isVirtual' in w and w['isVirtual'])]
+            rows = [[None if position is None else to_stored_value(typ, row[position]) for position, typ in positions]\
+                for row in v['rows']]
+        all_objects[table_plan.table_name] = table_plan.assemble(rows, all_objects)
+    return all_objects[read_plan.root_table_name]
+
+def compare_object(trees, stored, incoming):
+    """Returns whether the root row changed and the names of the changed sub-table trees.
+    incoming must be assembled with assemble_inserts"""
+    paths = [w.path for w in trees]
+    root_changed = canonical(without_paths(stored, paths)) != canonical(without_paths(incoming, paths))
+    changed_trees = {w.table_name for w in trees\
+        if canonical(get_path_value(stored, w.path)) != canonical(get_path_value(incoming, w.path))}
+    return root_changed, changed_trees
+
+def get_root_ids(mapping, inserts):
+    """Root object id of each row by table name"""
+    root_ids = {}
+    own_ids = {}
+    for table_name in sorted(inserts.keys(), key = lambda w: mapping['tables'][w]['level']):
+        table = mapping['tables'][table_name]
+        columns = inserts[table_name]['columns']
+        rows = inserts[table_name]['rows']
+        if table['level'] == 0:
+            pk_index = columns[table['pk']]
+            root_ids[table_name] = [w[pk_index] for w in rows]
+        else:
+            parent_index = columns[table['pkParent']]
+            if table['level'] == 1:
+                root_ids[table_name] = [w[parent_index] for w in rows]
+            else:
+                parent_ids = own_ids[table['parent']]
+                root_ids[table_name] = [parent_ids.get(w[parent_index]) for w in rows]
+        if 'pk' in table and table['level'] > 0:
+            pk_index = columns[table['pk']]
+            own_ids[table_name] = dict(zip((w[pk_index] for w in rows), root_ids[table_name]))
+    return root_ids
+
+def get_tree_name(mapping, table_name):
+    table = mapping['tables'][table_name]
+    if table['level'] == 0:
+        return None
+    while table['level'] > 1:
+        table = mapping['tables'][table['parent']]
+    return table['table_name']
+
+def filter_inserts(mapping, inserts, skipped_ids):
+    """Removes the rows of unchanged parts of objects. skipped_ids contains the root ids
+    of the unchanged objects by table name of the root table or sub-table tree"""
+    root_ids = get_root_ids(mapping, inserts)
+    res = {}
+    for table_name, v in inserts.items():
+        ids = skipped_ids.get(get_tree_name(mapping, table_name) or table_name)
+        if ids:
+            rows = [row for row, root_id in zip(v['rows'], root_ids[table_name]) if root_id not in ids]
+        else:
+            rows = v['rows']
+        if rows:
+            res[table_name] = {'columns': v['columns'], 'rows': rows}
+    return res
@@ -0,0 +1,73 @@
+'''Group commit of small concurrent writes.
+Writes submitted with the same key (e.g. tenant and model version) within max_delay seconds are
+collected into a group, which is written by a single handler call, i.e. with one connection and
+one commit. A group is written early when it contains max_objects objects.
+All state is kept per event loop, so no locks are needed.'''
+import asyncio
+import metrics
+
+write_group_requests = metrics.registry.register(metrics.Histogram('write_group_requests',\
+    'Requests written together by the group commit', (), (1, 2, 5, 10, 20, 50, 100, 200)))
+
+class WriteGroup():
+    __slots__ = ('items', 'futures', 'num_objects', 'timer')
+    def __init__(self):
+        self.items = []
+        self.futures = []
+        self.num_objects = 0
+        self.timer = None
+
+class WriteCoalescer():
+    """handler(key, items) writes the items of a group and returns one result per item.
+    A result which is an exception is raised to the submitter of its item only.
+    An exception of the handler is raised to all submitters of the group"""
+    def __init__(self, handler, max_delay: float = 0.005, max_objects: int = 1000):
+        self.handler = handler
+        self.max_delay = max_delay
+        self.max_objects = max_objects
+        self.groups = {}
+        self.writes = set()
+
+    async def submit(self, key, item, num_objects: int):
+        """Adds item to the group of key and returns its result when the group is written"""
+        loop = asyncio.get_running_loop()
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = WriteGroup()
+            group.timer = loop.call_later(self.max_delay, self.start_write, key)
+        future = loop.create_future()
+        group.items.append(item)
+        group.futures.append(future)
+        group.num_objects += num_objects
+        if group.num_objects >= self.max_objects:
+            self.start_write(key)
+        return await future
+
+    def start_write(self, key):
+        group = self.groups.pop(key)
+        group.timer.cancel()
+        # keep a reference, the event loop only keeps weak references to tasks
+        task = asyncio.create_task(self.write(key, group))
+        self.writes.add(task)
+        task.add_done_callback(self.writes.discard)
+
+    async def write(self, key, group):
+        write_group_requests.observe(len(group.items))
+        try:
+            results = await self.handler(key, group.items)
+        except Exception as e: #pylint: disable=broad-exception-caught
+            results = [e] * len(group.items)
+        for future, result in zip(group.futures, results):
+            # the submitter may have been cancelled, e.g. because the client disconnected
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def stop(self):
+        """Writes the collected groups and waits for the running writes"""
+        for key in list(self.groups):
+            self.start_write(key)
+        await asyncio.gather(*self.writes, return_exceptions = True)
@@ -6,6 +6,7 @@ import json
 import argparse
 import requests
 import sys
+import time
 from enum import Enum
 from copy import deepcopy
 class TestType(Enum):
@@ -14,6 +15,12 @@ class TestType(Enum):
     CDS = 'model.cds'
     CSON = 'cson.json'
     DATA = 'data.json'
+    DEPLOY_PARAMETERS = 'deployParameters.json'
+    DATA_REFERENCES = 'dataReferences.json'
+    DATA_UPSERT = 'dataUpsert.json'
+    DATA_STREAM = 'dataStream.ndjson'
+    DATA_STREAM_SYNC = 'dataStreamSync.ndjson'
+    DATA_JOB = 'dataJob.json'
     SEARCH_REQ_ODATA = 'searchRequestOData.json'
     SEARCH_REQ_OPENAPI = 'searchRequestOpenAPI.json'
     SEARCH_RESP_ODATA_GET = 'ODataGET'
@@ -25,11 +32,21 @@ class TestType(Enum):
     CREATE_MODEL = 'serviceResponseCreateModel.json'
     LOAD_DATA = 'serviceResponseLoadData.json'
     READ_DATA = 'serviceResponseReadData.json'
+    LOAD_DATA_REFERENCES = 'serviceResponseLoadDataReferences.json'
+    READ_DATA_STREAM = 'serviceResponseReadDataStream.json'
+    UPSERT_DATA = 'serviceResponseUpsertData.json'
+    LOAD_DATA_STREAM = 'serviceResponseLoadDataStream.json'
+    SYNC_DATA_STREAM = 'serviceResponseSyncDataStream.json'
+    LOAD_DATA_JOB = 'serviceResponseLoadDataJob.json'
     DELETE_DATA = 'serviceResponseDeleteData.json'
     NONE = ''
 
 
 
+STREAM_BATCH_SIZE = 2
+JOB_POLL_INTERVAL = 0.5
+JOB_MAX_POLLS = 60
+
 class FileLocation(Enum):
     OUTPUT = 'output'
     REFERENCE = 'reference'
@@ -45,7 +62,9 @@ def file_name(package_name, test_name, typ:TestType, location:FileLocation = Non
 
     if typ == TestType.FOLDER_ONLY:
         res = os.path.join(root, location.value)
-    elif typ in (TestType.CDS, TestType.DATA, TestType.SEARCH_REQ_ODATA, TestType.SEARCH_REQ_OPENAPI):
+    elif typ in (TestType.CDS, TestType.DATA, TestType.SEARCH_REQ_ODATA, TestType.SEARCH_REQ_OPENAPI,\
+        TestType.DEPLOY_PARAMETERS, TestType.DATA_REFERENCES, TestType.DATA_UPSERT, TestType.DATA_STREAM,\
+        TestType.DATA_STREAM_SYNC, TestType.DATA_JOB):
         res = os.path.join(root,  typ.value)
     elif typ in (TestType.SEARCH_RESP_ODATA_GET, TestType.SEARCH_RESP_ODATA_POST, TestType.SEARCH_RESP_OPENAPI):
         if location == FileLocation.OUTPUT:
@@ -127,10 +146,29 @@ def mask_uuid(obj, key_name):
                 obj[k] = "".join([ '*'\
                      if c.isalnum() else c for c in obj[k] ])
 
+def add_object_ids(object_ids, ids):
+    '''Adds the keys of created objects by object type to object_ids'''
+    if object_ids is None:
+        object_ids = {}
+    for obj_typ, obj_list in ids.items():
+        object_ids.setdefault(obj_typ, []).extend(obj_list)
+    return object_ids
+
 def process_service_response(package_name, test_name, requst_type: TestType, response):
     result = {'statusCode': response.status_code}
-    r = response.json()
-    if requst_type in (TestType.LOAD_DATA, TestType.READ_DATA):
+    if requst_type == TestType.READ_DATA_STREAM:
+        # newline-delimited JSON in the order of the ids, which are generated
+        r = [json.loads(w) for w in response.text.splitlines() if w]
+        mask_uuid(r, 'id')
+        r.sort(key = lambda w: json.dumps(w, sort_keys = True))
+    else:
+        r = response.json()
+    if requst_type == TestType.LOAD_DATA_JOB:
+        mask_uuid(r, 'id')
+        for k in ('createdAt', 'startedAt', 'finishedAt'):
+            if r.get(k):
+                r[k] = '*'
+    if requst_type in (TestType.LOAD_DATA, TestType.READ_DATA, TestType.LOAD_DATA_REFERENCES):
         for obj_typ, obj_list in r.items():
             for obj in obj_list:
                 mask_uuid(obj, 'id')
@@ -245,7 +283,12 @@ for package, tests in packages.items():
                 process_service_response(package, test, TestType.DELETE_TENANT, r)
             r = requests.post(f'{base_url}/v1/tenant/{tenant_name}')
             process_service_response(package, test, TestType.CREATE_TENANT, r)
-            r = requests.post(f'{base_url}/v1/deploy/{tenant_name}', json=cson)
+            # optional query parameters of the deployment, e.g. content_hash
+            deploy_parameters = None
+            if os.path.exists(file_name(package, test, TestType.DEPLOY_PARAMETERS)):
+                with open(file_name(package, test, TestType.DEPLOY_PARAMETERS), encoding='utf-8') as f:
+                    deploy_parameters = json.load(f)
+            r = requests.post(f'{base_url}/v1/deploy/{tenant_name}', json=cson, params=deploy_parameters)
             process_service_response(package, test, TestType.CREATE_MODEL, r)
             object_ids = None
             if data_exist:
@@ -259,6 +302,52 @@ for package, tests in packages.items():
                         object_ids = deepcopy(ids)
                         r = requests.post(f'{base_url}/v1/read/{tenant_name}', json= ids)
                         process_service_response(package, test, TestType.READ_DATA, r)
+            # Data package referencing the objects of data.json by their source. Needs a deployment with source_index
+            if os.path.exists(file_name(package, test, TestType.DATA_REFERENCES)):
+                with open(file_name(package, test, TestType.DATA_REFERENCES), encoding='utf-8') as f:
+                    data_references = json.load(f)
+                r = requests.post(f'{base_url}/v1/data/{tenant_name}', json=data_references)
+                if r.status_code == 200:
+                    object_ids = add_object_ids(object_ids, r.json())
+                process_service_response(package, test, TestType.LOAD_DATA_REFERENCES, r)
+            # Upsert
+            if os.path.exists(file_name(package, test, TestType.DATA_UPSERT)):
+                with open(file_name(package, test, TestType.DATA_UPSERT), encoding='utf-8') as f:
+                    data_upsert = json.load(f)
+                r = requests.put(f'{base_url}/v1/data/{tenant_name}', json=data_upsert)
+                process_service_response(package, test, TestType.UPSERT_DATA, r)
+            # Streaming load in small batches, so that references between batches are included
+            if os.path.exists(file_name(package, test, TestType.DATA_STREAM)):
+                with open(file_name(package, test, TestType.DATA_STREAM), 'rb') as f:
+                    r = requests.post(f'{base_url}/v1/data/{tenant_name}/stream', data=f\
+                        , params={'batch_size': STREAM_BATCH_SIZE}, headers={'Content-Type': 'application/x-ndjson'})
+                process_service_response(package, test, TestType.LOAD_DATA_STREAM, r)
+            # Streaming load in sync mode. Needs a deployment with content_hash
+            if os.path.exists(file_name(package, test, TestType.DATA_STREAM_SYNC)):
+                with open(file_name(package, test, TestType.DATA_STREAM_SYNC), 'rb') as f:
+                    r = requests.post(f'{base_url}/v1/data/{tenant_name}/stream', data=f\
+                        , params={'batch_size': STREAM_BATCH_SIZE, 'mode': 'sync'}\
+                        , headers={'Content-Type': 'application/x-ndjson'})
+                process_service_response(package, test, TestType.SYNC_DATA_STREAM, r)
+            # Ingestion job. The status is polled until the job is finished
+            if os.path.exists(file_name(package, test, TestType.DATA_JOB)):
+                with open(file_name(package, test, TestType.DATA_JOB), encoding='utf-8') as f:
+                    data_job = json.load(f)
+                r = requests.post(f'{base_url}/v1/data/{tenant_name}/jobs', json=data_job)
+                if r.status_code == 202:
+                    job_url = f"{base_url}/v1/data/{tenant_name}/jobs/{r.json()['id']}"
+                    for _ in range(JOB_MAX_POLLS):
+                        r = requests.get(job_url)
+                        if r.status_code != 200 or r.json()['state'] in ('succeeded', 'failed'):
+                            break
+                        time.sleep(JOB_POLL_INTERVAL)
+                    if r.status_code == 200 and 'result' in r.json():
+                        object_ids = add_object_ids(object_ids, r.json()['result'])
+                process_service_response(package, test, TestType.LOAD_DATA_JOB, r)
+            # Streaming read of the loaded objects after all changes
+            if object_ids:
+                r = requests.post(f'{base_url}/v1/read/{tenant_name}/stream', json= object_ids)
+                process_service_response(package, test, TestType.READ_DATA_STREAM, r)
             # OpenAPI
             query_fn = file_name(package, test, TestType.SEARCH_REQ_OPENAPI)
             if os.path.exists(query_fn):
@@ -0,0 +1,82 @@
+'''
+Benchmark: returning ESH_SEARCH results in /v1/search and /v2/search
+Compares parsing, cleansing and serializing the result objects as done before
+with the passthrough of the raw JSON string. No database is needed.
+'''
+import gc
+import json
+import os
+import sys
+import time
+import argparse
+from fastapi.encoders import jsonable_encoder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+#pylint: disable=wrong-import-position
+from esh_response import cleanse_result, join_results
+
+def create_result(num_items, num_connectors):
+    """ESH_SEARCH result with whyfound and wherefound annotations"""
+    items = [{
+        '@odata.context': '$metadata#EXAMPLEPERSON',
+        '@com.sap.vocabularies.Search.v1.Ranking': 0.9 - i / 1000,
+        '@com.sap.vocabularies.Search.v1.WhyFound': {
+            'FIRSTNAME': [f'<b>Name</b> {i} ' * 20], 'DESCRIPTION': ['some <b>text</b> ' * 100]},
+        '@com.sap.vocabularies.Search.v1.WhereFound': '<TERM name="name" found="FIRSTNAME,DESCRIPTION"/>' * 10,
+        'ID': f'{i:032x}',
+        'FIRSTNAME': f'Name {i}',
+        'LASTNAME': f'Last {i}',
+        'DESCRIPTION': 'some text ' * 100
+        } for i in range(num_items)]
+    return json.dumps({
+        '@odata.context': '$metadata#$all',
+        '@odata.count': num_items,
+        '@com.sap.vocabularies.Search.v1.SearchStatistics': {'ConnectorStatistics': [
+            {'OdataID': f'CONNECTOR{i}', 'Schema': 'ESH_TENANT_X', 'Name': f'CONNECTOR{i}', 'StatusCode': 200}\
+                for i in range(num_connectors)]},
+        'value': items})
+
+def search_parsed(rows):
+    """Result processing before passthrough: cleanse_output and serialization by FastAPI's JSONResponse"""
+    res_out = []
+    for res in [json.loads(w[0]) for w in rows]:
+        if '@com.sap.vocabularies.Search.v1.SearchStatistics' in res \
+            and 'ConnectorStatistics' in res['@com.sap.vocabularies.Search.v1.SearchStatistics']:
+            for c in res['@com.sap.vocabularies.Search.v1.SearchStatistics']['ConnectorStatistics']:
+                del c['Schema']
+                del c['Name']
+        res_out.append(res)
+    return json.dumps(jsonable_encoder(res_out), ensure_ascii=False, allow_nan=False, indent=None,\
+        separators=(',', ':')).encode('utf-8')
+
+def search_passthrough(rows):
+    return join_results([cleanse_result(w[0]) for w in rows]).encode('utf-8')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark for returning ESH_SEARCH results')
+    parser.add_argument('-n', '--num-items', help='number of result items per query', type=int, default=100)
+    parser.add_argument('-q', '--num-queries', help='number of queries of the bulk search', type=int, default=20)
+    parser.add_argument('-c', '--num-connectors', help='number of connectors', type=int, default=10)
+    parser.add_argument('-r', '--runs', help='number of runs', type=int, default=5)
+    args = parser.parse_args()
+
+    result_rows = [(create_result(args.num_items, args.num_connectors),) for _ in range(args.num_queries)]
+    size = sum(len(w[0]) for w in result_rows)
+    print(f'{args.num_queries} queries, {args.num_items} items per query, {size / 1024 / 1024:.1f} MB')
+
+    gc.disable()
+    parsed_time = passthrough_time = float('inf')
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        parsed = search_parsed(result_rows)
+        parsed_time = min(parsed_time, time.perf_counter() - start)
+        start = time.perf_counter()
+        passthrough = search_passthrough(result_rows)
+        passthrough_time = min(passthrough_time, time.perf_counter() - start)
+    gc.enable()
+
+    if json.loads(parsed) != json.loads(passthrough):
+        print('ERROR: results of parsed and passthrough processing differ')
+        sys.exit(-1)
+    print(f'parsed:      {parsed_time * 1000:.1f}ms')
+    print(f'passthrough: {passthrough_time * 1000:.1f}ms')
+    print(f'speedup:     {parsed_time / passthrough_time:.1f}x')
@@ -0,0 +1,67 @@
+'''
+Benchmark: JSON encoding and decoding in the server
+Compares the previous path (json module, responses converted by jsonable_encoder)
+with json_codec for request bodies, /v1/read responses and the persisted mapping.
+'''
+import gc
+import json
+import os
+import sys
+import time
+import argparse
+from copy import deepcopy
+from fastapi.encoders import jsonable_encoder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+#pylint: disable=wrong-import-position
+import convert
+import json_codec
+from read_plan_benchmark import CSON, create_objects
+
+MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'packages', 'relationships', '01',\
+    'output', 'cson.json')
+
+def response_before(content):
+    """Serialization of an endpoint return value by FastAPI's JSONResponse"""
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None,\
+        separators=(',', ':')).encode('utf-8')
+
+def measure(runs, func, *args):
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        res = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, res
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark for JSON encoding and decoding')
+    parser.add_argument('-n', '--num-objects', help='number of objects', type=int, default=20000)
+    parser.add_argument('-r', '--runs', help='number of runs', type=int, default=5)
+    args = parser.parse_args()
+
+    objects = create_objects(args.num_objects)
+    convert.objects_to_dml(convert.cson_to_mapping(deepcopy(CSON)), objects)
+    body = json.dumps(objects).encode('utf-8')
+    with open(MODEL_FILE, encoding = 'utf-8') as fr:
+        mapping = convert.cson_to_mapping(json.load(fr))
+    mapping_json = json.dumps(mapping)
+    print(f'{args.num_objects} objects, request body {len(body) / 1024 / 1024:.1f} MB, '
+        f'mapping {len(mapping_json) / 1024:.0f} KB, backend {json_codec.BACKEND}')
+
+    cases = [
+        ('request body', (json.loads, body), (json_codec.loads, body)),
+        ('read response', (response_before, objects), (json_codec.dumpb, objects)),
+        ('mapping load', (json.loads, mapping_json), (json_codec.loads, mapping_json)),
+        ('mapping store', (json.dumps, mapping), (json_codec.dumps, mapping))]
+    gc.disable()
+    for name, (before_func, before_arg), (codec_func, codec_arg) in cases:
+        before_time, before = measure(args.runs, before_func, before_arg)
+        codec_time, codec = measure(args.runs, codec_func, codec_arg)
+        if isinstance(before, (bytes, str)):
+            before, codec = json.loads(before), json.loads(codec)
+        if before != codec:
+            print(f'ERROR: results of {name} differ')
+            sys.exit(-1)
+        print(f'{name:14} before: {before_time * 1000:8.2f}ms  codec: {codec_time * 1000:8.2f}ms  '
+            f'speedup: {before_time / codec_time:.1f}x')
+    gc.enable()
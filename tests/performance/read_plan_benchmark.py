@@ -0,0 +1,165 @@
+'''
+Benchmark: assembling objects in /v1/read from table rows
+Compares the per-row interpretation of the mapping with compiled read plans.
+Rows are created with convert.objects_to_dml, no database is needed.
+'''
+import gc
+import os
+import sys
+import time
+import argparse
+from copy import deepcopy
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+#pylint: disable=wrong-import-position
+import convert
+from read_plan import compile_read_plans, get_table_sequence, get_converter
+
+CSON = {
+    'definitions': {
+        'bench.Person': {
+            'kind': 'entity',
+            'elements': {
+                'id': {'key': True, 'type': 'cds.UUID'},
+                'source': {'items': {'elements': {
+                    'name': {'type': 'cds.String', 'length': 4000},
+                    'type': {'type': 'cds.String', 'length': 4000},
+                    'sid': {'type': 'cds.String', 'length': 4000}}}},
+                'firstName': {'type': 'cds.String', 'length': 256},
+                'lastName': {'type': 'cds.String', 'length': 256},
+                'address': {'elements': {
+                    'street': {'type': 'cds.String', 'length': 256},
+                    'city': {'type': 'cds.String', 'length': 256}}},
+                'emails': {'items': {'type': 'cds.String', 'length': 256}},
+                'phones': {'items': {'elements': {
+                    'number': {'type': 'cds.String', 'length': 40},
+                    'tags': {'items': {'type': 'cds.String', 'length': 40}}}}}
+            }
+        }
+    }
+}
+
+def create_objects(num_objects):
+    return {'bench.Person': [{
+        'source': [{'name': 'benchmark', 'type': 'Person', 'sid': f'sid{i}'}],
+        'firstName': f'First{i}',
+        'lastName': f'Last{i}',
+        'address': {'street': f'Street {i}', 'city': 'Walldorf'},
+        'emails': [f'p{i}@example.com', f'p{i}@example.org'],
+        'phones': [{'number': f'+49 {i}', 'tags': ['work', 'mobile']}, {'number': f'+1 {i}'}]
+        } for i in range(num_objects)]}
+
+def select_rows(mapping, inserts):
+    """Projects the inserted rows to the columns of the select statements"""
+    rows = {}
+    for table_name, table in mapping['tables'].items():
+        columns = [k for k, v in table['columns'].items() if not ('isVirtual' in v and v['isVirtual'])]
+        ins = inserts[table_name]
+        rows[table_name] = [tuple(row[ins['columns'][c]] if c in ins['columns'] else None for c in columns)\
+            for row in ins['rows']]
+    return rows
+
+def add_value(column, obj, path, value):
+    if value is None:
+        return
+    if len(path) == 1:
+        if 'type' in column:
+            converter = get_converter(column['type'])
+            obj[path[0]] = converter(value) if converter else value
+        else:
+            obj[path[0]] = value
+    else:
+        if not path[0] in obj:
+            obj[path[0]] = {}
+        add_value(column, obj[path[0]], path[1:], value)
+
+def read_interpreted(mapping, object_type, rows, ids):
+    """Per-row interpretation of the mapping as done before read plans were introduced"""
+    root_table = mapping['tables'][mapping['entities'][object_type]['table_name']]
+    all_objects = {}
+    for table in get_table_sequence(mapping, root_table):
+        all_objects[table['table_name']] = {}
+        if '_VALUE' in table['columns']:
+            for key, _ , val_int in rows[table['table_name']]:
+                converter = get_converter(table['columns']['_VALUE']['type'])
+                value = converter(val_int) if converter else val_int
+                if key in all_objects[table['table_name']]:
+                    all_objects[table['table_name']][key].append(value)
+                else:
+                    all_objects[table['table_name']][key] = [value]
+            continue
+        for row in rows[table['table_name']]:
+            i = 0
+            res_obj = {}
+            for prop_name, prop in table['columns'].items():
+                if prop_name == table['pk']:
+                    sub_obj_key = row[i]
+                    if table['level'] == 0:
+                        res_key = row[i]
+                        add_value(prop, res_obj, prop['external_path'], row[i])
+                elif table['level'] > 0 and prop_name == table['pkParent']:
+                    res_key = row[i]
+                elif 'isVirtual' in prop and prop['isVirtual']:
+                    if prop['rel']['type'] == 'containment':
+                        if sub_obj_key in all_objects[prop['rel']['table_name']]:
+                            sub_obj = all_objects[prop['rel']['table_name']][sub_obj_key]
+                            add_value(prop, res_obj, prop['external_path'], sub_obj)
+                    continue
+                elif 'rel' in prop and prop['rel']['type'] == 'association':
+                    rel_table = mapping['tables'][prop['rel']['table_name']]
+                    path = prop['external_path'] + rel_table['columns'][rel_table['pk']]['external_path']
+                    add_value(prop, res_obj, path, row[i])
+                else:
+                    add_value(prop, res_obj, prop['external_path'], row[i])
+                i += 1
+            if table['level'] > 0:
+                if not res_key in all_objects[table['table_name']]:
+                    all_objects[table['table_name']][res_key] = []
+                all_objects[table['table_name']][res_key].append(res_obj)
+            else:
+                all_objects[table['table_name']][res_key] = res_obj
+    return [all_objects[root_table['table_name']][i] for i in ids]
+
+def read_compiled(read_plans, object_type, rows, ids):
+    read_plan = read_plans[object_type]
+    all_objects = {}
+    for table_plan in read_plan.tables:
+        all_objects[table_plan.table_name] = table_plan.assemble(rows[table_plan.table_name], all_objects)
+    root_objects = all_objects[read_plan.root_table_name]
+    return [root_objects[i] for i in ids]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark for assembling objects in /v1/read')
+    parser.add_argument('-n', '--num-objects', help='number of objects', type=int, default=100000)
+    parser.add_argument('-r', '--runs', help='number of runs', type=int, default=3)
+    args = parser.parse_args()
+
+    mapping = convert.cson_to_mapping(deepcopy(CSON))
+    objects = create_objects(args.num_objects)
+    dml = convert.objects_to_dml(mapping, objects)
+    rows = select_rows(mapping, dml['inserts'])
+    ids = [w['id'] for w in objects['bench.Person']]
+    print(f'{args.num_objects} objects, ' + ', '.join(f'{k}: {len(v)} rows' for k, v in rows.items()))
+
+    read_plans = compile_read_plans(mapping)
+    # garbage collection runs dominate both variants when 100k objects are built, so it is excluded.
+    # The best of several runs is taken to exclude the growth of the memory allocator in the first run
+    gc.disable()
+    interpreted_time = compiled_time = float('inf')
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        interpreted = read_interpreted(mapping, 'bench.Person', rows, ids)
+        interpreted_time = min(interpreted_time, time.perf_counter() - start)
+        start = time.perf_counter()
+        compiled = read_compiled(read_plans, 'bench.Person', rows, ids)
+        compiled_time = min(compiled_time, time.perf_counter() - start)
+    start = time.perf_counter()
+    compile_read_plans(mapping)
+    compile_time = time.perf_counter() - start
+    gc.enable()
+
+    if interpreted != compiled:
+        print('ERROR: results of interpreted and compiled read differ')
+        sys.exit(-1)
+    print(f'interpreted: {interpreted_time:.3f}s')
+    print(f'compiled:    {compiled_time:.3f}s (plan compilation {compile_time * 1000:.2f}ms)')
+    print(f'speedup:     {interpreted_time / compiled_time:.1f}x')
@@ -0,0 +1,57 @@
+'''
+Tests of the per-tenant admission control
+Run with: python -m unittest discover -s tests/unit
+'''
+import os
+import sys
+import asyncio
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+#pylint: disable=wrong-import-position
+from admission import AdmissionController, AdmissionRejected
+
+CLASSES = {
+    'read': {'maxConcurrent': 1, 'maxQueued': 0, 'rate': 0, 'burst': 0},
+    'write': {'maxConcurrent': 0, 'maxQueued': 0, 'rate': 1, 'burst': 1}}
+
+class AdmissionControllerTest(unittest.TestCase):
+    def test_limits(self):
+        controller = AdmissionController(CLASSES, max_wait_time = 0.01)
+        async def run():
+            concurrency = await controller.acquire('t1', 'read')
+            with self.assertRaises(AdmissionRejected):
+                await controller.acquire('t1', 'read')
+            # other tenants have their own limits
+            other = await controller.acquire('t2', 'read')
+            other.release()
+            concurrency.release()
+            await controller.acquire('t1', 'write')
+            with self.assertRaises(AdmissionRejected):
+                await controller.acquire('t1', 'write')
+        asyncio.run(run())
+
+    def test_evict_idle(self):
+        controller = AdmissionController(CLASSES, max_wait_time = 0.01)
+        async def run():
+            busy = await controller.acquire('busy', 'read')
+            for i in range(100):
+                concurrency = await controller.acquire(f'tenant{i}', 'read')
+                concurrency.release()
+            # idle limits are dropped, the limits in use are kept
+            self.assertLessEqual(len(controller.limits), 3)
+            self.assertIn(('busy', 'read'), controller.limits)
+            with self.assertRaises(AdmissionRejected):
+                await controller.acquire('busy', 'read')
+            busy.release()
+            # limits whose token bucket is not refilled are kept
+            await controller.acquire('rated', 'write')
+            for i in range(10):
+                concurrency = await controller.acquire(f'tenant{i}', 'read')
+                concurrency.release()
+            self.assertIn(('rated', 'write'), controller.limits)
+            with self.assertRaises(AdmissionRejected):
+                await controller.acquire('rated', 'write')
+        asyncio.run(run())
+
+if __name__ == '__main__':
+    unittest.main()
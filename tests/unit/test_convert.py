@@ -0,0 +1,58 @@
+'''
+Tests of the conversion of objects to inserts
+Run with: python -m unittest discover -s tests/unit
+'''
+import os
+import sys
+import json
+import unittest
+from copy import deepcopy
+PACKAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'packages')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+#pylint: disable=wrong-import-position
+import convert
+
+def load_package(name):
+    with open(os.path.join(PACKAGES, name, 'reference', 'cson.json'), encoding = 'utf-8') as f:
+        mapping = convert.cson_to_mapping(json.load(f))
+    with open(os.path.join(PACKAGES, name, 'data.json'), encoding = 'utf-8') as f:
+        return mapping, json.load(f)
+
+def get_rows(inserts, table_name):
+    columns = inserts[table_name]['columns']
+    return [{k: row[i] for k, i in columns.items()} for row in inserts[table_name]['rows']]
+
+class ForwardReferenceTest(unittest.TestCase):
+    def test_keyed_objects(self):
+        """References to objects which are provided later with their key get the key"""
+        mapping, data = load_package(os.path.join('relationships', '01'))
+        objects = {
+            'RelOrgPerson': data['RelOrgPerson'],
+            'Person': [data['Person'][0] | {'id': 'person1'}],
+            'Organization': [data['Organization'][0] | {'id': 'organization1'}],
+            'TypeRelOrgPerson': data['TypeRelOrgPerson']}
+        dml = convert.objects_to_dml(mapping, deepcopy(objects), keep_keys = True)
+        rows = get_rows(dml['inserts'], 'ENTITY/RELORGPERSON')
+        self.assertEqual((rows[0]['PERSON'], rows[0]['ORGANIZATION']), ('person1', 'organization1'))
+
+    def test_former_call(self):
+        """References written by a former call cannot be replaced"""
+        mapping, data = load_package(os.path.join('relationships', '01'))
+        idmapping = {}
+        convert.objects_to_dml(mapping, {'RelOrgPerson': deepcopy(data['RelOrgPerson'])}, idmapping = idmapping,\
+            keep_keys = True)
+        with self.assertRaises(convert.DataException):
+            convert.objects_to_dml(mapping, {'Person': [data['Person'][0] | {'id': 'person1'}]},\
+                idmapping = idmapping, keep_keys = True)
+
+    def test_unkeyed_objects(self):
+        mapping, data = load_package(os.path.join('relationships', '01'))
+        objects = {'RelOrgPerson': data['RelOrgPerson'], 'Person': data['Person'],\
+            'Organization': data['Organization'], 'TypeRelOrgPerson': data['TypeRelOrgPerson']}
+        dml = convert.objects_to_dml(mapping, deepcopy(objects))
+        relation = get_rows(dml['inserts'], 'ENTITY/RELORGPERSON')[0]
+        self.assertEqual(relation['PERSON'], get_rows(dml['inserts'], 'ENTITY/PERSON')[0]['ID'])
+        self.assertEqual(relation['ORGANIZATION'], get_rows(dml['inserts'], 'ENTITY/ORGANIZATION')[0]['ID'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+'''
+Tests of the merging of inserts and of the group commit of create data requests.
+The DB connection is replaced by a fake, no database is needed.
+Run with: python -m unittest discover -s tests/unit
+'''
+import os
+import sys
+import json
+import asyncio
+import unittest
+from unittest import mock
+from copy import deepcopy
+from hdbcli import dbapi
+PACKAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'packages')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+#pylint: disable=wrong-import-position
+import convert
+import db_connection_pool
+import server
+import server_globals as glob
+from constants import DBUserType
+from data_load import merge_inserts
+
+TABLE_NAME = 'ENTITY/TYPERELORGPERSON'
+
+def get_inserts():
+    return [
+        {TABLE_NAME: {'columns': {'CODE': 0}, 'rows': [['01']]}},
+        {TABLE_NAME: {'columns': {'CODE': 0, 'DESCRIPTION': 1}, 'rows': [['02', 'Employee']]}},
+        {TABLE_NAME: {'columns': {'CODE': 0}, 'rows': [['03']]}}]
+
+class MergeInsertsTest(unittest.TestCase):
+    def test_same_columns(self):
+        inserts_list = [get_inserts()[0], get_inserts()[2]]
+        merged = merge_inserts(inserts_list)
+        self.assertEqual(merged, {TABLE_NAME: {'columns': {'CODE': 0}, 'rows': [['01'], ['03']]}})
+
+    def test_other_columns(self):
+        merged = merge_inserts(get_inserts())
+        self.assertEqual(merged[TABLE_NAME]['columns'], {'CODE': 0, 'DESCRIPTION': 1})
+        self.assertEqual(merged[TABLE_NAME]['rows'], [['01', None], ['02', 'Employee'], ['03', None]])
+
+    def test_inserts_unchanged(self):
+        inserts_list = get_inserts()
+        merged = merge_inserts(inserts_list)
+        merged[TABLE_NAME]['rows'][0][0] = 'changed'
+        self.assertEqual(inserts_list, get_inserts())
+
+class FakeCursor():
+    """Records the inserted rows. The first executemany fails if fail_first is set"""
+    def __init__(self):
+        self.fail_first = False
+        self.inserts = []
+    def execute(self, sql, parameters = None):
+        pass
+    def executemany(self, sql, rows):
+        if self.fail_first:
+            self.fail_first = False
+            raise dbapi.DataError(1, 'invalid data')
+        self.inserts.append((sql, deepcopy(rows)))
+
+class FakeCon():
+    def commit(self):
+        pass
+    def rollback(self):
+        pass
+
+class FakeConnection():
+    cursor = None
+    def __init__(self, credentials, slow_log = None):
+        self.con = FakeCon()
+        self.cur = FakeConnection.cursor
+    def close(self):
+        pass
+    def is_connected(self):
+        return True
+    def rollback(self):
+        return True
+
+class WriteCoalescedTest(unittest.TestCase):
+    def setUp(self):
+        FakeConnection.cursor = FakeCursor()
+        patcher = mock.patch.object(db_connection_pool, 'SharedConnection', FakeConnection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        pool = db_connection_pool.ConnectionPool(db_connection_pool.Credentials('host', 30015, 'USER', 'password'),\
+            min_connections = 0, max_connections = 1, lazy = True)
+        self.addCleanup(pool.close)
+        patcher = mock.patch.dict(glob.connection_pools, {DBUserType.DATA_WRITE: pool})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with open(os.path.join(PACKAGES, 'relationships', '01', 'reference', 'cson.json'), encoding = 'utf-8') as f:
+            self.mapping = convert.cson_to_mapping(json.load(f))
+
+    def get_items(self):
+        return [(self.mapping, {'inserts': w, 'sourceKeys': [], 'unresolved': []}, {}) for w in get_inserts()]
+
+    def test_group(self):
+        results = asyncio.run(server.write_coalesced(('tenant1', None), self.get_items()))
+        self.assertEqual(results, [None, None, None])
+        self.assertEqual(len(FakeConnection.cursor.inserts), 1)
+        self.assertEqual(FakeConnection.cursor.inserts[0][1], [['01', None], ['02', 'Employee'], ['03', None]])
+
+    def test_fallback(self):
+        """If the group fails, the requests are written one by one with their own columns"""
+        FakeConnection.cursor.fail_first = True
+        items = self.get_items()
+        results = asyncio.run(server.write_coalesced(('tenant1', None), items))
+        self.assertEqual(results, [None, None, None])
+        self.assertEqual([w[1]['inserts'] for w in items], get_inserts())
+        self.assertEqual([w[1] for w in FakeConnection.cursor.inserts], [[['01']], [['02', 'Employee']], [['03']]])
+        for sql, rows in FakeConnection.cursor.inserts:
+            self.assertEqual(sql.count('?'), len(rows[0]))
+
+if __name__ == '__main__':
+    unittest.main()
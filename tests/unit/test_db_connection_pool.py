@@ -0,0 +1,327 @@
+'''
+Tests of the waiting, hand-off and reservation logic of the connection pool.
+SharedConnection is replaced by a fake, no database is needed.
+Run with: python -m unittest discover -s tests/unit
+'''
+import os
+import sys
+import time
+import asyncio
+import threading
+import unittest
+from unittest import mock
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+#pylint: disable=wrong-import-position
+import db_connection_pool
+from db_connection_pool import ConnectionPool, Credentials, PoolTimeoutException, DBConnection, AsyncDBConnection
+
+class FakeConnection():
+    """Counts the open connections. Fails to connect while fail is set"""
+    lock = threading.Lock()
+    num_open = 0
+    max_open = 0
+    fail = False
+    rollback_fails = False
+    connect_time = 0
+    def __init__(self, credentials, slow_log = None):
+        time.sleep(FakeConnection.connect_time)
+        if FakeConnection.fail:
+            raise ConnectionError('connect failed')
+        self.con = None
+        self.cur = None
+        self.connected = True
+        self.num_rollbacks = 0
+        self.last_used = time.monotonic()
+        with FakeConnection.lock:
+            FakeConnection.num_open += 1
+            FakeConnection.max_open = max(FakeConnection.max_open, FakeConnection.num_open)
+    def close(self):
+        if self.connected:
+            self.connected = False
+            with FakeConnection.lock:
+                FakeConnection.num_open -= 1
+    def is_connected(self):
+        return self.connected
+    def rollback(self):
+        self.num_rollbacks += 1
+        return not FakeConnection.rollback_fails
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        FakeConnection.num_open = 0
+        FakeConnection.max_open = 0
+        FakeConnection.fail = False
+        FakeConnection.rollback_fails = False
+        FakeConnection.connect_time = 0
+        patcher = mock.patch.object(db_connection_pool, 'SharedConnection', FakeConnection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_pool(self, max_connections, min_connections = 0, timeout = 5):
+        pool = ConnectionPool(Credentials('host', 30015, 'USER', 'password'), min_connections = min_connections,\
+            max_connections = max_connections, timeout = timeout, lazy = True)
+        self.addCleanup(pool.close)
+        return pool
+
+    def wait_for_waiters(self, pool, num_waiters):
+        deadline = time.monotonic() + 5
+        while len(pool.waiters) < num_waiters:
+            self.assertLess(time.monotonic(), deadline, 'waiters not queued')
+            time.sleep(0.001)
+
+    def test_timeout(self):
+        pool = self.create_pool(1)
+        connection = pool.get_connection()
+        with self.assertRaises(PoolTimeoutException):
+            pool.get_connection(timeout = 0.05)
+        statistics = pool.get_statistics()
+        self.assertEqual(statistics['timeouts'], 1)
+        self.assertEqual(statistics['waiting'], 0)
+        pool.return_connection(connection)
+        self.assertIs(pool.get_connection(), connection)
+
+    def test_timeout_async(self):
+        pool = self.create_pool(1)
+        async def run():
+            connection = await pool.get_connection_async()
+            with self.assertRaises(PoolTimeoutException):
+                await pool.get_connection_async(timeout = 0.05)
+            pool.return_connection(connection)
+            return await pool.get_connection_async()
+        self.assertIsNotNone(asyncio.run(run()))
+        self.assertEqual(pool.get_statistics()['timeouts'], 1)
+        self.assertEqual(pool.get_statistics()['waiting'], 0)
+
+    def test_fifo_order(self):
+        pool = self.create_pool(1)
+        connection = pool.get_connection()
+        served = []
+        def borrow(i):
+            borrowed = pool.get_connection()
+            served.append(i)
+            pool.return_connection(borrowed)
+        threads = []
+        for i in range(5):
+            thread = threading.Thread(target = borrow, args = (i,))
+            thread.start()
+            threads.append(thread)
+            self.wait_for_waiters(pool, i + 1)
+        pool.return_connection(connection)
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(served, list(range(5)))
+        self.assertEqual(FakeConnection.max_open, 1)
+
+    def test_fifo_order_async(self):
+        pool = self.create_pool(1)
+        served = []
+        async def borrow(i):
+            borrowed = await pool.get_connection_async()
+            served.append(i)
+            await asyncio.sleep(0)
+            pool.return_connection(borrowed)
+        async def run():
+            connection = await pool.get_connection_async()
+            tasks = []
+            for i in range(5):
+                tasks.append(asyncio.create_task(borrow(i)))
+                await asyncio.sleep(0)
+            self.assertEqual(len(pool.waiters), 5)
+            pool.return_connection(connection)
+            await asyncio.gather(*tasks)
+        asyncio.run(run())
+        self.assertEqual(served, list(range(5)))
+
+    def test_cancel_queued_waiter(self):
+        pool = self.create_pool(1)
+        async def run():
+            connection = await pool.get_connection_async()
+            task = asyncio.create_task(pool.get_connection_async())
+            await asyncio.sleep(0)
+            self.assertEqual(len(pool.waiters), 1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertEqual(len(pool.waiters), 0)
+            pool.return_connection(connection)
+        asyncio.run(run())
+        statistics = pool.get_statistics()
+        self.assertEqual((statistics['inUse'], statistics['idle'], statistics['open']), (0, 1, 1))
+
+    def test_cancel_after_hand_off(self):
+        """A waiter cancelled after a connection was handed over returns it to the pool"""
+        pool = self.create_pool(1)
+        async def run():
+            connection = await pool.get_connection_async()
+            task = asyncio.create_task(pool.get_connection_async())
+            await asyncio.sleep(0)
+            pool.return_connection(connection)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return connection
+        connection = asyncio.run(run())
+        statistics = pool.get_statistics()
+        self.assertEqual((statistics['inUse'], statistics['idle'], statistics['open']), (0, 1, 1))
+        self.assertIs(pool.get_connection(), connection)
+
+    def test_cancel_after_reservation(self):
+        """A waiter cancelled after it got the capacity of a discarded connection releases it"""
+        pool = self.create_pool(1)
+        async def run():
+            connection = await pool.get_connection_async()
+            task = asyncio.create_task(pool.get_connection_async())
+            await asyncio.sleep(0)
+            pool.discard_connection(connection)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        asyncio.run(run())
+        statistics = pool.get_statistics()
+        self.assertEqual((statistics['inUse'], statistics['open'], statistics['waiting']), (0, 0, 0))
+        pool.get_connection()
+        self.assertEqual(pool.get_statistics()['open'], 1)
+
+    def test_cancel_during_connect(self):
+        """The connection of a connect whose requester was cancelled is returned to the pool"""
+        pool = self.create_pool(1)
+        FakeConnection.connect_time = 0.1
+        async def run():
+            task = asyncio.create_task(pool.get_connection_async())
+            await asyncio.sleep(0.02)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return await pool.get_connection_async(timeout = 1)
+        connection = asyncio.run(run())
+        statistics = pool.get_statistics()
+        self.assertEqual((statistics['inUse'], statistics['open'], statistics['created']), (1, 1, 1))
+        pool.return_connection(connection)
+        self.assertEqual(pool.get_statistics()['inUse'], 0)
+
+    def test_cancel_during_failed_connect(self):
+        pool = self.create_pool(1)
+        FakeConnection.connect_time = 0.1
+        FakeConnection.fail = True
+        async def run():
+            task = asyncio.create_task(pool.get_connection_async())
+            await asyncio.sleep(0.02)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            await asyncio.sleep(0.2)
+        asyncio.run(run())
+        statistics = pool.get_statistics()
+        self.assertEqual((statistics['inUse'], statistics['open']), (0, 0))
+        FakeConnection.fail = False
+        pool.get_connection(timeout = 1)
+
+    def test_reservation_passed_to_waiter(self):
+        """The capacity of a discarded connection or of a failed connect goes to the next waiter"""
+        pool = self.create_pool(1)
+        connection = pool.get_connection()
+        result = []
+        thread = threading.Thread(target = lambda: result.append(pool.get_connection()))
+        thread.start()
+        self.wait_for_waiters(pool, 1)
+        pool.discard_connection(connection)
+        thread.join(5)
+        self.assertEqual(len(result), 1)
+        self.assertIsNot(result[0], connection)
+        self.assertEqual(pool.get_statistics()['open'], 1)
+        self.assertEqual(FakeConnection.max_open, 1)
+
+        errors = []
+        def borrow():
+            try:
+                result.append(pool.get_connection())
+            except ConnectionError as e:
+                errors.append(e)
+        thread = threading.Thread(target = borrow)
+        thread.start()
+        self.wait_for_waiters(pool, 1)
+        FakeConnection.fail = True
+        pool.discard_connection(result[0])
+        thread.join(5)
+        # the waiter failed to connect and released the reservation
+        self.assertEqual((len(result), len(errors)), (1, 1))
+        statistics = pool.get_statistics()
+        self.assertEqual((statistics['inUse'], statistics['open'], statistics['waiting']), (0, 0, 0))
+
+    def test_max_connections(self):
+        pool = self.create_pool(3)
+        in_use = [0, 0]
+        lock = threading.Lock()
+        def borrow():
+            for _ in range(50):
+                connection = pool.get_connection()
+                with lock:
+                    in_use[0] += 1
+                    in_use[1] = max(in_use)
+                time.sleep(0.0005)
+                with lock:
+                    in_use[0] -= 1
+                pool.return_connection(connection)
+        threads = [threading.Thread(target = borrow) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        self.assertLessEqual(in_use[1], 3)
+        self.assertLessEqual(FakeConnection.max_open, 3)
+        statistics = pool.get_statistics()
+        self.assertEqual((statistics['inUse'], statistics['waiting'], statistics['timeouts']), (0, 0, 0))
+        self.assertEqual(statistics['open'], statistics['idle'])
+
+    def test_max_connections_async(self):
+        pool = self.create_pool(3)
+        in_use = [0, 0]
+        async def borrow():
+            for _ in range(20):
+                connection = await pool.get_connection_async()
+                in_use[0] += 1
+                in_use[1] = max(in_use)
+                await asyncio.sleep(0.0005)
+                in_use[0] -= 1
+                pool.return_connection(connection)
+        async def run():
+            await asyncio.gather(*[borrow() for _ in range(10)])
+        asyncio.run(run())
+        self.assertLessEqual(in_use[1], 3)
+        self.assertLessEqual(FakeConnection.max_open, 3)
+        statistics = pool.get_statistics()
+        self.assertEqual((statistics['inUse'], statistics['waiting']), (0, 0))
+
+    def test_rollback_on_exception(self):
+        pool = self.create_pool(1)
+        with self.assertRaises(ValueError):
+            with DBConnection(pool) as connection:
+                raise ValueError()
+        self.assertEqual(connection.num_rollbacks, 1)
+        self.assertEqual(pool.get_statistics()['idle'], 1)
+        async def run():
+            async with AsyncDBConnection(pool) as db:
+                pass
+            self.assertEqual(db.connection.num_rollbacks, 1)
+            with self.assertRaises(ValueError):
+                async with AsyncDBConnection(pool) as db:
+                    raise ValueError()
+            self.assertEqual(db.connection.num_rollbacks, 2)
+        asyncio.run(run())
+        self.assertEqual(pool.get_statistics()['idle'], 1)
+
+    def test_discard_on_failed_rollback(self):
+        pool = self.create_pool(1)
+        FakeConnection.rollback_fails = True
+        async def run():
+            with self.assertRaises(ValueError):
+                async with AsyncDBConnection(pool) as db:
+                    raise ValueError()
+            return db.connection
+        connection = asyncio.run(run())
+        self.assertFalse(connection.is_connected())
+        statistics = pool.get_statistics()
+        self.assertEqual((statistics['inUse'], statistics['open']), (0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+'''
+Tests of the cache of tenant mappings
+Run with: python -m unittest discover -s tests/unit
+'''
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+#pylint: disable=wrong-import-position
+from mapping_cache import MappingCache, MAX_METADATA_DOCUMENTS
+
+class MappingCacheTest(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = MappingCache(max_size = 10)
+        cache.put('a', 1, {}, 4)
+        cache.put('b', 1, {}, 4)
+        cache.get('a')
+        cache.put('c', 1, {}, 4)
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertEqual(cache.size, 8)
+
+    def test_metadata_size(self):
+        """$metadata documents count for the memory budget"""
+        cache = MappingCache(max_size = 20)
+        entry_a = cache.put('a', 1, {}, 4)
+        entry_b = cache.put('b', 1, {}, 4)
+        cache.put_metadata('b', entry_b, ('v', '/$metadata'), 'etag', 'x' * 8)
+        self.assertEqual((entry_b.size, cache.size), (12, 16))
+        # a is the most recently used, b is evicted
+        cache.get('a')
+        cache.put_metadata('a', entry_a, ('v', '/$metadata'), 'etag', 'x' * 8)
+        self.assertIsNone(cache.get('b'))
+        self.assertIs(cache.get('a'), entry_a)
+        self.assertEqual(cache.size, 12)
+        cache.invalidate('a')
+        self.assertEqual(cache.size, 0)
+
+    def test_metadata_limit(self):
+        cache = MappingCache()
+        entry = cache.put('a', 1, {}, 4)
+        for i in range(MAX_METADATA_DOCUMENTS + 5):
+            cache.put_metadata('a', entry, ('v', f'/$metadata/{i}'), 'etag', 'x')
+        self.assertEqual(len(entry.metadata), MAX_METADATA_DOCUMENTS)
+        self.assertEqual(cache.size, 4 + MAX_METADATA_DOCUMENTS)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+'''
+Tests of the metrics registry
+Run with: python -m unittest discover -s tests/unit
+'''
+import os
+import sys
+import runpy
+import unittest
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src')
+sys.path.insert(0, SRC)
+#pylint: disable=wrong-import-position
+import metrics
+from metrics import Registry, Counter, CallbackMetric
+
+def get_type_lines(registry):
+    return [w for w in registry.render().splitlines() if w.startswith('# TYPE')]
+
+class RegistryTest(unittest.TestCase):
+    def test_register_twice(self):
+        """A metric registered again replaces the registered one"""
+        registry = Registry()
+        registry.register(Counter('requests_total', 'Requests'))
+        registry.register(CallbackMetric('connections', 'Connections', (), lambda: {(): 1}))
+        registry.register(CallbackMetric('connections', 'Connections', (), lambda: {(): 2}))
+        self.assertEqual(get_type_lines(registry), ['# TYPE requests_total counter', '# TYPE connections gauge'])
+        self.assertIn('connections 2', registry.render().splitlines())
+
+class ServerMetricsTest(unittest.TestCase):
+    def test_server_module_loaded_twice(self):
+        """Workers execute server.py as main module and import it as server"""
+        runpy.run_path(os.path.join(SRC, 'server.py'), run_name = '__mp_main__')
+        import server #pylint: disable=import-outside-toplevel,unused-import
+        type_lines = get_type_lines(metrics.registry)
+        self.assertEqual(len(type_lines), len(set(type_lines)))
+        for name in ('db_pool_connections', 'db_pool_timeouts_total', 'ingestion_jobs'):
+            self.assertEqual(len([w for w in type_lines if w.split()[2] == name]), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+'''
+Tests of the search result cache
+Run with: python -m unittest discover -s tests/unit
+'''
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+#pylint: disable=wrong-import-position
+from result_cache import ResultCache
+
+class ResultCacheTest(unittest.TestCase):
+    def test_invalidate_tenant(self):
+        cache = ResultCache()
+        cache.put(('a', 'q1'), 'r1', 2)
+        cache.put(('b', 'q1'), 'r2', 2)
+        cache.invalidate_tenant('a')
+        self.assertIsNone(cache.get(('a', 'q1')))
+        self.assertEqual(cache.get(('b', 'q1')), 'r2')
+
+    def test_stale_result_not_cached(self):
+        """A search which started before a write of the tenant must not put its result"""
+        cache = ResultCache()
+        generation = cache.get_generation('a')
+        other_generation = cache.get_generation('b')
+        cache.invalidate_tenant('a')
+        cache.put(('a', 'q1'), 'stale', 5, generation)
+        cache.put(('b', 'q1'), 'r2', 2, other_generation)
+        self.assertIsNone(cache.get(('a', 'q1')))
+        self.assertEqual(cache.get(('b', 'q1')), 'r2')
+        cache.put(('a', 'q1'), 'fresh', 5, cache.get_generation('a'))
+        self.assertEqual(cache.get(('a', 'q1')), 'fresh')
+
+    def test_lru_eviction(self):
+        cache = ResultCache(max_size = 4)
+        cache.put(('a', 'q1'), 'r1', 2)
+        cache.put(('a', 'q2'), 'r2', 2)
+        cache.get(('a', 'q1'))
+        cache.put(('a', 'q3'), 'r3', 2)
+        self.assertIsNone(cache.get(('a', 'q2')))
+        self.assertEqual(cache.get(('a', 'q1')), 'r1')
+        self.assertEqual(cache.get_statistics()['size'], 4)
+
+if __name__ == '__main__':
+    unittest.main()
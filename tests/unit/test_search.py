@@ -0,0 +1,114 @@
+'''
+Tests of the keys of the search result cache, of the shared searches and of $metadata.
+ESH_SEARCH and the DB connection are replaced by fakes, no database is needed.
+Run with: python -m unittest discover -s tests/unit
+'''
+import os
+import sys
+import asyncio
+import unittest
+from unittest import mock
+from fastapi import HTTPException
+from hdbcli import dbapi
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+#pylint: disable=wrong-import-position
+import db_connection_pool
+import server
+import server_globals as glob
+from constants import DBUserType
+from mapping_cache import MappingCache
+from result_cache import ResultCache
+
+# a query string which equals the JSON of a bulk search
+QUERY = '["$all"]'
+BULK_QUERY = ['$all']
+
+class SearchKeyTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        async def call_esh_search(sql, search_type):
+            self.calls.append(search_type)
+            await asyncio.sleep(0.01)
+            return [(f'{{"type": "{search_type}"}}',)]
+        patcher = mock.patch.object(server, 'call_esh_search', call_esh_search)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(glob, 'search_cache', ResultCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cache(self):
+        """The cached result of a search is not returned for a bulk search with the same JSON"""
+        async def run():
+            return (await server.perform_search('v', 'tenant1', QUERY, use_cache = True),\
+                await server.perform_bulk_search('v', 'tenant1', BULK_QUERY, use_cache = True),\
+                await server.perform_bulk_search('v', 'tenant1', BULK_QUERY, use_cache = True))
+        results = asyncio.run(run())
+        self.assertEqual(results, ('{"type": "search"}', '[{"type": "bulk"}]', '[{"type": "bulk"}]'))
+        self.assertEqual(self.calls, ['search', 'bulk'])
+    def test_shared_search(self):
+        """A bulk search does not join a running search with the same JSON"""
+        async def run():
+            return await asyncio.gather(server.perform_search('v', 'tenant1', QUERY),\
+                server.perform_bulk_search('v', 'tenant1', BULK_QUERY),\
+                server.perform_bulk_search('v', 'tenant1', BULK_QUERY))
+        results = asyncio.run(run())
+        self.assertEqual(results, ['{"type": "search"}', '[{"type": "bulk"}]', '[{"type": "bulk"}]'])
+        self.assertEqual(self.calls, ['search', 'bulk'])
+
+class FakeCursor():
+    """The _MODEL table is empty. execute raises error if it is set"""
+    def __init__(self):
+        self.error = None
+    def execute(self, sql, parameters = None):
+        if self.error:
+            raise self.error
+    def fetchone(self):
+        return None
+
+class FakeConnection():
+    cursor = None
+    def __init__(self, credentials, slow_log = None):
+        self.cur = FakeConnection.cursor
+    def close(self):
+        pass
+    def is_connected(self):
+        return True
+    def rollback(self):
+        return True
+
+class MetadataTest(unittest.TestCase):
+    def setUp(self):
+        FakeConnection.cursor = FakeCursor()
+        patcher = mock.patch.object(db_connection_pool, 'SharedConnection', FakeConnection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        pool = db_connection_pool.ConnectionPool(db_connection_pool.Credentials('host', 30015, 'USER', 'password'),\
+            min_connections = 0, max_connections = 1, lazy = True)
+        self.addCleanup(pool.close)
+        patcher = mock.patch.dict(glob.connection_pools, {DBUserType.DATA_READ: pool})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(glob, 'mapping_cache', MappingCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_status_code(self):
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(server.get_metadata_response(None, 'tenant1', 'v', '/$metadata'))
+        return context.exception.status_code
+
+    def test_no_model(self):
+        self.assertEqual(self.get_status_code(), 404)
+
+    def test_no_tenant(self):
+        FakeConnection.cursor.error = dbapi.Error(362, 'invalid schema name')
+        self.assertEqual(self.get_status_code(), 404)
+
+    def test_other_error(self):
+        FakeConnection.cursor.error = dbapi.Error(10, 'authentication failed')
+        with self.assertRaises(dbapi.Error):
+            asyncio.run(server.get_metadata_response(None, 'tenant1', 'v', '/$metadata'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+'''
+Tests of the coalescing of identical concurrent calls
+Run with: python -m unittest discover -s tests/unit
+'''
+import os
+import sys
+import asyncio
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+#pylint: disable=wrong-import-position
+from single_flight import SingleFlight
+
+class SingleFlightTest(unittest.TestCase):
+    def test_shared_execution(self):
+        flights = SingleFlight()
+        calls = []
+        async def func(value):
+            calls.append(value)
+            await asyncio.sleep(0.01)
+            return value
+        async def run():
+            return await asyncio.gather(*[flights.run(('a', 'q'), func, i) for i in range(3)])
+        self.assertEqual(asyncio.run(run()), [0, 0, 0])
+        self.assertEqual(calls, [0])
+        self.assertEqual(flights.get_statistics(), {'inFlight': 0, 'executions': 1, 'shared': 2})
+
+    def test_forget(self):
+        """Calls after forget start a new execution, calls before it get the result of the first one"""
+        flights = SingleFlight()
+        calls = []
+        async def func(value):
+            calls.append(value)
+            await asyncio.sleep(0.01)
+            return value
+        async def run():
+            first = asyncio.ensure_future(flights.run(('a', 'q'), func, 'before'))
+            other = asyncio.ensure_future(flights.run(('b', 'q'), func, 'other'))
+            await asyncio.sleep(0)
+            flights.forget(lambda key: key[0] == 'a')
+            self.assertEqual(list(flights.flights), [('b', 'q')])
+            second = asyncio.ensure_future(flights.run(('a', 'q'), func, 'after'))
+            return await asyncio.gather(first, other, second)
+        self.assertEqual(asyncio.run(run()), ['before', 'other', 'after'])
+        self.assertEqual(calls, ['before', 'other', 'after'])
+        self.assertEqual(flights.get_statistics()['inFlight'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
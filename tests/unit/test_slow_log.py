@@ -0,0 +1,75 @@
+'''
+Tests of the log of slow DB operations.
+The DB cursor is replaced by a fake, no database is needed.
+Run with: python -m unittest discover -s tests/unit
+'''
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+#pylint: disable=wrong-import-position
+import db_connection_pool
+from db_connection_pool import SharedConnection, Credentials
+from slow_log import SlowOperationLog, MonitoredCursor
+
+class FakeCursor():
+    """Each call takes delay seconds"""
+    def __init__(self, delay = 0):
+        self.delay = delay
+        self.rowcount = 2
+    def execute(self, operation, parameters = None):
+        time.sleep(self.delay)
+    def fetchmany(self, size):
+        time.sleep(self.delay)
+        return [(1,), (2,)][:size]
+    def fetchall(self):
+        time.sleep(self.delay)
+        return [(1,), (2,)]
+    def close(self):
+        pass
+
+class FakeCon():
+    def cursor(self):
+        return FakeCursor()
+    def close(self):
+        pass
+
+class MonitoredCursorTest(unittest.TestCase):
+    def test_fetch(self):
+        """Slow fetch calls are recorded with the statement of the last execute"""
+        slow_log = SlowOperationLog(threshold = 0.01)
+        cursor = MonitoredCursor(FakeCursor(0.02), slow_log, 'USER')
+        cursor.execute('SELECT 1 from dummy')
+        self.assertEqual(len(cursor.fetchmany(1)), 1)
+        self.assertEqual(len(cursor.fetchall()), 2)
+        entries = [(w['operation'], w['statement'], w['rows']) for w in slow_log.get_entries()]
+        self.assertEqual(entries, [('execute', 'SELECT 1 from dummy', 2), ('fetchmany', 'SELECT 1 from dummy', 1),\
+            ('fetchall', 'SELECT 1 from dummy', 2)])
+
+    def test_fast_operations(self):
+        slow_log = SlowOperationLog(threshold = 1)
+        cursor = MonitoredCursor(FakeCursor(), slow_log)
+        cursor.execute('SELECT 1 from dummy')
+        cursor.fetchmany(10)
+        self.assertEqual(slow_log.get_entries(), [])
+
+class SharedConnectionTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(db_connection_pool.dbapi, 'connect', lambda **kwargs: FakeCon())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cursor(self):
+        """New cursors, e.g. of streaming reads, record slow operations like the cursor of the connection"""
+        credentials = Credentials('host', 30015, 'USER', 'password')
+        connection = SharedConnection(credentials, SlowOperationLog())
+        self.assertIsInstance(connection.cur, MonitoredCursor)
+        cursor = connection.cursor()
+        self.assertIsInstance(cursor, MonitoredCursor)
+        self.assertEqual(cursor.user, 'USER')
+        self.assertIsInstance(SharedConnection(credentials).cursor(), FakeCursor)
+
+if __name__ == '__main__':
+    unittest.main()
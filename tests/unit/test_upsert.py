@@ -0,0 +1,92 @@
+'''
+Tests of the change detection of upserts. The stored objects are given in the form read from the DB.
+Run with: python -m unittest discover -s tests/unit
+'''
+import os
+import sys
+import json
+import base64
+import unittest
+from copy import deepcopy
+from datetime import datetime
+from decimal import Decimal
+PACKAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'packages')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+#pylint: disable=wrong-import-position
+import convert
+import upsert
+from read_plan import compile_read_plans
+
+CSON = {
+    'definitions': {
+        'test.Measurement': {
+            'kind': 'entity',
+            'elements': {
+                'id': {'key': True, 'type': 'cds.UUID'},
+                'takenAt': {'type': 'cds.Timestamp'},
+                'signature': {'type': 'cds.Binary', 'length': 100},
+                'amount': {'type': 'cds.Decimal', 'precision': 10, 'scale': 2},
+                'ratio': {'type': 'cds.Double'},
+                'tags': {'items': {'elements': {
+                    'name': {'type': 'cds.String', 'length': 100}}}}}}}}
+
+def compare(mapping, object_type, stored, objects, idmapping = None):
+    """Compares the first of objects to stored like the upsert endpoint"""
+    read_plan = compile_read_plans(mapping)[object_type]
+    dml = convert.objects_to_dml(mapping, {object_type: deepcopy(objects)}, idmapping = idmapping, keep_keys = True)
+    incoming = upsert.assemble_inserts(mapping, read_plan, dml['inserts'])
+    trees = upsert.get_subtable_trees(mapping, mapping['tables'][read_plan.root_table_name])
+    return upsert.compare_object(trees, stored, incoming[objects[0]['id']])
+
+class CompareObjectTest(unittest.TestCase):
+    def test_associations(self):
+        """Associations given by source are compared by the id of their target"""
+        with open(os.path.join(PACKAGES, 'relationships', '01', 'reference', 'cson.json'), encoding = 'utf-8') as f:
+            mapping = convert.cson_to_mapping(json.load(f))
+        with open(os.path.join(PACKAGES, 'relationships', '01', 'data.json'), encoding = 'utf-8') as f:
+            objects = json.load(f)
+        idmapping = {}
+        for object_type in ('Organization', 'Person'):
+            for i, obj in enumerate(objects[object_type]):
+                obj['id'] = f'{object_type}{i}'
+            convert.objects_to_dml(mapping, {object_type: objects[object_type]}, idmapping = idmapping,\
+                keep_keys = True)
+        relation = objects['RelOrgPerson'][0] | {'id': 'rel1'}
+        stored = {
+            'id': 'rel1',
+            'source': relation['source'],
+            'person': {'id': 'Person0'},
+            'organization': {'id': 'Organization0'},
+            'type': {'code': '01'}}
+        self.assertEqual(compare(mapping, 'RelOrgPerson', stored, [relation], idmapping), (False, set()))
+        stored['person'] = {'id': 'Person1'}
+        self.assertEqual(compare(mapping, 'RelOrgPerson', stored, [relation], idmapping), (True, set()))
+
+    def test_value_types(self):
+        """Timestamps, binary and numeric values are compared in the form returned by the DB"""
+        mapping = convert.cson_to_mapping(deepcopy(CSON))
+        signature = b'\x00\x01signature'
+        stored = {
+            'id': 'm1',
+            'takenAt': datetime(2024, 1, 2, 3, 4, 5),
+            # base64.encodebytes as used by the read plan adds a line break
+            'signature': base64.encodebytes(signature).decode('utf-8'),
+            'amount': Decimal('1.50'),
+            'ratio': 2.0,
+            'tags': [{'name': 'a'}, {'name': 'b'}]}
+        incoming = {
+            'id': 'm1',
+            'takenAt': '2024-01-02T03:04:05Z',
+            'signature': base64.b64encode(signature).decode('utf-8'),
+            'amount': 1.5,
+            'ratio': 2,
+            'tags': [{'name': 'b'}, {'name': 'a'}]}
+        tags_table = [k for k in mapping['tables'] if k.endswith('_TAGS')][0]
+        self.assertEqual(compare(mapping, 'test.Measurement', stored, [incoming]), (False, set()))
+        self.assertEqual(compare(mapping, 'test.Measurement', stored, [incoming | {'takenAt': '2024-01-02T03:04:06'}]),\
+            (True, set()))
+        self.assertEqual(compare(mapping, 'test.Measurement', stored, [incoming | {'tags': [{'name': 'a'}]}]),\
+            (False, {tags_table}))
+
+if __name__ == '__main__':
+    unittest.main()